@@ -0,0 +1,118 @@
+"""
+Cache LRU en memoria con expiración por edad y límite por cantidad y bytes.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class CacheLRU:
+    """
+    Cache LRU thread-safe.
+
+    - max_entradas: cantidad máxima de entradas
+    - max_bytes: tamaño aproximado máximo (según la función `medir`)
+    - ttl: segundos de vida de cada entrada desde que se guardó (None = sin expiración)
+    """
+
+    def __init__(self, max_entradas: int, max_bytes: Optional[int] = None, ttl: Optional[float] = None,
+                 medir: Optional[Callable[[Any], int]] = None):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._medir = medir or (lambda valor: 0)
+        self._datos = OrderedDict()  # clave -> (valor, bytes, creado)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expiradas = 0
+
+    def _expirada(self, creado: float, ahora: float) -> bool:
+        return self.ttl is not None and ahora - creado > self.ttl
+
+    def _quitar(self, clave: Hashable):
+        _, tamano, _ = self._datos.pop(clave)
+        self._bytes -= tamano
+
+    def get(self, clave: Hashable, default=None):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return default
+            valor, _, creado = entrada
+            if self._expirada(creado, time.monotonic()):
+                self._quitar(clave)
+                self.expiradas += 1
+                self.misses += 1
+                return default
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return valor
+
+    def put(self, clave: Hashable, valor: Any):
+        tamano = self._medir(valor)
+        with self._lock:
+            if clave in self._datos:
+                self._quitar(clave)
+            if self.max_bytes is not None and tamano > self.max_bytes:
+                # No cabe ni sola: no se guarda
+                return
+            self._datos[clave] = (valor, tamano, time.monotonic())
+            self._bytes += tamano
+            while len(self._datos) > self.max_entradas or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._quitar(next(iter(self._datos)))
+                self.evictions += 1
+
+    def pop(self, clave: Hashable, default=None):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return default
+            self._quitar(clave)
+            return entrada[0]
+
+    def __contains__(self, clave: Hashable) -> bool:
+        with self._lock:
+            entrada = self._datos.get(clave)
+            return entrada is not None and not self._expirada(entrada[2], time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._datos)
+
+    def limpiar_expiradas(self) -> int:
+        """Elimina las entradas vencidas. Devuelve cuántas se eliminaron."""
+        if self.ttl is None:
+            return 0
+        ahora = time.monotonic()
+        with self._lock:
+            vencidas = [clave for clave, (_, _, creado) in self._datos.items() if self._expirada(creado, ahora)]
+            for clave in vencidas:
+                self._quitar(clave)
+            self.expiradas += len(vencidas)
+        return len(vencidas)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "entradas": len(self._datos),
+                "bytes": self._bytes,
+                "max_entradas": self.max_entradas,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / consultas, 4) if consultas else None,
+                "evictions": self.evictions,
+                "expiradas": self.expiradas,
+            }
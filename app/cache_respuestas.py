@@ -0,0 +1,211 @@
+"""
+Cache de respuestas de lectura (/kpis, /meses-disponibles, ...).
+
+Los datos solo cambian cuando se confirma una carga, así que las respuestas
+se guardan ya serializadas (bytes + ETag fuerte) con TTL y límite LRU. Cada
+entrada se etiqueta con los periodos (anio, mes) que abarca; al persistir una
+fecha se invalidan solo las entradas de ese periodo. Una consulta sin año o
+sin mes abarca todos los valores de ese campo (comodín).
+
+El cache es por proceso. Con varios workers, cada invalidación se publica
+además en un registro compartido (InvalidacionesSQLite, en el mismo archivo
+que las sesiones) y los demás workers la aplican en su siguiente lectura,
+con una demora de a lo más `intervalo_sync` segundos. Sin registro compartido
+solo el TTL acota cuánto puede tardar otro worker en ver una confirmación.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from cache_lru import CacheLRU
+
+COMODIN = '*'
+
+Periodo = Tuple[Optional[int], Optional[str]]
+
+
+def calcular_etag(cuerpo: bytes) -> str:
+    """ETag fuerte: cambia si y solo si cambian los bytes de la respuesta."""
+    return '"' + hashlib.sha256(cuerpo).hexdigest()[:32] + '"'
+
+
+def etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    """Evalúa If-None-Match (lista separada por comas o '*')."""
+    if not if_none_match:
+        return False
+    candidatos = [valor.strip() for valor in if_none_match.split(',')]
+    return '*' in candidatos or etag in candidatos
+
+
+def _etiqueta(anio, mes) -> str:
+    return f"{COMODIN if anio is None else anio}-{COMODIN if mes is None else mes}"
+
+
+class InvalidacionesSQLite:
+    """
+    Registro de invalidaciones compartido entre procesos: una fila por
+    (anio, mes) invalidado, con id creciente. Cada proceso recuerda el último
+    id que aplicó y lee solo las filas posteriores.
+    """
+
+    def __init__(self, ruta: str, retencion: float = 3600):
+        self.ruta = ruta
+        self.retencion = retencion
+        with self._conexion() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS invalidaciones_cache (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    anio INTEGER NOT NULL,
+                    mes TEXT NOT NULL,
+                    creada REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _conexion(self):
+        conn = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA busy_timeout=30000")
+            yield conn
+        finally:
+            conn.close()
+
+    def ultimo_id(self) -> int:
+        with self._conexion() as conn:
+            fila = conn.execute("SELECT MAX(id) FROM invalidaciones_cache").fetchone()
+        return fila[0] or 0
+
+    def publicar(self, anio: int, mes: str) -> int:
+        """Registra la invalidación y devuelve su id."""
+        ahora = time.time()
+        with self._conexion() as conn:
+            cursor = conn.execute(
+                "INSERT INTO invalidaciones_cache (anio, mes, creada) VALUES (?, ?, ?)", (anio, mes, ahora)
+            )
+            # Las filas viejas ya fueron aplicadas (o su TTL venció) en todos los workers
+            conn.execute("DELETE FROM invalidaciones_cache WHERE creada < ?", (ahora - self.retencion,))
+            return cursor.lastrowid
+
+    def posteriores(self, desde_id: int) -> List[Tuple[int, int, str]]:
+        """(id, anio, mes) de las invalidaciones con id > desde_id, en orden."""
+        with self._conexion() as conn:
+            return conn.execute(
+                "SELECT id, anio, mes FROM invalidaciones_cache WHERE id > ? ORDER BY id", (desde_id,)
+            ).fetchall()
+
+
+class CacheRespuestas:
+
+    def __init__(self, max_entradas: int, max_bytes: int, ttl: float,
+                 compartidas: Optional[InvalidacionesSQLite] = None, intervalo_sync: float = 1.0):
+        self._cache = CacheLRU(max_entradas=max_entradas, max_bytes=max_bytes, ttl=ttl,
+                               medir=lambda entrada: len(entrada[0]))
+        self._por_etiqueta: Dict[str, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self._indexadas = 0
+        self._generacion = 0
+        self.invalidaciones = 0
+        self._compartidas = compartidas
+        self.intervalo_sync = intervalo_sync
+        self._ultimo_id = compartidas.ultimo_id() if compartidas is not None else 0
+        self._propias: Set[int] = set()
+        self._ultima_sync = time.monotonic()
+
+    def generacion(self) -> int:
+        """Tomarla antes de consultar la BD y pasarla a `guardar`."""
+        return self._generacion
+
+    def obtener(self, clave: Hashable) -> Optional[Tuple[bytes, str]]:
+        """(cuerpo, etag) o None."""
+        return self._cache.get(clave)
+
+    def guardar(self, clave: Hashable, cuerpo: bytes, periodos: Iterable[Periodo], generacion: int) -> str:
+        """
+        Guarda la respuesta y devuelve su ETag. Si hubo una invalidación
+        desde `generacion`, la respuesta puede estar vieja y no se guarda.
+        """
+        etag = calcular_etag(cuerpo)
+        with self._lock:
+            if generacion != self._generacion:
+                return etag
+            self._cache.put(clave, (cuerpo, etag))
+            for anio, mes in periodos:
+                self._por_etiqueta.setdefault(_etiqueta(anio, mes), set()).add(clave)
+                self._indexadas += 1
+            if self._indexadas > 4 * self._cache.max_entradas:
+                self._podar_indice()
+        return etag
+
+    def _podar_indice(self):
+        """Quita del índice las claves que el LRU ya descartó o que vencieron."""
+        for etiqueta in list(self._por_etiqueta):
+            vigentes = {clave for clave in self._por_etiqueta[etiqueta] if clave in self._cache}
+            if vigentes:
+                self._por_etiqueta[etiqueta] = vigentes
+            else:
+                del self._por_etiqueta[etiqueta]
+        self._indexadas = sum(len(claves) for claves in self._por_etiqueta.values())
+
+    def invalidar_periodo(self, anio: int, mes: str) -> int:
+        """
+        Elimina las entradas que abarcan (anio, mes) y, si hay registro
+        compartido, publica la invalidación para los demás workers.
+        Devuelve cuántas entradas se eliminaron aquí.
+        """
+        eliminadas = self._invalidar_local(anio, mes)
+        if self._compartidas is not None:
+            id_publicado = self._compartidas.publicar(anio, mes)
+            with self._lock:
+                if id_publicado > self._ultimo_id:
+                    self._propias.add(id_publicado)
+        return eliminadas
+
+    def sincronizacion_pendiente(self) -> bool:
+        """True si toca leer el registro compartido (sin tocar la BD)."""
+        return self._compartidas is not None and time.monotonic() - self._ultima_sync >= self.intervalo_sync
+
+    def sincronizar(self) -> int:
+        """
+        Aplica las invalidaciones publicadas por otros workers desde la última
+        lectura. Devuelve cuántas se aplicaron. Hace E/S: llamar fuera del loop.
+        """
+        if self._compartidas is None:
+            return 0
+        self._ultima_sync = time.monotonic()
+        aplicadas = 0
+        for id_invalidacion, anio, mes in self._compartidas.posteriores(self._ultimo_id):
+            with self._lock:
+                propia = id_invalidacion in self._propias
+                self._propias.discard(id_invalidacion)
+                self._ultimo_id = max(self._ultimo_id, id_invalidacion)
+            if not propia:
+                self._invalidar_local(anio, mes)
+                aplicadas += 1
+        return aplicadas
+
+    def _invalidar_local(self, anio: int, mes: str) -> int:
+        eliminadas = 0
+        with self._lock:
+            self._generacion += 1
+            self.invalidaciones += 1
+            for etiqueta in (_etiqueta(anio, mes), _etiqueta(None, mes), _etiqueta(anio, None), _etiqueta(None, None)):
+                claves = self._por_etiqueta.pop(etiqueta, ())
+                self._indexadas -= len(claves)
+                for clave in claves:
+                    if self._cache.pop(clave) is not None:
+                        eliminadas += 1
+        return eliminadas
+
+    def limpiar(self):
+        with self._lock:
+            self._generacion += 1
+            self._cache.limpiar()
+            self._por_etiqueta.clear()
+            self._indexadas = 0
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "invalidaciones": self.invalidaciones}
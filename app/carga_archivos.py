@@ -0,0 +1,286 @@
+"""
+Recepción de los archivos KPI subidos en /upload.
+
+El multipart se lee por chunks directo desde el request y cada archivo se
+guarda en un spool acotado (en memoria hasta cierto tamaño, luego en disco).
+Los límites por archivo y por request se validan mientras se lee, así un
+archivo demasiado grande se rechaza sin esperar el resto del body. También
+se calcula el SHA-256 de cada archivo al vuelo (para el cache de parseo).
+"""
+import hashlib
+from io import BytesIO
+from tempfile import NamedTemporaryFile
+from typing import AsyncGenerator, BinaryIO, Dict, List, Optional, Tuple, Union
+
+from python_multipart import MultipartParser
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import parse_options_header
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import FormData, Headers, UploadFile
+from starlette.requests import Request
+
+# Tamaño máximo de un campo de texto del formulario (fecha, checkboxes)
+MAX_BYTES_CAMPO = 64 * 1024
+
+
+class CargaDemasiadoGrande(Exception):
+    """El archivo o el request superan el tamaño máximo permitido."""
+
+
+class FormularioInvalido(Exception):
+    """El body no es un multipart/form-data válido (400, o 415 si es otro Content-Type)."""
+
+    def __init__(self, mensaje: str, status_code: int = 400):
+        super().__init__(mensaje)
+        self.status_code = status_code
+
+
+class SpoolKPI:
+    """
+    Archivo subido: en un BytesIO hasta max_memoria bytes y, pasado ese
+    tamaño, en un NamedTemporaryFile propio (con nombre, para que un worker
+    de otro proceso pueda abrirlo sin copiar los bytes). Lectura, seek y
+    cierre se delegan al archivo actual.
+    """
+
+    def __init__(self, max_memoria: int):
+        self.max_memoria = max_memoria
+        self._archivo: BinaryIO = BytesIO()
+        # Ruta del spool en disco, o None si sigue en memoria
+        self.ruta: Optional[str] = None
+        # SHA-256 del contenido, se completa al terminar de recibir el archivo
+        self.huella: Optional[str] = None
+
+    def __getattr__(self, nombre):
+        return getattr(self._archivo, nombre)
+
+    def _cabe_en_memoria(self, n: int) -> bool:
+        return self.ruta is None and self._archivo.tell() + n <= self.max_memoria
+
+    def _pasar_a_disco(self):
+        memoria = self._archivo
+        disco = NamedTemporaryFile(prefix='kpi_', suffix='.spool')
+        disco.write(memoria.getbuffer())
+        disco.seek(memoria.tell())
+        memoria.close()
+        self._archivo = disco
+        self.ruta = disco.name
+
+    def write(self, datos: bytes) -> int:
+        if self.ruta is None and not self._cabe_en_memoria(len(datos)):
+            self._pasar_a_disco()
+        return self._archivo.write(datos)
+
+    async def escribir(self, datos: bytes) -> None:
+        """Escribe en el loop mientras cabe en memoria; el paso a disco y lo que sigue, en un thread."""
+        if self._cabe_en_memoria(len(datos)):
+            self._archivo.write(datos)
+        else:
+            await run_in_threadpool(self.write, datos)
+
+
+def _formatear_mb(n: int) -> str:
+    return f"{n / (1024 * 1024):g} MB"
+
+
+class ParserCargaKPI:
+    """
+    Parser del multipart de /upload sobre la API pública de python-multipart
+    (sin depender de los internos del parser de Starlette).
+
+    Cada archivo va a un SpoolKPI con límite de tamaño y SHA-256 al vuelo.
+    Las partes de archivo vacías (input sin archivo) o de un KPI que ya llegó
+    marcado como omitido ('omitir_<campo>', que el formulario envía antes del
+    archivo) se descartan sin spool ni hash.
+    """
+
+    def __init__(self, headers: Headers, stream: AsyncGenerator[bytes, None], *,
+                 max_archivo: int, spool_max: int):
+        self.headers = headers
+        self.stream = stream
+        self.max_archivo = max_archivo
+        self.spool_max = spool_max
+        self.items: List[Tuple[str, Union[str, UploadFile]]] = []
+        self._campos: Dict[str, str] = {}
+        self._abiertos: List[UploadFile] = []
+        self._por_escribir: List[Tuple[UploadFile, bytes]] = []
+        self._por_terminar: List[UploadFile] = []
+        self._iniciar_parte()
+
+    def _iniciar_parte(self):
+        self._nombre_header = b''
+        self._valor_header = b''
+        self._headers_parte = []
+        self._disposicion = b''
+        self._campo = None
+        self._upload = None
+        self._descartar = False
+        self._datos = bytearray()
+        self._bytes_parte = 0
+        self._hash_parte = None
+
+    def on_part_begin(self) -> None:
+        self._iniciar_parte()
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._nombre_header += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._valor_header += data[start:end]
+
+    def on_header_end(self) -> None:
+        nombre = self._nombre_header.lower()
+        if nombre == b'content-disposition':
+            self._disposicion = self._valor_header
+        self._headers_parte.append((nombre, self._valor_header))
+        self._nombre_header = b''
+        self._valor_header = b''
+
+    def on_headers_finished(self) -> None:
+        _, opciones = parse_options_header(self._disposicion)
+        if b'name' not in opciones:
+            raise FormularioInvalido("Una parte del formulario no indica el nombre del campo")
+        self._campo = opciones[b'name'].decode('utf-8', 'replace')
+        if b'filename' not in opciones:
+            return
+
+        nombre_archivo = opciones[b'filename'].decode('utf-8', 'replace')
+        if not nombre_archivo or self._campos.get(f'omitir_{self._campo}') == 'on':
+            self._descartar = True
+            return
+        self._upload = UploadFile(
+            file=SpoolKPI(self.spool_max),
+            size=0,
+            filename=nombre_archivo,
+            headers=Headers(raw=self._headers_parte),
+        )
+        self._abiertos.append(self._upload)
+        self._hash_parte = hashlib.sha256()
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._descartar:
+            return
+        trozo = data[start:end]
+        if self._upload is None:
+            if len(self._datos) + len(trozo) > MAX_BYTES_CAMPO:
+                raise FormularioInvalido(f"El campo '{self._campo}' supera el máximo de {MAX_BYTES_CAMPO // 1024} KB")
+            self._datos.extend(trozo)
+            return
+        self._bytes_parte += len(trozo)
+        if self._bytes_parte > self.max_archivo:
+            raise CargaDemasiadoGrande(
+                f"El archivo '{self._campo}' supera el máximo de {_formatear_mb(self.max_archivo)}"
+            )
+        self._hash_parte.update(trozo)
+        self._por_escribir.append((self._upload, trozo))
+
+    def on_part_end(self) -> None:
+        if self._descartar:
+            return
+        if self._upload is None:
+            valor = self._datos.decode('utf-8', 'replace')
+            self._campos[self._campo] = valor
+            self.items.append((self._campo, valor))
+        else:
+            self._upload.file.huella = self._hash_parte.hexdigest()
+            self._por_terminar.append(self._upload)
+            self.items.append((self._campo, self._upload))
+
+    async def parse(self) -> FormData:
+        tipo, opciones = parse_options_header(self.headers.get('content-type'))
+        if tipo.lower() != b'multipart/form-data':
+            raise FormularioInvalido("Los archivos se deben enviar como multipart/form-data", status_code=415)
+        if not opciones.get(b'boundary'):
+            raise FormularioInvalido("Falta el boundary del multipart/form-data")
+
+        parser = MultipartParser(opciones[b'boundary'], {
+            'on_part_begin': self.on_part_begin,
+            'on_part_data': self.on_part_data,
+            'on_part_end': self.on_part_end,
+            'on_header_field': self.on_header_field,
+            'on_header_value': self.on_header_value,
+            'on_header_end': self.on_header_end,
+            'on_headers_finished': self.on_headers_finished,
+        })
+        try:
+            async for chunk in self.stream:
+                parser.write(chunk)
+                # Escribir fuera de los callbacks: si el spool ya está en disco se escribe en un thread
+                for upload, trozo in self._por_escribir:
+                    await upload.file.escribir(trozo)
+                    upload.size += len(trozo)
+                for upload in self._por_terminar:
+                    await upload.seek(0)
+                self._por_escribir.clear()
+                self._por_terminar.clear()
+            parser.finalize()
+        except MultipartParseError as e:
+            await self._cerrar()
+            raise FormularioInvalido(f"Formulario multipart inválido: {e}") from e
+        except BaseException:
+            await self._cerrar()
+            raise
+        return FormData(self.items)
+
+    async def _cerrar(self):
+        for upload in self._abiertos:
+            await upload.close()
+
+
+async def _stream_limitado(request: Request, max_request: int) -> AsyncGenerator[bytes, None]:
+    recibidos = 0
+    async for chunk in request.stream():
+        recibidos += len(chunk)
+        if recibidos > max_request:
+            raise CargaDemasiadoGrande(f"La carga supera el máximo de {_formatear_mb(max_request)} por envío")
+        yield chunk
+
+
+async def leer_formulario_kpi(request: Request, max_archivo: int, max_request: int, spool_max: int) -> FormData:
+    """
+    Lee el formulario multipart de /upload respetando los límites de tamaño.
+    Si el Content-Length ya excede el límite, se rechaza sin leer el body.
+    """
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > max_request:
+        raise CargaDemasiadoGrande(f"La carga supera el máximo de {_formatear_mb(max_request)} por envío")
+
+    parser = ParserCargaKPI(
+        request.headers,
+        _stream_limitado(request, max_request),
+        max_archivo=max_archivo,
+        spool_max=spool_max,
+    )
+    return await parser.parse()
+
+
+def fuente_para_worker(upload: UploadFile, en_proceso: bool) -> Union[bytes, str, SpoolKPI]:
+    """
+    Devuelve lo que el parser necesita para leer el archivo sin copiarlo:
+    el spool mismo si se procesa en un thread, o la ruta del spool en disco
+    si se procesa en otro proceso (si el spool sigue en memoria es chico y
+    se envían sus bytes).
+    """
+    spool = upload.file
+    spool.flush()
+    spool.seek(0)
+    if not en_proceso:
+        return spool
+    if isinstance(spool, SpoolKPI) and spool.ruta:
+        return spool.ruta
+    return spool.read()
+
+
+def huella_archivo(upload: UploadFile) -> Optional[str]:
+    """SHA-256 del archivo calculado durante la recepción."""
+    return getattr(upload.file, 'huella', None)
+
+
+def archivos_del_formulario(form: FormData, campos: Dict[str, str]) -> Dict[str, UploadFile]:
+    """Archivos subidos por KPI (se ignoran los inputs vacíos)."""
+    archivos = {}
+    for campo, kpi_nombre in campos.items():
+        upload = form.get(campo)
+        if isinstance(upload, UploadFile) and upload.filename:
+            archivos[kpi_nombre] = upload
+    return archivos
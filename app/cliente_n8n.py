@@ -0,0 +1,101 @@
+"""
+Cliente HTTP para el webhook de n8n.
+
+Un solo httpx.AsyncClient por aplicación (conexiones keep-alive reutilizadas,
+HTTP/2 si está instalado 'h2'), timeouts separados de conexión y lectura,
+reintentos con backoff exponencial con jitter ante 5xx y errores de red, y
+payloads grandes comprimidos con gzip. Cada envío lleva un Idempotency-Key
+que se mantiene entre reintentos, para que n8n pueda descartar duplicados.
+"""
+import asyncio
+import gzip
+import json
+import random
+import uuid
+from typing import Optional
+
+import httpx
+
+from metricas import Contador
+
+try:
+    import h2  # noqa: F401
+    HTTP2_DISPONIBLE = True
+except ImportError:
+    HTTP2_DISPONIBLE = False
+
+
+class ErrorN8N(Exception):
+    """El webhook respondió con error o no fue posible contactarlo."""
+
+    def __init__(self, mensaje: str, status_code: Optional[int] = None, intentos: int = 1):
+        super().__init__(mensaje)
+        self.status_code = status_code
+        self.intentos = intentos
+
+
+class ClienteN8N:
+
+    def __init__(self, url: str, timeout_conexion: float = 5.0, timeout_lectura: float = 60.0,
+                 reintentos: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 gzip_min_bytes: Optional[int] = 16 * 1024, max_conexiones: int = 10,
+                 contador_reintentos: Optional[Contador] = None):
+        self.url = url
+        self.reintentos = reintentos
+        # Reintentos por motivo ('http_5xx' o 'conexion'), para /metrics
+        self.contador_reintentos = contador_reintentos
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.gzip_min_bytes = gzip_min_bytes
+        self._client = httpx.AsyncClient(
+            http2=HTTP2_DISPONIBLE,
+            timeout=httpx.Timeout(timeout_lectura, connect=timeout_conexion),
+            limits=httpx.Limits(max_connections=max_conexiones, max_keepalive_connections=max_conexiones),
+        )
+
+    def _espera(self, intento: int) -> float:
+        """Backoff exponencial con 'full jitter'."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** intento)))
+
+    def _preparar(self, payload: dict, clave_idempotencia: str):
+        cuerpo = json.dumps(payload).encode('utf-8')
+        headers = {
+            'Content-Type': 'application/json',
+            'Idempotency-Key': clave_idempotencia,
+        }
+        if self.gzip_min_bytes is not None and len(cuerpo) >= self.gzip_min_bytes:
+            cuerpo = gzip.compress(cuerpo, compresslevel=6)
+            headers['Content-Encoding'] = 'gzip'
+        return cuerpo, headers
+
+    async def enviar(self, payload: dict, clave_idempotencia: Optional[str] = None) -> httpx.Response:
+        """
+        POST del payload al webhook. Reintenta ante 5xx y errores de conexión;
+        cualquier otra respuesta se devuelve tal cual.
+        """
+        clave_idempotencia = clave_idempotencia or uuid.uuid4().hex
+        cuerpo, headers = self._preparar(payload, clave_idempotencia)
+
+        intento = 0
+        while True:
+            try:
+                response = await self._client.post(self.url, content=cuerpo, headers=headers)
+                if response.status_code < 500:
+                    return response
+                error = ErrorN8N(f"Error en n8n: {response.status_code}", response.status_code, intento + 1)
+                motivo = 'http_5xx'
+            except httpx.TransportError as e:
+                error = ErrorN8N(f"Error de conexión con n8n: {e!r}", intentos=intento + 1)
+                motivo = 'conexion'
+
+            if intento >= self.reintentos:
+                raise error
+            if self.contador_reintentos is not None:
+                self.contador_reintentos.inc(motivo=motivo)
+            espera = self._espera(intento)
+            print(f"{error} (intento {intento + 1}), reintentando en {espera:.2f} s")
+            await asyncio.sleep(espera)
+            intento += 1
+
+    async def cerrar(self):
+        await self._client.aclose()
@@ -0,0 +1,192 @@
+"""
+Evaluación de KPIs para equipos completos, vectorizada con numpy.
+
+Reproduce la lógica de script.js (evaluarKPIs, obtenerSemaforoKPI,
+rankingKPIs, y normalizarKPI/calcularScoreCOPC/clasificarCOPC con las alertas
+de processData) sobre una matriz ejecutivos x KPIs en lugar de un ejecutivo a
+la vez. Recibe los registros con el formato de unificar_datos_kpi
+({'ejecutivo', 'tmo', 'transfepa', ...}).
+"""
+from typing import List, Optional
+
+import numpy as np
+
+from normas_kpi import NOMBRES_NORMA, NORMAS_KPI
+from persistencia import CAMPOS_API
+
+COLUMNAS = list(NORMAS_KPI)
+
+VERDE = 0
+AMARILLO = 1
+ROJO = 2
+ESTADOS = ['VERDE', 'AMARILLO', 'ROJO']
+
+_META = np.array([NORMAS_KPI[col]['meta'] for col in COLUMNAS], dtype=float)
+_TOLERANCIA = np.array([NORMAS_KPI[col]['tolerancia'] for col in COLUMNAS], dtype=float)
+_MENOR = np.array([NORMAS_KPI[col]['tipo'] == 'menor' for col in COLUMNAS])
+
+# Columna -> nombre del campo en la API (/kpis)
+_CLAVES_API = {columna: campo for campo, columna in CAMPOS_API.items() if columna in NORMAS_KPI}
+
+# Ponderación COPC (pesosCOPC en script.js)
+PESOS_COPC = {
+    'tmo': 0.15,
+    'satep': 0.15,
+    'resep': 0.20,
+    'satsnl': 0.15,
+    'ressnl': 0.15,
+    'transfepa': 0.10,
+    'tipificaciones': 0.10,
+}
+
+# Penalización por alerta (penalizacionAlerta en script.js)
+PENALIZACION_ALERTA = {'advertencia': 5, 'critica': 15}
+
+# Clasificación del score: (mínimo, nivel, color), de mayor a menor
+NIVELES_COPC = [(90, 'ÓPTIMO', 'green'), (75, 'CONTROL', 'yellow'), (0, 'RIESGO', 'red')]
+
+_PESOS = np.array([PESOS_COPC[col] for col in COLUMNAS])
+_ES_TMO = np.array([col == 'tmo' for col in COLUMNAS])
+
+
+def matriz_kpis(registros: List[dict]) -> np.ndarray:
+    """Matriz (ejecutivos x KPIs) en el orden de COLUMNAS, NaN donde falta el valor."""
+    valores = np.full((len(registros), len(COLUMNAS)), np.nan)
+    for i, registro in enumerate(registros):
+        for j, col in enumerate(COLUMNAS):
+            valor = registro.get(col)
+            if valor is not None:
+                valores[i, j] = valor
+    return valores
+
+
+def _como_dashboard(valores: np.ndarray) -> np.ndarray:
+    # Valores de cálculo de processData: un valor faltante cuenta como 0 y los
+    # porcentajes en fracción (0 < v <= 1) se llevan a 0-100 (normalizePercent), salvo TMO
+    v = np.nan_to_num(valores, nan=0.0)
+    return np.where(~_ES_TMO & (v > 0) & (v <= 1), v * 100, v)
+
+
+def cumplimiento(valores: np.ndarray) -> np.ndarray:
+    """Matriz booleana: el ejecutivo cumple la norma del KPI (evaluarKPIs)."""
+    v = _como_dashboard(valores)
+    return np.where(_MENOR, v <= _META, v >= _META)
+
+
+def semaforos(valores: np.ndarray) -> np.ndarray:
+    """Matriz VERDE/AMARILLO/ROJO (0/1/2) según meta y tolerancia (obtenerSemaforoKPI)."""
+    v = _como_dashboard(valores)
+    verde = cumplimiento(valores)
+    amarillo = np.where(_MENOR, v <= _META + _TOLERANCIA, v >= _META - _TOLERANCIA)
+    return np.where(verde, VERDE, np.where(amarillo, AMARILLO, ROJO)).astype(np.int8)
+
+
+def ranking_kpis(registros: List[dict], top: Optional[int] = None) -> List[dict]:
+    """
+    Ranking como rankingKPIs sobre los valores de processData (kpiTotal con
+    normalizePercent): más KPIs cumplidos primero y, en empate, menos rojos;
+    si sigue el empate se mantiene el orden de entrada (sort estable).
+    Con `top` solo se ordenan los primeros (selección parcial).
+    """
+    n = len(registros)
+    if n == 0:
+        return []
+
+    valores = matriz_kpis(registros)
+    cumple = cumplimiento(valores)
+    total = cumple.sum(axis=1)
+    rojos = (semaforos(valores) == ROJO).sum(axis=1)
+
+    # Una sola clave entera equivalente a ordenar por (-total, rojos, posición)
+    k = len(COLUMNAS) + 1
+    clave = ((len(COLUMNAS) - total) * k + rojos) * n + np.arange(n)
+    if top is not None and top < n:
+        orden = np.argpartition(clave, top - 1)[:top]
+        orden = orden[np.argsort(clave[orden])]
+    else:
+        orden = np.argsort(clave)
+
+    ranking = []
+    for posicion, i in enumerate(orden, start=1):
+        registro = registros[i]
+        ranking.append({
+            "ranking": posicion,
+            "name": registro['ejecutivo'],
+            "kpiTotal": int(total[i]),
+            "rojos": int(rojos[i]),
+            "kpiDetalle": {NOMBRES_NORMA[col]: int(cumple[i, j]) for j, col in enumerate(COLUMNAS)},
+            **{_CLAVES_API[col]: registro.get(col) for col in COLUMNAS}
+        })
+    return ranking
+
+
+def valores_copc(valores: np.ndarray) -> np.ndarray:
+    """
+    Valores de cálculo de processData: faltante = 0 y porcentajes en
+    fracción (0 < v <= 1) llevados a 0-100 (normalizePercent); TMO sin cambios.
+    """
+    return _como_dashboard(valores)
+
+
+def normalizar_kpis(v: np.ndarray) -> np.ndarray:
+    """normalizarKPI para toda la matriz: 0-100, TMO invertido (meta / valor)."""
+    con_divisor = np.where(v == 0, 1.0, v)
+    tmo = np.where(v == 0, 100.0, _META / con_divisor * 100)
+    normalizado = np.where(_ES_TMO, tmo, v / _META * 100)
+    return np.clip(normalizado, 0, 100)
+
+
+def alertas_kpis(v: np.ndarray):
+    """
+    Alertas de processData: un KPI fuera de meta es 'critica' si se aleja más
+    del 10% de la meta y 'advertencia' si no. Devuelve (criticas, advertencias).
+    """
+    falla = np.where(_ES_TMO, v > _META, v < _META)
+    desvio = np.where(_ES_TMO, v - _META, _META - v) / _META
+    criticas = falla & (desvio > 0.1)
+    return criticas, falla & ~criticas
+
+
+def score_copc(registros: List[dict]) -> List[dict]:
+    """Score COPC (0-100), nivel, alertas y semáforos de cada ejecutivo, en el orden de entrada."""
+    if not registros:
+        return []
+
+    valores = matriz_kpis(registros)
+    v = valores_copc(valores)
+    normalizados = normalizar_kpis(v)
+    criticas, advertencias = alertas_kpis(v)
+    penalizacion = (criticas.sum(axis=1) * PENALIZACION_ALERTA['critica']
+                    + advertencias.sum(axis=1) * PENALIZACION_ALERTA['advertencia'])
+    # Math.round de JS redondea los .5 hacia arriba
+    scores = np.maximum(0, np.floor(normalizados @ _PESOS - penalizacion + 0.5)).astype(int)
+    estados = semaforos(valores)
+
+    umbrales = np.array([minimo for minimo, _, _ in NIVELES_COPC])
+    indice_nivel = np.argmax(scores[:, None] >= umbrales[None, :], axis=1)
+
+    resultado = []
+    for i, registro in enumerate(registros):
+        _, nivel, color = NIVELES_COPC[indice_nivel[i]]
+        resultado.append({
+            "name": registro['ejecutivo'],
+            "score": int(scores[i]),
+            "nivel": nivel,
+            "color": color,
+            "normalizados": {_CLAVES_API[col]: round(float(normalizados[i, j]), 2) for j, col in enumerate(COLUMNAS)},
+            "alertas": [
+                {"kpi": _CLAVES_API[col], "nivel": 'critica' if criticas[i, j] else 'advertencia'}
+                for j, col in enumerate(COLUMNAS) if criticas[i, j] or advertencias[i, j]
+            ],
+            "semaforos": {NOMBRES_NORMA[col]: ESTADOS[estados[i, j]] for j, col in enumerate(COLUMNAS)},
+        })
+    return resultado
+
+
+def resumen_copc(evaluados: List[dict]) -> dict:
+    """Cantidad de ejecutivos por nivel y score promedio del equipo."""
+    por_nivel = {nivel: 0 for _, nivel, _ in NIVELES_COPC}
+    for evaluado in evaluados:
+        por_nivel[evaluado['nivel']] += 1
+    promedio = round(sum(e['score'] for e in evaluados) / len(evaluados), 2) if evaluados else None
+    return {"por_nivel": por_nivel, "score_promedio": promedio}
@@ -0,0 +1,91 @@
+"""
+Armado de /kpis/historial a partir del resumen mensual (persistencia).
+
+El formato por defecto es el que consumen predecir/priorizarRiesgo en
+script.js: una serie (antiguo -> reciente) por KPI con el promedio del
+equipo en cada mes, solo con las claves que conoce el dashboard. El formato
+detallado agrega, por mes, cantidad de valores, mínimo, máximo y cuántos
+ejecutivos cumplen la meta.
+"""
+from typing import Dict, List
+
+from normas_kpi import NORMAS_KPI
+
+# Columna -> clave del historial en script.js (const historial)
+CLAVES_HISTORIAL = {
+    'resep': 'resEP',
+    'satep': 'satEP',
+    'tmo': 'tmo',
+    'transfepa': 'epa',
+    'satsnl': 'satSNL',
+}
+
+# Columna -> clave de las metas en script.js (const metas), para el detalle
+CLAVES_DETALLE = {
+    'tmo': 'tmo',
+    'satep': 'satEP',
+    'resep': 'resEP',
+    'satsnl': 'satSNL',
+    'ressnl': 'resSNL',
+    'transfepa': 'transfEPA',
+    'tipificaciones': 'tipificaciones',
+}
+
+
+def _redondear(valor):
+    return round(valor, 2) if valor is not None else None
+
+
+def historial_equipo(resumen: List[dict]) -> Dict[str, list]:
+    """{'resEP': [90.1, 91.3, ...], ...} con el promedio del equipo por mes."""
+    historial = {clave: [] for clave in CLAVES_HISTORIAL.values()}
+    for fila in resumen:
+        clave = CLAVES_HISTORIAL.get(fila['kpi'])
+        if clave is not None:
+            historial[clave].append(_redondear(fila['promedio']))
+    return historial
+
+
+def historial_ejecutivo(serie: List[dict]) -> Dict[str, list]:
+    """Mismo formato que historial_equipo, con los valores de un ejecutivo."""
+    historial = {clave: [] for clave in CLAVES_HISTORIAL.values()}
+    for fila in serie:
+        for columna, clave in CLAVES_HISTORIAL.items():
+            if fila[columna] is not None:
+                historial[clave].append(_redondear(fila[columna]))
+    return historial
+
+
+def historial_detalle(resumen: List[dict]) -> dict:
+    """
+    {'meses': [{'mes', 'anio'}, ...], 'kpis': {'tmo': {'meta', 'tipo', 'promedio': [...],
+    'n': [...], 'minimo': [...], 'maximo': [...], 'cumplen': [...]}, ...}}
+    Las listas están alineadas con 'meses' (None si el KPI no tiene datos ese mes).
+    """
+    meses = []
+    indice = {}
+    for fila in resumen:
+        periodo = (fila['anio'], fila['mes'])
+        if periodo not in indice:
+            indice[periodo] = len(meses)
+            meses.append({"mes": fila['mes'], "anio": fila['anio']})
+
+    kpis = {}
+    for columna, clave in CLAVES_DETALLE.items():
+        kpis[clave] = {
+            "meta": NORMAS_KPI[columna]['meta'],
+            "tipo": NORMAS_KPI[columna]['tipo'],
+            **{campo: [None] * len(meses) for campo in ('promedio', 'n', 'minimo', 'maximo', 'cumplen')}
+        }
+    for fila in resumen:
+        clave = CLAVES_DETALLE.get(fila['kpi'])
+        if clave is None:
+            continue
+        i = indice[(fila['anio'], fila['mes'])]
+        datos = kpis[clave]
+        datos['promedio'][i] = _redondear(fila['promedio'])
+        datos['n'][i] = fila['n']
+        datos['minimo'][i] = fila['minimo']
+        datos['maximo'][i] = fila['maximo']
+        datos['cumplen'][i] = fila['cumplen']
+    return {"meses": meses, "kpis": kpis}
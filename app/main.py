@@ -1,13 +1,39 @@
-from fastapi import FastAPI, File, UploadFile, Form, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional, Dict
-import pandas as pd
-import tempfile
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+import asyncio
+import hmac
+import html
 import os
-from datetime import datetime
-import mysql.connector
-from mysql.connector import Error
+import sys
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from cache_lru import CacheLRU
+from cache_respuestas import CacheRespuestas, InvalidacionesSQLite, etag_coincide
+from carga_archivos import (CargaDemasiadoGrande, FormularioInvalido, archivos_del_formulario, fuente_para_worker,
+                            huella_archivo, leer_formulario_kpi)
+from historial_kpi import historial_detalle, historial_ejecutivo, historial_equipo
+from metricas import BUCKETS_BYTES, RegistroMetricas
+from outbox import FlusherOutbox, OutboxN8N
+from perfilador import en_perfil, iniciar_perfil, listar_reportes, obtener_reporte
+from persistencia import CAMPOS_API, MESES_ESP, RepositorioKPI, crear_repositorio, periodo_desde_fecha
+from sesiones import crear_almacen_sesiones
+from trabajos import EXITOSO, FALLIDO, PENDIENTE_ENVIO, ColaTrabajos, crear_almacen_trabajos
+
+# Los módulos pesados (pandas/openpyxl para el parseo, numpy para evaluación y
+# pronóstico, httpx para n8n) se importan recién al usarlos, así /health y el
+# formulario responden apenas arranca el proceso. precalentar() los carga en
+# segundo plano y /ready informa cuándo está todo listo.
+MODULOS_PESADOS = ['procesamiento_kpi', 'evaluacion_kpi', 'pronostico_kpi', 'cliente_n8n']
+
+if TYPE_CHECKING:
+    from cliente_n8n import ClienteN8N
+    from procesamiento_kpi import FuenteArchivo
 
 app = FastAPI()
 
@@ -35,96 +61,415 @@ DB_CONFIG = {
     'password': os.getenv('DB_PASSWORD', '')
 }
 
-def procesar_archivo_kpi(archivo_bytes: bytes, kpi_nombre: str) -> Dict[str, float]:
+# Destino de /confirm: 'n8n' (webhook) o 'db' (inserción directa en la BD)
+KPI_PERSISTENCIA = os.getenv('KPI_PERSISTENCIA', 'n8n')
+# KPI_DB_BACKEND: 'mysql' (DB_CONFIG) o 'sqlite' (base local para desarrollo/pruebas)
+KPI_DB_BACKEND = os.getenv('KPI_DB_BACKEND', 'mysql')
+KPI_DB_SQLITE_PATH = os.getenv('KPI_DB_SQLITE_PATH', 'kpi_local.sqlite3')
+KPI_DB_TABLE = os.getenv('KPI_DB_TABLE', 'kpis')
+KPI_DB_POOL_SIZE = int(os.getenv('KPI_DB_POOL_SIZE', '5'))
+KPI_DB_BATCH_SIZE = int(os.getenv('KPI_DB_BATCH_SIZE', '500'))
+# Tamaño de página de /kpis (lectura para el dashboard)
+KPI_API_PAGE_SIZE = int(os.getenv('KPI_API_PAGE_SIZE', '1000'))
+KPI_API_PAGE_SIZE_MAX = int(os.getenv('KPI_API_PAGE_SIZE_MAX', '5000'))
+
+
+# Snapshots columnares del historial (KPI_SNAPSHOTS=1): un .npy por mes y KPI,
+# abiertos con memory-mapping por ranking, COPC y pronóstico en lugar de la BD
+KPI_SNAPSHOTS = os.getenv('KPI_SNAPSHOTS', '0') == '1'
+KPI_SNAPSHOT_DIR = os.getenv('KPI_SNAPSHOT_DIR', 'kpi_snapshots')
+
+snapshots_kpi = None
+if KPI_SNAPSHOTS:
+    from snapshots_kpi import SnapshotsKPI
+    snapshots_kpi = SnapshotsKPI(KPI_SNAPSHOT_DIR)
+
+# Métricas de la carga (GET /metrics, formato Prometheus)
+metricas = RegistroMetricas()
+LATENCIA_ETAPAS = metricas.histograma(
+    'kpi_etapa_segundos', 'Duración de cada etapa de la carga (multipart, parse, unificar, preview, n8n, db)', ['etapa']
+)
+LATENCIA_PARSE = metricas.histograma('kpi_parse_segundos', 'Duración del parseo de cada archivo KPI', ['kpi'])
+BYTES_ARCHIVOS = metricas.histograma('kpi_archivo_bytes', 'Tamaño de cada archivo KPI subido', ['kpi'], BUCKETS_BYTES)
+FILAS_LEIDAS = metricas.contador('kpi_filas_leidas_total', 'Filas de datos leídas de cada archivo KPI', ['kpi'])
+FILAS_DESCARTADAS = metricas.contador(
+    'kpi_filas_descartadas_total', 'Filas descartadas por no tener ejecutivo o estar repetidas', ['kpi']
+)
+VALORES_VACIOS = metricas.contador('kpi_valores_vacios_total', 'Ejecutivos sin valor numérico en el KPI', ['kpi'])
+ERRORES_PARSE = metricas.contador('kpi_parse_errores_total', 'Archivos KPI que no se pudieron procesar', ['kpi'])
+ESCRITURAS = metricas.contador('kpi_escrituras_total', 'Envíos a n8n o inserciones en la BD, por resultado', ['destino', 'resultado'])
+REINTENTOS_N8N = metricas.contador('kpi_n8n_reintentos_total', 'Reintentos de envío al webhook de n8n, por motivo', ['motivo'])
+
+# Perfilado a pedido (solo administradores): con KPI_PROFILING_TOKEN definido, un
+# /upload, /preview o /confirm con el header X-KPI-Profile: <token> corre con el
+# perfilador y el reporte queda en GET /debug/perfiles/{id}. El token solo se acepta
+# en el header (no en la URL, donde quedaría en logs de proxies e historial)
+KPI_PROFILING_TOKEN = os.getenv('KPI_PROFILING_TOKEN', '')
+KPI_PROFILING_DIR = os.getenv('KPI_PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'kpi_perfiles'))
+KPI_PROFILING_INTERVAL_MS = float(os.getenv('KPI_PROFILING_INTERVAL_MS', '5'))
+KPI_PROFILING_MAX_REPORTS = int(os.getenv('KPI_PROFILING_MAX_REPORTS', '50'))
+# Seguimiento de asignaciones con tracemalloc (hace la carga perfilada varias veces más lenta)
+KPI_PROFILING_MEMORY = os.getenv('KPI_PROFILING_MEMORY', '1') == '1'
+
+_repositorio = None
+_lock_repositorio = threading.Lock()
+
+# Webhook de n8n y política del cliente HTTP (un cliente para toda la app)
+N8N_WEBHOOK_URL = os.getenv('N8N_WEBHOOK_URL', 'https://kpi-dashboard-n8n.f7jaui.easypanel.host/webhook/kpi-upload')
+N8N_CONNECT_TIMEOUT = float(os.getenv('N8N_CONNECT_TIMEOUT', '5'))
+N8N_READ_TIMEOUT = float(os.getenv('N8N_READ_TIMEOUT', '60'))
+N8N_RETRIES = int(os.getenv('N8N_RETRIES', '3'))
+# Payloads desde este tamaño se envían con gzip (vacío = nunca comprimir)
+N8N_GZIP_MIN_BYTES = os.getenv('N8N_GZIP_MIN_BYTES', str(16 * 1024))
+
+_cliente_n8n = None
+_lock_cliente_n8n = threading.Lock()
+
+# Outbox durable para n8n: con KPI_N8N_OUTBOX=1 cada confirmación se guarda en disco
+# y un flusher la envía, fusionando los lotes pendientes de la misma fecha.
+KPI_N8N_OUTBOX = os.getenv('KPI_N8N_OUTBOX', '0') == '1'
+KPI_OUTBOX_PATH = os.getenv('KPI_OUTBOX_PATH', 'kpi_outbox.sqlite3')
+
+outbox_n8n = None
+flusher_outbox = None
+if KPI_N8N_OUTBOX:
+    # Un lote que falla KPI_OUTBOX_MAX_ATTEMPTS veces (o con un 4xx) queda como 'fallido' en /stats
+    outbox_n8n = OutboxN8N(
+        KPI_OUTBOX_PATH,
+        max_intentos=int(os.getenv('KPI_OUTBOX_MAX_ATTEMPTS', '12')),
+        backoff_max=float(os.getenv('KPI_OUTBOX_BACKOFF_MAX', '600'))
+    )
+    flusher_outbox = FlusherOutbox(
+        outbox_n8n,
+        lambda registros, fecha_registro, clave: enviar_desde_outbox(registros, fecha_registro, clave),
+        intervalo=float(os.getenv('KPI_OUTBOX_FLUSH_SECONDS', '2')),
+        max_registros=int(os.getenv('KPI_OUTBOX_MAX_REGISTROS', '5000')),
+        max_espera=float(os.getenv('KPI_OUTBOX_MAX_WAIT', '5')),
+        retencion=float(os.getenv('KPI_OUTBOX_RETENTION', '86400'))
+    )
+
+@app.on_event("startup")
+async def iniciar_flusher_outbox():
+    # Al iniciar se reanuda lo que haya quedado pendiente antes de un reinicio
+    if flusher_outbox is not None:
+        flusher_outbox.iniciar()
+
+@app.on_event("shutdown")
+async def detener_flusher_outbox():
+    if flusher_outbox is not None:
+        await flusher_outbox.detener()
+
+def obtener_cliente_n8n() -> 'ClienteN8N':
+    global _cliente_n8n
+    if _cliente_n8n is None:
+        # El precalentamiento (en un thread) y el primer envío pueden llegar a la vez: un solo cliente
+        with _lock_cliente_n8n:
+            if _cliente_n8n is None:
+                from cliente_n8n import ClienteN8N
+                _cliente_n8n = ClienteN8N(
+                    N8N_WEBHOOK_URL,
+                    timeout_conexion=N8N_CONNECT_TIMEOUT,
+                    timeout_lectura=N8N_READ_TIMEOUT,
+                    reintentos=N8N_RETRIES,
+                    gzip_min_bytes=int(N8N_GZIP_MIN_BYTES) if N8N_GZIP_MIN_BYTES else None,
+                    contador_reintentos=REINTENTOS_N8N
+                )
+    return _cliente_n8n
+
+@app.on_event("shutdown")
+async def cerrar_cliente_n8n():
+    global _cliente_n8n
+    if _cliente_n8n is not None:
+        await _cliente_n8n.cerrar()
+        _cliente_n8n = None
+
+def obtener_repositorio() -> RepositorioKPI:
+    """Crea el repositorio (y el pool de conexiones) la primera vez que se usa."""
+    global _repositorio
+    if _repositorio is None:
+        # El precalentamiento y un request pueden llegar a la vez: un solo pool
+        with _lock_repositorio:
+            if _repositorio is None:
+                _repositorio = crear_repositorio(
+                    KPI_DB_BACKEND,
+                    DB_CONFIG,
+                    pool_size=KPI_DB_POOL_SIZE,
+                    ruta_sqlite=KPI_DB_SQLITE_PATH,
+                    tabla=KPI_DB_TABLE
+                )
+    return _repositorio
+
+# Pool para procesar los archivos KPI en paralelo y fuera del event loop.
+# KPI_PARSE_POOL: 'process' (openpyxl es Python puro y no suelta el GIL) o 'thread'
+KPI_PARSE_POOL = os.getenv('KPI_PARSE_POOL', 'process')
+KPI_PARSE_WORKERS = int(os.getenv('KPI_PARSE_WORKERS', '4'))
+KPI_PARSE_TIMEOUT = float(os.getenv('KPI_PARSE_TIMEOUT', '60'))
+
+_parse_executor = None
+# True cuando los workers del pool ya arrancaron e importaron el parser
+_parse_pool_listo = False
+
+def tamano_serie(serie) -> int:
+    from procesamiento_kpi import tamano_serie as medir
+    return medir(serie)
+
+# Cache de archivos ya procesados, por contenido: (sha256, KPI, versión del parser) -> serie.
+# Re-subir los mismos archivos (reintentos, cambio de fecha) no vuelve a parsearlos.
+parse_cache = CacheLRU(
+    max_entradas=int(os.getenv('KPI_PARSE_CACHE_ENTRIES', '64')),
+    max_bytes=int(os.getenv('KPI_PARSE_CACHE_MB', '64')) * 1024 * 1024,
+    ttl=float(os.getenv('KPI_PARSE_CACHE_TTL', '3600')),
+    medir=tamano_serie
+)
+
+# Límites de tamaño para /upload (bytes). Hasta KPI_UPLOAD_SPOOL_BYTES cada
+# archivo se mantiene en memoria; sobre eso se escribe a disco.
+KPI_UPLOAD_MAX_FILE_BYTES = int(os.getenv('KPI_UPLOAD_MAX_FILE_BYTES', str(25 * 1024 * 1024)))
+KPI_UPLOAD_MAX_REQUEST_BYTES = int(os.getenv('KPI_UPLOAD_MAX_REQUEST_BYTES', str(100 * 1024 * 1024)))
+KPI_UPLOAD_SPOOL_BYTES = int(os.getenv('KPI_UPLOAD_SPOOL_BYTES', str(1024 * 1024)))
+
+# Campo del formulario -> nombre del KPI
+CAMPOS_KPI = {
+    'tmo': 'TMO',
+    'transf_epa': 'TransfEPA',
+    'tipificaciones': 'Tipificaciones',
+    'sat_ep': 'SatEP',
+    'res_ep': 'ResEP',
+    'sat_snl': 'SatSNL',
+    'res_snl': 'ResSNL',
+}
+
+def obtener_parse_executor():
+    """Crea el pool de procesamiento la primera vez que se necesita."""
+    global _parse_executor
+    if _parse_executor is None:
+        if KPI_PARSE_POOL == 'thread':
+            _parse_executor = ThreadPoolExecutor(max_workers=KPI_PARSE_WORKERS, thread_name_prefix='kpi-parse')
+        else:
+            _parse_executor = ProcessPoolExecutor(max_workers=KPI_PARSE_WORKERS)
+    return _parse_executor
+
+def cerrar_parse_executor():
+    global _parse_executor, _parse_pool_listo
+    _parse_pool_listo = False
+    if _parse_executor is not None:
+        _parse_executor.shutdown(wait=False, cancel_futures=True)
+        _parse_executor = None
+
+def reciclar_parse_executor():
     """
-    Procesa un archivo KPI y extrae los valores por ejecutivo.
+    Descarta el pool después de un timeout o de un worker caído. shutdown()
+    no detiene las tareas en curso, así que con el pool de procesos se
+    terminan los workers (uno colgado ocuparía su lugar para siempre). Los
+    hilos no se pueden terminar: con KPI_PARSE_POOL=thread el hilo colgado
+    sigue hasta que termine su archivo.
     """
+    executor = _parse_executor
+    procesos = list((getattr(executor, '_processes', None) or {}).values())
+    cerrar_parse_executor()
+    for proceso in procesos:
+        if proceso.is_alive():
+            proceso.terminate()
+    if KPI_WARMUP:
+        # Para que /ready no quede esperando un pool que nadie vuelve a arrancar
+        asyncio.get_running_loop().create_task(recalentar_parse_pool())
+
+@app.on_event("shutdown")
+def shutdown_parse_executor():
+    cerrar_parse_executor()
+
+# Precalentamiento al iniciar (KPI_WARMUP=1): módulos pesados, pool de parseo,
+# cliente HTTP de n8n y pool de la BD, en segundo plano
+KPI_WARMUP = os.getenv('KPI_WARMUP', '1') == '1'
+# Reintentos del pool de la BD: espera inicial que se duplica hasta el máximo, y
+# cuántos intentos en total (0 = sin límite; después se crea con el primer request)
+KPI_WARMUP_DB_RETRY_SECONDS = float(os.getenv('KPI_WARMUP_DB_RETRY_SECONDS', '10'))
+KPI_WARMUP_DB_RETRY_MAX_SECONDS = float(os.getenv('KPI_WARMUP_DB_RETRY_MAX_SECONDS', '300'))
+KPI_WARMUP_DB_MAX_ATTEMPTS = int(os.getenv('KPI_WARMUP_DB_MAX_ATTEMPTS', '10'))
+
+# Las cargas solo dependen de la BD si se escriben directo en ella; con n8n
+# (con o sin outbox) la BD no es parte de /ready ni se espera a que responda
+CARGAS_USAN_DB = KPI_PERSISTENCIA == 'db'
+
+# Componente -> último error del precalentamiento (para /ready)
+errores_precalentamiento: Dict[str, str] = {}
+
+def cargar_modulos_pesados():
+    for modulo in MODULOS_PESADOS:
+        __import__(modulo)
+
+async def calentar_parse_pool():
+    """Arranca los workers del pool y les hace importar el parser."""
+    global _parse_pool_listo
+    from procesamiento_kpi import calentar_worker
+    
+    loop = asyncio.get_running_loop()
+    executor = obtener_parse_executor()
+    await asyncio.gather(*(loop.run_in_executor(executor, calentar_worker) for _ in range(KPI_PARSE_WORKERS)))
+    _parse_pool_listo = True
+
+async def recalentar_parse_pool():
     try:
-        # Guardar temporalmente el archivo
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp:
-            tmp.write(archivo_bytes)
-            tmp_path = tmp.name
-        
-        df = pd.read_excel(tmp_path)
-        os.unlink(tmp_path)
-        
-        # La primera columna tiene el nombre del ejecutivo
-        columna_ejecutivo = df.columns[0]
-        
-        # Para Tipificaciones, la columna correcta es la última (Total.1 que contiene %Tipif)
-        if kpi_nombre == 'Tipificaciones':
-            columna_valor = df.columns[-1]
-        else:
-            # La segunda columna tiene el valor del KPI
-            columna_valor = df.columns[1]
-        
-        # Saltar la primera fila (que tiene el nombre de la columna repetido)
-        df = df.iloc[1:]
-        
-        # Crear diccionario ejecutivo -> valor
-        resultado = {}
-        for _, row in df.iterrows():
-            ejecutivo = row[columna_ejecutivo]
-            valor = row[columna_valor]
-            
-            # Filtrar filas inválidas
-            if pd.isna(ejecutivo) or ejecutivo == '':
-                continue
-            if isinstance(ejecutivo, str) and ('Filtros aplicados' in ejecutivo or ejecutivo == 'Total'):
-                continue
-                
-            # Convertir valor a porcentaje (multiplicar por 100)
-            if pd.notna(valor) and isinstance(valor, (int, float)):
-                resultado[ejecutivo] = round(valor * 100, 2)
-            else:
-                resultado[ejecutivo] = None
-                
-        return resultado
+        await calentar_parse_pool()
+        errores_precalentamiento.pop('parse_pool', None)
     except Exception as e:
-        print(f"Error procesando {kpi_nombre}: {e}")
-        return {}
-
-def unificar_datos_kpi(archivos_data: Dict[str, bytes], kpis_omitidos: list) -> list:
-    """
-    Unifica los datos de todos los archivos KPI.
-    """
-    # Procesar cada archivo (solo los que no están omitidos)
-    datos_por_kpi = {}
-    for kpi_nombre, archivo_bytes in archivos_data.items():
-        if kpi_nombre not in kpis_omitidos:
-            datos_por_kpi[kpi_nombre] = procesar_archivo_kpi(archivo_bytes, kpi_nombre)
-    
-    # Obtener lista única de ejecutivos
-    todos_ejecutivos = set()
-    for datos in datos_por_kpi.values():
-        todos_ejecutivos.update(datos.keys())
-    
-    # Crear lista de registros unificados
-    registros = []
-    for ejecutivo in sorted(todos_ejecutivos):
-        registro = {'ejecutivo': ejecutivo}
-        for kpi_nombre in ['TMO', 'TransfEPA', 'Tipificaciones', 'SatEP', 'ResEP', 'SatSNL', 'ResSNL']:
-            if kpi_nombre in kpis_omitidos:
-                registro[kpi_nombre.lower()] = None
-            else:
-                registro[kpi_nombre.lower()] = datos_por_kpi.get(kpi_nombre, {}).get(ejecutivo, None)
-        registros.append(registro)
+        errores_precalentamiento['parse_pool'] = str(e)
+        print(f"Error precalentando parse_pool: {e}")
+
+async def precalentar():
+    loop = asyncio.get_running_loop()
+    pasos = [
+        # Los módulos van primero: los workers del pool (fork) los heredan ya importados
+        ('modulos', lambda: loop.run_in_executor(None, cargar_modulos_pesados)),
+        ('parse_pool', calentar_parse_pool),
+        ('cliente_http', lambda: loop.run_in_executor(None, obtener_cliente_n8n)),
+    ]
+    for componente, paso in pasos:
+        try:
+            await paso()
+            errores_precalentamiento.pop(componente, None)
+        except Exception as e:
+            errores_precalentamiento[componente] = str(e)
+            print(f"Error precalentando {componente}: {e}")
+    
+    await precalentar_db()
+
+async def precalentar_db():
+    """
+    Crea el pool de la BD y prepara el esquema. Si las cargas escriben en
+    ella y todavía no responde, se reintenta con espera exponencial y un
+    máximo de intentos; si no, basta un intento (las lecturas lo crean igual
+    cuando lo necesitan).
+    """
+    loop = asyncio.get_running_loop()
+    intentos_max = KPI_WARMUP_DB_MAX_ATTEMPTS if CARGAS_USAN_DB else 1
+    espera = KPI_WARMUP_DB_RETRY_SECONDS
+    intento = 0
+    while True:
+        intento += 1
+        try:
+            # Pool y esquema (en MySQL solo se verifica: columnas y clave única del upsert)
+            await loop.run_in_executor(None, lambda: obtener_repositorio().asegurar_tabla())
+            errores_precalentamiento.pop('db', None)
+            return
+        except Exception as e:
+            errores_precalentamiento['db'] = str(e)
+            print(f"Error precalentando la BD (intento {intento}): {e}")
+        if intentos_max and intento >= intentos_max:
+            print("Precalentamiento de la BD abandonado: se creará con el primer request que la use")
+            return
+        await asyncio.sleep(espera)
+        espera = min(espera * 2, KPI_WARMUP_DB_RETRY_MAX_SECONDS)
+
+def estado_componentes() -> Dict[str, bool]:
+    componentes = {
+        "modulos": all(modulo in sys.modules for modulo in MODULOS_PESADOS),
+        "parse_pool": _parse_executor is not None and _parse_pool_listo,
+        "cliente_http": _cliente_n8n is not None,
+    }
+    if CARGAS_USAN_DB:
+        componentes["db"] = _repositorio is not None and _repositorio.esquema_listo
+    return componentes
+
+@app.on_event("startup")
+async def iniciar_precalentamiento():
+    if KPI_WARMUP:
+        app.state.precalentamiento = asyncio.create_task(precalentar())
+
+@app.on_event("shutdown")
+async def detener_precalentamiento():
+    tarea = getattr(app.state, 'precalentamiento', None)
+    if tarea is not None:
+        tarea.cancel()
+
+async def procesar_kpis(archivos_data: Dict[str, 'FuenteArchivo'],
+                        huellas: Optional[Dict[str, str]] = None,
+                        perfilar: bool = False) -> Tuple[list, Dict[str, str]]:
+    """
+    Procesa todos los archivos KPI en paralelo en el pool.
+    Los archivos ya vistos (misma huella) se toman del cache de parseo.
+    Devuelve las series procesadas y los errores por KPI.
+    Con `perfilar` se parsea todo de nuevo y en hilos de este proceso, para
+    que el perfilador lo vea.
+    """
+    from procesamiento_kpi import VERSION_PARSER, extraer_kpi
     
-    return registros
+    huellas = huellas or {}
+    series = []
+    pendientes = {}
+    for kpi_nombre, archivo in archivos_data.items():
+        huella = huellas.get(kpi_nombre)
+        serie = parse_cache.get((huella, kpi_nombre, VERSION_PARSER)) if huella and not perfilar else None
+        if serie is not None:
+            series.append(serie)
+        else:
+            pendientes[kpi_nombre] = archivo
+
+    if not pendientes:
+        return series, {}
+
+    loop = asyncio.get_running_loop()
+    executor = None if perfilar else obtener_parse_executor()
+
+    async def parsear(kpi_nombre: str, archivo: 'FuenteArchivo'):
+        with LATENCIA_PARSE.medir(kpi=kpi_nombre):
+            return await asyncio.wait_for(
+                loop.run_in_executor(executor, en_perfil(extraer_kpi), archivo, kpi_nombre),
+                timeout=KPI_PARSE_TIMEOUT
+            )
+
+    tareas = [parsear(kpi_nombre, archivo) for kpi_nombre, archivo in pendientes.items()]
+    with LATENCIA_ETAPAS.medir(etapa='parse'):
+        resultados = await asyncio.gather(*tareas, return_exceptions=True)
+
+    errores = {}
+    reciclar = False
+    for kpi_nombre, resultado in zip(pendientes.keys(), resultados):
+        if isinstance(resultado, asyncio.TimeoutError):
+            errores[kpi_nombre] = f"Tiempo de procesamiento excedido ({KPI_PARSE_TIMEOUT:g} s)"
+            # wait_for solo deja de esperar: el worker sigue parseando
+            reciclar = executor is not None
+        elif isinstance(resultado, BaseException):
+            errores[kpi_nombre] = str(resultado) or type(resultado).__name__
+        else:
+            series.append(resultado)
+            registrar_filas(kpi_nombre, resultado)
+            if huellas.get(kpi_nombre):
+                parse_cache.put((huellas[kpi_nombre], kpi_nombre, VERSION_PARSER), resultado)
 
-async def enviar_a_n8n(registros: list, fecha_registro: str):
+        if isinstance(resultado, BrokenProcessPool):
+            # Un worker murió (p.ej. OOM): se recrea el pool en la próxima carga
+            reciclar = True
+
+    if reciclar and _parse_executor is executor:
+        reciclar_parse_executor()
+
+    for kpi_nombre, error in errores.items():
+        ERRORES_PARSE.inc(kpi=kpi_nombre)
+        print(f"Error procesando {kpi_nombre}: {error}")
+
+    return series, errores
+
+def registrar_filas(kpi_nombre: str, serie):
+    """Filas leídas, descartadas y sin valor de un archivo recién parseado."""
+    leidas = serie.attrs.get('filas_leidas', len(serie))
+    FILAS_LEIDAS.inc(leidas, kpi=kpi_nombre)
+    FILAS_DESCARTADAS.inc(leidas - len(serie), kpi=kpi_nombre)
+    VALORES_VACIOS.inc(int(serie.isna().sum()), kpi=kpi_nombre)
+
+async def enviar_a_n8n(registros: list, fecha_registro: str, clave_idempotencia: Optional[str] = None):
     """
     Envía los registros al webhook de n8n para procesamiento.
     """
+    with LATENCIA_ETAPAS.medir(etapa='n8n'):
+        result = await _enviar_a_n8n(registros, fecha_registro, clave_idempotencia)
+    ESCRITURAS.inc(destino='n8n', resultado='ok' if result["success"] else 'error')
+    return result
+
+async def _enviar_a_n8n(registros: list, fecha_registro: str, clave_idempotencia: Optional[str] = None):
     try:
-        import httpx
-        
         # Extraer año y mes de la fecha
-        fecha_obj = datetime.strptime(fecha_registro, '%Y-%m-%d')
-        anio = fecha_obj.year
-        meses_esp = ['ENERO', 'FEBRERO', 'MARZO', 'ABRIL', 'MAYO', 'JUNIO', 
-                     'JULIO', 'AGOSTO', 'SEPTIEMBRE', 'OCTUBRE', 'NOVIEMBRE', 'DICIEMBRE']
-        mes = meses_esp[fecha_obj.month - 1]
+        anio, mes = periodo_desde_fecha(fecha_registro)
         
         # Preparar payload para n8n
         payload = {
@@ -134,11 +479,8 @@ async def enviar_a_n8n(registros: list, fecha_registro: str):
             "mes": mes
         }
         
-        # Llamar al webhook de n8n
-        n8n_webhook_url = "https://kpi-dashboard-n8n.f7jaui.easypanel.host/webhook/kpi-upload"
-        
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(n8n_webhook_url, json=payload)
+        # Llamar al webhook de n8n (reintenta 5xx y errores de conexión)
+        response = await obtener_cliente_n8n().enviar(payload, clave_idempotencia)
             
         if response.status_code == 200:
             result = response.json()
@@ -149,20 +491,234 @@ async def enviar_a_n8n(registros: list, fecha_registro: str):
         else:
             return {
                 "success": False,
-                "error": f"Error en n8n: {response.status_code}"
+                "error": f"Error en n8n: {response.status_code}",
+                "status_code": response.status_code
             }
             
     except Exception as e:
         print(f"Error llamando a n8n: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "status_code": getattr(e, 'status_code', None)
+        }
+
+async def insertar_en_db(registros: list, fecha_registro: str):
+    """
+    Inserta los registros directo en la BD (upsert por lotes en una transacción).
+    """
+    with LATENCIA_ETAPAS.medir(etapa='db'):
+        result = await _insertar_en_db(registros, fecha_registro)
+    ESCRITURAS.inc(destino='db', resultado='ok' if result["success"] else 'error')
+    return result
+
+async def _insertar_en_db(registros: list, fecha_registro: str):
+    try:
+        loop = asyncio.get_running_loop()
+        resultado = await loop.run_in_executor(
+            None,
+            en_perfil(lambda: obtener_repositorio().insertar_registros(registros, fecha_registro, KPI_DB_BATCH_SIZE))
+        )
+        return {
+            "success": True,
+            "data": resultado
+        }
+    except Exception as e:
+        print(f"Error insertando en BD: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+async def encolar_en_outbox(registros: list, fecha_registro: str):
+    """
+    Guarda los registros en el outbox local; el flusher los envía a n8n.
+    """
+    try:
+        periodo_desde_fecha(fecha_registro)
+        loop = asyncio.get_running_loop()
+        outbox_id = await loop.run_in_executor(None, en_perfil(outbox_n8n.agregar), registros, fecha_registro)
+        flusher_outbox.notificar()
+        return {
+            "success": True,
+            # El trabajo queda como 'pending_delivery' hasta que el flusher lo envíe
+            "pendiente_envio": True,
+            "data": {"outbox_id": outbox_id, "estado": "pendiente"}
+        }
+    except Exception as e:
+        print(f"Error guardando en outbox: {e}")
         return {
             "success": False,
             "error": str(e)
         }
 
+async def enviar_desde_outbox(registros: list, fecha_registro: str, clave_idempotencia: str):
+    result = await enviar_a_n8n(registros, fecha_registro, clave_idempotencia)
+    if result["success"]:
+        await registrar_cambio_periodo(fecha_registro)
+    return result
+
+async def persistir_registros(registros: list, fecha_registro: str, clave_idempotencia: Optional[str] = None):
+    """Envía los registros confirmados al destino configurado (KPI_PERSISTENCIA)."""
+    if KPI_PERSISTENCIA == 'db':
+        result = await insertar_en_db(registros, fecha_registro)
+    elif outbox_n8n is not None:
+        # Los datos llegan a la BD cuando el flusher los envía (enviar_desde_outbox)
+        return await encolar_en_outbox(registros, fecha_registro)
+    else:
+        result = await enviar_a_n8n(registros, fecha_registro, clave_idempotencia)
+    
+    if result["success"]:
+        # La inserción directa ya actualizó catálogo y resumen en su transacción
+        await registrar_cambio_periodo(fecha_registro, actualizar_resumen=KPI_PERSISTENCIA != 'db')
+    return result
+
+async def registrar_cambio_periodo(fecha_registro: str, actualizar_resumen: bool = True):
+    """
+    Se llama cada vez que los registros de una fecha quedan persistidos
+    (cualquier camino de escritura debe pasar por aquí).
+    """
+    anio, mes = periodo_desde_fecha(fecha_registro)
+    if actualizar_resumen:
+        # n8n escribió en la BD: se recalculan catálogo y resumen solo de este periodo
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, en_perfil(lambda: obtener_repositorio().actualizar_periodo(anio, mes)))
+        except Exception as e:
+            print(f"Error actualizando resumen de {mes} {anio}: {e}")
+    if snapshots_kpi is not None:
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, en_perfil(lambda: sincronizar_snapshots((anio, mes))))
+        except Exception as e:
+            print(f"Error actualizando snapshot de {mes} {anio}: {e}")
+    if _invalidaciones_compartidas is not None:
+        await asyncio.get_running_loop().run_in_executor(None, cache_lecturas.invalidar_periodo, anio, mes)
+    else:
+        cache_lecturas.invalidar_periodo(anio, mes)
+    # El pronóstico se recalcula ya, para que el modal predictivo lo encuentre en cache
+    tarea = asyncio.create_task(precalcular_pronostico())
+    _tareas_precalculo.add(tarea)
+    tarea.add_done_callback(_tareas_precalculo.discard)
+
+_tareas_precalculo = set()
+
+async def precalcular_pronostico():
+    try:
+        await obtener_cacheado(*_consulta_pronostico())
+    except Exception as e:
+        print(f"Error precalculando pronóstico: {e}")
+
+def sincronizar_snapshots(periodo: Optional[Tuple[int, str]] = None):
+    """
+    Reescribe los snapshots de los meses que cambiaron en la BD (según el
+    catálogo de meses), o solo el del periodo indicado.
+    """
+    repositorio = obtener_repositorio()
+    versiones = snapshots_kpi.versiones()
+    for fila in repositorio.meses_disponibles():
+        anio, mes = fila['anio'], fila['mes']
+        if periodo is not None and (anio, mes) != periodo:
+            continue
+        mes_num = MESES_ESP.index(mes) + 1
+        sello = f"{fila['registros']}|{fila['ejecutivos']}|{fila['ultima_fecha']}|{fila['actualizado']}"
+        if versiones.get(snapshots_kpi.clave_mes(anio, mes_num)) == sello:
+            continue
+        snapshots_kpi.reconstruir_mes(anio, mes, mes_num, repositorio.registros_vigentes(anio, mes), sello)
+
+@app.on_event("startup")
+async def iniciar_snapshots():
+    # Se ponen al día en segundo plano; mientras tanto las lecturas usan la BD
+    if snapshots_kpi is None:
+        return
+    
+    async def sincronizar():
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, sincronizar_snapshots)
+        except Exception as e:
+            print(f"Error sincronizando snapshots: {e}")
+    app.state.sincronizacion_snapshots = asyncio.create_task(sincronizar())
+
+def es_admin_perfilado(request: Request) -> bool:
+    token = request.headers.get('x-kpi-profile')
+    return bool(KPI_PROFILING_TOKEN) and bool(token) and hmac.compare_digest(token, KPI_PROFILING_TOKEN)
+
+def perfilar_request(request: Request, ruta: str):
+    """Perfil de esta carga si lo pidió un administrador; None si no (o si ya hay otro en curso)."""
+    if not KPI_PROFILING_TOKEN or not es_admin_perfilado(request):
+        return None
+    perfil = iniciar_perfil(
+        KPI_PROFILING_DIR, ruta, KPI_PROFILING_INTERVAL_MS / 1000, KPI_PROFILING_MAX_REPORTS, KPI_PROFILING_MEMORY
+    )
+    if perfil is None:
+        print(f"Perfil de {ruta} omitido: ya hay otro en curso")
+    return perfil
+
+def error_perfilado(request: Request) -> Optional[JSONResponse]:
+    if not KPI_PROFILING_TOKEN:
+        return JSONResponse(status_code=404, content={"status": "error", "detail": "Perfilado no habilitado"})
+    if not es_admin_perfilado(request):
+        return JSONResponse(status_code=403, content={"status": "error", "detail": "No autorizado"})
+    return None
+
+@app.get("/debug/perfiles")
+def debug_perfiles(request: Request):
+    """Reportes de perfilado guardados (solo administradores)"""
+    error = error_perfilado(request)
+    if error:
+        return error
+    return {"perfiles": listar_reportes(KPI_PROFILING_DIR)}
+
+@app.get("/debug/perfiles/{perfil_id}")
+def debug_perfil(perfil_id: str, request: Request):
+    """Reporte de un perfil: funciones con más muestras y asignaciones por línea"""
+    error = error_perfilado(request)
+    if error:
+        return error
+    reporte = obtener_reporte(KPI_PROFILING_DIR, perfil_id)
+    if reporte is None:
+        return JSONResponse(status_code=404, content={"status": "error", "detail": "Perfil no encontrado"})
+    return reporte
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/ready")
+def ready():
+    """
+    Listo para recibir cargas: módulos, pool de parseo y cliente HTTP calientes
+    (y el pool de la BD si KPI_PERSISTENCIA=db)
+    """
+    componentes = estado_componentes()
+    listo = all(componentes.values())
+    return JSONResponse(
+        status_code=200 if listo else 503,
+        content={
+            "status": "ready" if listo else "warming",
+            "componentes": componentes,
+            "errores": errores_precalentamiento
+        }
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Métricas de la carga en formato de texto de Prometheus"""
+    return PlainTextResponse(metricas.exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/stats")
+def stats():
+    """Estado de los caches internos"""
+    return {
+        "parse_cache": parse_cache.stats(),
+        "sesiones": preview_data.stats(),
+        "confirmaciones_en_cola": cola_confirmaciones.pendientes(),
+        "outbox_n8n": outbox_n8n.stats() if outbox_n8n is not None else None,
+        "cache_lecturas": cache_lecturas.stats(),
+        "snapshots": len(snapshots_kpi.versiones()) if snapshots_kpi is not None else None
+    }
+
 @app.get("/", response_class=HTMLResponse)
 def upload_form():
     """Formulario HTML para subir archivos KPI"""
@@ -587,106 +1143,237 @@ def upload_form():
     </html>
     """
 
-# Variable global temporal para almacenar datos en sesión (en producción usar Redis o similar)
-preview_data = {}
+# Sesiones de vista previa: vencen por TTL y se acotan por cantidad y memoria
+KPI_SESSION_SWEEP_SECONDS = float(os.getenv('KPI_SESSION_SWEEP_SECONDS', '60'))
+
+# KPI_SESSION_BACKEND: 'memoria' (un solo worker) o 'sqlite' (compartido entre workers).
+# El estado de los trabajos de /confirm usa el mismo backend y el mismo archivo.
+KPI_SESSION_BACKEND = os.getenv('KPI_SESSION_BACKEND', 'memoria')
+KPI_SESSION_SQLITE_PATH = os.getenv('KPI_SESSION_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'kpi_sesiones.sqlite3'))
+
+preview_data = crear_almacen_sesiones(
+    KPI_SESSION_BACKEND,
+    ttl=float(os.getenv('KPI_SESSION_TTL', '7200')),
+    max_sesiones=int(os.getenv('KPI_SESSION_MAX', '200')),
+    max_bytes=int(os.getenv('KPI_SESSION_MAX_MB', '256')) * 1024 * 1024,
+    ruta_sqlite=KPI_SESSION_SQLITE_PATH
+)
+
+# Cache de las respuestas de lectura; se invalida por (anio, mes) al persistir una carga.
+# Con KPI_SESSION_BACKEND=sqlite las invalidaciones se comparten entre workers por el
+# archivo de sesiones; si no, con varios workers solo el TTL (más corto) las propaga.
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+_invalidaciones_compartidas = InvalidacionesSQLite(KPI_SESSION_SQLITE_PATH) if KPI_SESSION_BACKEND == 'sqlite' else None
+if _invalidaciones_compartidas is None and WEB_CONCURRENCY > 1:
+    print("Aviso: cache de lecturas por worker sin KPI_SESSION_BACKEND=sqlite; "
+          "otros workers verán una confirmación recién al vencer KPI_READ_CACHE_TTL")
+cache_lecturas = CacheRespuestas(
+    max_entradas=int(os.getenv('KPI_READ_CACHE_MAX', '512')),
+    max_bytes=int(float(os.getenv('KPI_READ_CACHE_MAX_MB', '64')) * 1024 * 1024),
+    ttl=float(os.getenv('KPI_READ_CACHE_TTL', '30' if _invalidaciones_compartidas is None and WEB_CONCURRENCY > 1 else '300')),
+    compartidas=_invalidaciones_compartidas,
+    intervalo_sync=float(os.getenv('KPI_READ_CACHE_SYNC_SECONDS', '1'))
+)
+
+metricas.gauge('kpi_sesiones_preview', 'Vistas previas vivas', lambda: preview_data.stats()['sesiones'])
+metricas.gauge('kpi_sesiones_preview_bytes', 'Memoria aproximada de las vistas previas vivas', lambda: preview_data.stats()['bytes'])
+
+async def barrer_sesiones_expiradas():
+    """Elimina periódicamente las vistas previas vencidas."""
+    while True:
+        await asyncio.sleep(KPI_SESSION_SWEEP_SECONDS)
+        try:
+            eliminadas = await asyncio.get_running_loop().run_in_executor(None, preview_data.limpiar_expiradas)
+            if eliminadas:
+                print(f"Sesiones expiradas eliminadas: {eliminadas}")
+        except Exception as e:
+            print(f"Error limpiando sesiones: {e}")
+
+# Trabajos de confirmación: KPI_CONFIRM_WORKERS limita las escrituras simultáneas hacia n8n/BD
+cola_confirmaciones = ColaTrabajos(
+    workers=int(os.getenv('KPI_CONFIRM_WORKERS', '2')),
+    almacen=crear_almacen_trabajos(
+        KPI_SESSION_BACKEND,
+        ttl=float(os.getenv('KPI_JOBS_TTL', '3600')),
+        max_trabajos=int(os.getenv('KPI_JOBS_MAX', '1000')),
+        ruta_sqlite=KPI_SESSION_SQLITE_PATH
+    )
+)
+
+@app.on_event("startup")
+async def iniciar_cola_confirmaciones():
+    cola_confirmaciones.iniciar()
+
+@app.on_event("shutdown")
+async def detener_cola_confirmaciones():
+    await cola_confirmaciones.detener()
+
+@app.on_event("startup")
+async def iniciar_barrido_sesiones():
+    app.state.barrido_sesiones = asyncio.create_task(barrer_sesiones_expiradas())
+
+@app.on_event("shutdown")
+async def detener_barrido_sesiones():
+    tarea = getattr(app.state, 'barrido_sesiones', None)
+    if tarea is not None:
+        tarea.cancel()
 
 @app.post("/upload")
-async def upload_files(
-    fecha_registro: str = Form(...),
-    tmo: Optional[UploadFile] = File(None),
-    transf_epa: Optional[UploadFile] = File(None),
-    tipificaciones: Optional[UploadFile] = File(None),
-    sat_ep: Optional[UploadFile] = File(None),
-    res_ep: Optional[UploadFile] = File(None),
-    sat_snl: Optional[UploadFile] = File(None),
-    res_snl: Optional[UploadFile] = File(None),
-    omitir_tmo: Optional[str] = Form(None),
-    omitir_transf_epa: Optional[str] = Form(None),
-    omitir_tipificaciones: Optional[str] = Form(None),
-    omitir_sat_ep: Optional[str] = Form(None),
-    omitir_res_ep: Optional[str] = Form(None),
-    omitir_sat_snl: Optional[str] = Form(None),
-    omitir_res_snl: Optional[str] = Form(None)
-):
+async def upload_files(request: Request):
     """Endpoint para recibir los 7 archivos KPI y procesarlos"""
     
+    perfil = perfilar_request(request, "/upload")
+    if perfil is None:
+        return await procesar_upload(request)
     try:
+        with perfil.activo():
+            respuesta = await procesar_upload(request, perfilar=True)
+    finally:
+        perfil.terminar()
+    respuesta.headers['X-KPI-Perfil'] = perfil.id
+    return respuesta
+
+async def procesar_upload(request: Request, perfilar: bool = False) -> JSONResponse:
+    from procesamiento_kpi import unir_series_kpi
+    
+    form = None
+    try:
+        # Leer el formulario por chunks, con límite de tamaño por archivo y por envío
+        with LATENCIA_ETAPAS.medir(etapa='multipart'):
+            form = await leer_formulario_kpi(
+                request,
+                max_archivo=KPI_UPLOAD_MAX_FILE_BYTES,
+                max_request=KPI_UPLOAD_MAX_REQUEST_BYTES,
+                spool_max=KPI_UPLOAD_SPOOL_BYTES
+            )
+
+        fecha_registro = form.get('fecha_registro')
+        if not fecha_registro:
+            return JSONResponse(
+                status_code=422,
+                content={"status": "error", "detail": "Debe indicar la fecha del registro"}
+            )
+
         # Identificar KPIs omitidos
-        kpis_omitidos = []
-        if omitir_tmo == 'on': kpis_omitidos.append('TMO')
-        if omitir_transf_epa == 'on': kpis_omitidos.append('TransfEPA')
-        if omitir_tipificaciones == 'on': kpis_omitidos.append('Tipificaciones')
-        if omitir_sat_ep == 'on': kpis_omitidos.append('SatEP')
-        if omitir_res_ep == 'on': kpis_omitidos.append('ResEP')
-        if omitir_sat_snl == 'on': kpis_omitidos.append('SatSNL')
-        if omitir_res_snl == 'on': kpis_omitidos.append('ResSNL')
+        kpis_omitidos = [kpi for campo, kpi in CAMPOS_KPI.items() if form.get(f'omitir_{campo}') == 'on']
         
-        # Leer archivos
-        archivos_data = {}
-        if tmo and 'TMO' not in kpis_omitidos:
-            archivos_data['TMO'] = await tmo.read()
-        if transf_epa and 'TransfEPA' not in kpis_omitidos:
-            archivos_data['TransfEPA'] = await transf_epa.read()
-        if tipificaciones and 'Tipificaciones' not in kpis_omitidos:
-            archivos_data['Tipificaciones'] = await tipificaciones.read()
-        if sat_ep and 'SatEP' not in kpis_omitidos:
-            archivos_data['SatEP'] = await sat_ep.read()
-        if res_ep and 'ResEP' not in kpis_omitidos:
-            archivos_data['ResEP'] = await res_ep.read()
-        if sat_snl and 'SatSNL' not in kpis_omitidos:
-            archivos_data['SatSNL'] = await sat_snl.read()
-        if res_snl and 'ResSNL' not in kpis_omitidos:
-            archivos_data['ResSNL'] = await res_snl.read()
+        # Archivos a procesar (el parser lee directo desde el spool de cada upload)
+        archivos = {
+            kpi_nombre: upload
+            for kpi_nombre, upload in archivos_del_formulario(form, CAMPOS_KPI).items()
+            if kpi_nombre not in kpis_omitidos
+        }
+        for kpi_nombre, upload in archivos.items():
+            BYTES_ARCHIVOS.observar(upload.size or 0, kpi=kpi_nombre)
+        archivos_data = {
+            kpi_nombre: fuente_para_worker(upload, en_proceso=KPI_PARSE_POOL != 'thread')
+            for kpi_nombre, upload in archivos.items()
+        }
         
-        # Procesar y unificar datos
-        registros = unificar_datos_kpi(archivos_data, kpis_omitidos)
+        huellas = {kpi_nombre: huella_archivo(upload) for kpi_nombre, upload in archivos.items()}
+
+        # Procesar archivos en paralelo y unificar datos
+        series, errores = await procesar_kpis(archivos_data, huellas, perfilar)
+        if errores:
+            detalle = "; ".join(f"{kpi}: {error}" for kpi, error in errores.items())
+            return JSONResponse(
+                status_code=422,
+                content={"status": "error", "detail": f"Error procesando archivos ({detalle})", "errores": errores}
+            )
+
+        loop = asyncio.get_running_loop()
+        with LATENCIA_ETAPAS.medir(etapa='unificar'):
+            registros = await loop.run_in_executor(None, en_perfil(unir_series_kpi), series)
         
-        # Guardar en variable temporal (en producción usar session ID)
-        session_id = datetime.now().strftime('%Y%m%d%H%M%S')
-        preview_data[session_id] = {
+        # Guardar en sesión de vista previa (con SQLite: JSON + escritura bloqueante, fuera del loop)
+        session_id = await loop.run_in_executor(None, en_perfil(preview_data.crear), {
             'registros': registros,
             'fecha_registro': fecha_registro,
             'kpis_omitidos': kpis_omitidos
-        }
+        })
         
         return JSONResponse(content={
             "status": "success",
             "preview_url": f"/preview/{session_id}"
         })
         
+    except CargaDemasiadoGrande as e:
+        return JSONResponse(
+            status_code=413,
+            content={"status": "error", "detail": str(e)}
+        )
+    except FormularioInvalido as e:
+        return JSONResponse(
+            status_code=e.status_code,
+            content={"status": "error", "detail": str(e)}
+        )
     except Exception as e:
         return JSONResponse(
             status_code=500,
             content={"status": "error", "detail": str(e)}
         )
+    finally:
+        if form is not None:
+            await form.close()
 
-@app.get("/preview/{session_id}", response_class=HTMLResponse)
-async def preview_data_view(session_id: str):
-    """Vista previa de datos antes de insertar en BD"""
-    
-    if session_id not in preview_data:
-        return "<h1>Sesión expirada</h1>"
-    
-    data = preview_data[session_id]
-    registros = data['registros']
-    fecha_registro = data['fecha_registro']
-    
-    # Generar HTML de tabla
-    filas_html = ""
-    for reg in registros:
-        filas_html += f"""
-        <tr>
-            <td>{reg['ejecutivo']}</td>
-            <td>{reg['tmo'] if reg['tmo'] is not None else '-'}</td>
-            <td>{reg['transfepa'] if reg['transfepa'] is not None else '-'}</td>
-            <td>{reg['tipificaciones'] if reg['tipificaciones'] is not None else '-'}</td>
-            <td>{reg['satep'] if reg['satep'] is not None else '-'}</td>
-            <td>{reg['resep'] if reg['resep'] is not None else '-'}</td>
-            <td>{reg['satsnl'] if reg['satsnl'] is not None else '-'}</td>
-            <td>{reg['ressnl'] if reg['ressnl'] is not None else '-'}</td>
-        </tr>
-        """
-    
+# Columnas de la vista previa: clave del registro -> título
+COLUMNAS_PREVIEW = {
+    'ejecutivo': 'Ejecutivo',
+    'tmo': 'TMO',
+    'transfepa': 'Transf EPA',
+    'tipificaciones': 'Tipificaciones',
+    'satep': 'Sat EP',
+    'resep': 'Res EP',
+    'satsnl': 'Sat SNL',
+    'ressnl': 'Res SNL',
+}
+PREVIEW_PAGE_SIZE = int(os.getenv('KPI_PREVIEW_PAGE_SIZE', '200'))
+PREVIEW_PAGE_SIZE_MAX = 1000
+# Filas por chunk al transmitir la tabla
+PREVIEW_FILAS_POR_CHUNK = 100
+
+def ordenar_registros(registros: list, sort: Optional[str], order: str) -> list:
+    """Ordena por una columna; los valores vacíos quedan siempre al final."""
+    if not sort:
+        return registros
+    con_valor = [r for r in registros if r.get(sort) is not None]
+    sin_valor = [r for r in registros if r.get(sort) is None]
+    con_valor.sort(key=lambda r: r[sort], reverse=(order == 'desc'))
+    return con_valor + sin_valor
+
+def paginar_registros(registros: list, page: int, page_size: int, sort: Optional[str], order: str) -> list:
+    inicio = (page - 1) * page_size
+    return ordenar_registros(registros, sort, order)[inicio:inicio + page_size]
+
+def validar_orden(sort: Optional[str], order: str) -> Optional[str]:
+    if sort and sort not in COLUMNAS_PREVIEW:
+        return f"Columna de orden inválida: {sort}"
+    if order not in ('asc', 'desc'):
+        return f"Orden inválido: {order}"
+    return None
+
+def _celda(valor) -> str:
+    return html.escape(str(valor)) if valor is not None else '-'
+
+def render_filas_preview(registros: list) -> str:
+    return "".join(
+        "<tr>" + "".join(f"<td>{_celda(reg.get(col))}</td>" for col in COLUMNAS_PREVIEW) + "</tr>\n"
+        for reg in registros
+    )
+
+def render_encabezados_preview(session_id: str, page_size: int, sort: Optional[str], order: str) -> str:
+    """Encabezados que ordenan por servidor al hacer click (alterna asc/desc)."""
+    encabezados = []
+    for col, titulo in COLUMNAS_PREVIEW.items():
+        activo = col == sort
+        siguiente = 'desc' if activo and order == 'asc' else 'asc'
+        flecha = (' ▲' if order == 'asc' else ' ▼') if activo else ''
+        url = f"/preview/{session_id}?sort={col}&order={siguiente}&page_size={page_size}"
+        encabezados.append(f'<th><a href="{html.escape(url)}" class="{"activo" if activo else ""}">{titulo}{flecha}</a></th>')
+    return "".join(encabezados)
+
+def _preview_html_inicio(fecha_registro: str, total: int, encabezados_html: str) -> str:
+    fecha_registro = html.escape(str(fecha_registro))
     return f"""
     <!DOCTYPE html>
     <html lang="es">
@@ -786,6 +1473,31 @@ async def preview_data_view(session_id: str):
                 background-color: #0f172a;
             }}
             
+            th a {{
+                color: inherit;
+                text-decoration: none;
+            }}
+            
+            th a.activo {{
+                color: #22c55e;
+            }}
+            
+            .paginacion {{
+                display: flex;
+                justify-content: space-between;
+                align-items: center;
+                margin-top: 16px;
+                color: #94a3b8;
+                font-size: 13px;
+            }}
+            
+            .btn-mas {{
+                background-color: #334155;
+                color: #ffffff;
+                padding: 8px 20px;
+                font-size: 14px;
+            }}
+            
             .actions {{
                 display: flex;
                 gap: 16px;
@@ -846,27 +1558,28 @@ async def preview_data_view(session_id: str):
             
             <div class="info-card">
                 <p><strong>Fecha de registro:</strong> {fecha_registro}</p>
-                <p><strong>Total ejecutivos:</strong> {len(registros)}</p>
+                <p><strong>Total ejecutivos:</strong> {total}</p>
             </div>
             
             <div class="table-card">
                 <table>
                     <thead>
                         <tr>
-                            <th>Ejecutivo</th>
-                            <th>TMO</th>
-                            <th>Transf EPA</th>
-                            <th>Tipificaciones</th>
-                            <th>Sat EP</th>
-                            <th>Res EP</th>
-                            <th>Sat SNL</th>
-                            <th>Res SNL</th>
+                            {encabezados_html}
                         </tr>
                     </thead>
                     <tbody>
-                        {filas_html}
-                    </tbody>
+"""
+
+def _preview_html_fin(session_id: str, total: int, mostrados: int, page: int, page_size: int,
+                      sort: Optional[str], order: str) -> str:
+    sort = sort or ''
+    return f"""                    </tbody>
                 </table>
+                <div class="paginacion">
+                    <span id="mostrando">Mostrando {mostrados} de {total}</span>
+                    <button class="btn btn-mas" id="btnMas" onclick="cargarMas()"{' style="display:none"' if mostrados >= total else ''}>Cargar más</button>
+                </div>
             </div>
             
             <div class="actions">
@@ -900,6 +1613,51 @@ async def preview_data_view(session_id: str):
                 }}
             }})();
             
+            // Carga incremental de la tabla desde la variante JSON
+            let paginaActual = {page};
+            let mostrados = {mostrados};
+            
+            async function cargarMas() {{
+                const btnMas = document.getElementById('btnMas');
+                btnMas.disabled = true;
+                try {{
+                    const params = new URLSearchParams({{ page: paginaActual + 1, page_size: {page_size}, sort: '{sort}', order: '{order}' }});
+                    const response = await fetch('/preview/{session_id}/registros?' + params);
+                    if (!response.ok) throw new Error('Sesión expirada');
+                    const result = await response.json();
+                    const tbody = document.querySelector('tbody');
+                    for (const reg of result.registros) {{
+                        const tr = document.createElement('tr');
+                        for (const col of result.columnas) {{
+                            const td = document.createElement('td');
+                            td.textContent = reg[col] ?? '-';
+                            tr.appendChild(td);
+                        }}
+                        tbody.appendChild(tr);
+                    }}
+                    paginaActual = result.page;
+                    mostrados += result.registros.length;
+                    document.getElementById('mostrando').textContent = 'Mostrando ' + mostrados + ' de ' + result.total;
+                    btnMas.style.display = mostrados >= result.total ? 'none' : '';
+                }} catch (error) {{
+                    document.getElementById('mostrando').textContent = '✗ ' + error.message;
+                }} finally {{
+                    btnMas.disabled = false;
+                }}
+            }}
+            
+            async function esperarTrabajo(statusUrl) {{
+                while (true) {{
+                    await new Promise(resolve => setTimeout(resolve, 1000));
+                    const response = await fetch(statusUrl, {{
+                        headers: {{ 'Authorization': 'Bearer ' + localStorage.getItem('kpi_token') }}
+                    }});
+                    if (!response.ok) throw new Error('No se pudo consultar el estado de la inserción');
+                    const trabajo = await response.json();
+                    if (['succeeded', 'failed', 'pending_delivery'].includes(trabajo.status)) return trabajo;
+                }}
+            }}
+            
             async function confirmarInsercion() {{
                 const token = localStorage.getItem('kpi_token');
                 if (!token) {{
@@ -926,18 +1684,27 @@ async def preview_data_view(session_id: str):
                         return;
                     }}
                     
-                    const result = await response.json();
+                    let result = await response.json();
+                    
+                    // La inserción corre en segundo plano: consultar el trabajo hasta que termine
+                    if (response.status === 202) {{
+                        result = await esperarTrabajo(result.status_url);
+                    }} else if (!response.ok) {{
+                        throw new Error(result.detail || 'Error al insertar datos');
+                    }}
                     
-                    if (response.ok) {{
+                    if (result.status === 'succeeded' || result.status === 'pending_delivery') {{
                         status.className = 'status success';
-                        status.textContent = '✓ Datos insertados correctamente en la base de datos';
+                        status.textContent = result.status === 'succeeded'
+                            ? '✓ Datos insertados correctamente en la base de datos'
+                            : '✓ Datos recibidos y en cola: se enviarán a la base de datos en segundo plano';
                         status.style.display = 'block';
                         
                         setTimeout(() => {{
                             window.location.href = '/';
                         }}, 2000);
                     }} else {{
-                        throw new Error(result.detail || 'Error al insertar datos');
+                        throw new Error(result.error || 'Error al insertar datos');
                     }}
                 }} catch (error) {{
                     status.className = 'status error';
@@ -952,39 +1719,438 @@ async def preview_data_view(session_id: str):
     </html>
     """
 
-@app.post("/confirm/{session_id}")
-async def confirm_insertion(session_id: str):
-    """Confirmar e insertar datos vía n8n"""
+@app.get("/preview/{session_id}", response_class=HTMLResponse)
+async def preview_data_view(
+    request: Request,
+    session_id: str,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(PREVIEW_PAGE_SIZE, ge=1, le=PREVIEW_PAGE_SIZE_MAX),
+    sort: Optional[str] = None,
+    order: str = 'asc'
+):
+    """Vista previa de datos antes de insertar en BD (paginada y transmitida por partes)"""
+    
+    # Solo el resumen: los registros se leen recién después de enviar el inicio de la página
+    resumen = await asyncio.get_running_loop().run_in_executor(None, preview_data.resumen, session_id)
+    if resumen is None:
+        return HTMLResponse("<h1>Sesión expirada</h1>")
+    
+    error = validar_orden(sort, order)
+    if error:
+        return HTMLResponse(f"<h1>{html.escape(error)}</h1>", status_code=400)
+    
+    total = resumen['total']
+    perfil = perfilar_request(request, f"/preview/{session_id}")
+    
+    def generar():
+        try:
+            if perfil is None:
+                yield from generar_preview()
+                return
+            # Cada trozo puede generarse en un hilo distinto del threadpool
+            partes = generar_preview()
+            while True:
+                with perfil.hilo():
+                    parte = next(partes, None)
+                if parte is None:
+                    break
+                yield parte
+        finally:
+            if perfil is not None:
+                perfil.terminar()
+    
+    def generar_preview():
+        with LATENCIA_ETAPAS.medir(etapa='preview'):
+            # El encabezado sale antes de leer/ordenar/paginar: el primer byte no depende de la dotación
+            yield _preview_html_inicio(resumen['fecha_registro'], total, render_encabezados_preview(session_id, page_size, sort, order))
+            
+            data = preview_data.obtener(session_id)
+            if data is None:
+                # Venció o se confirmó entre el resumen y la lectura
+                yield f'<tr><td colspan="{len(COLUMNAS_PREVIEW)}">Sesión expirada</td></tr>\n'
+                yield _preview_html_fin(session_id, total, 0, page, page_size, sort, order)
+                return
+            
+            pagina = paginar_registros(data['registros'], page, page_size, sort, order)
+            for i in range(0, len(pagina), PREVIEW_FILAS_POR_CHUNK):
+                yield render_filas_preview(pagina[i:i + PREVIEW_FILAS_POR_CHUNK])
+            
+            mostrados = min(total, (page - 1) * page_size + len(pagina))
+            yield _preview_html_fin(session_id, total, mostrados, page, page_size, sort, order)
+    
+    respuesta = StreamingResponse(generar(), media_type="text/html; charset=utf-8")
+    if perfil is not None:
+        respuesta.headers['X-KPI-Perfil'] = perfil.id
+    return respuesta
+
+@app.get("/preview/{session_id}/registros")
+async def preview_registros(
+    session_id: str,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(PREVIEW_PAGE_SIZE, ge=1, le=PREVIEW_PAGE_SIZE_MAX),
+    sort: Optional[str] = None,
+    order: str = 'asc'
+):
+    """Variante JSON de la vista previa, para cargar la tabla por páginas"""
     
-    if session_id not in preview_data:
+    data = await asyncio.get_running_loop().run_in_executor(None, preview_data.obtener, session_id)
+    if data is None:
         return JSONResponse(
             status_code=404,
             content={"status": "error", "detail": "Sesión no encontrada"}
         )
     
-    data = preview_data[session_id]
+    error = validar_orden(sort, order)
+    if error:
+        return JSONResponse(status_code=400, content={"status": "error", "detail": error})
     
-    try:
-        # Enviar a n8n para procesamiento
-        result = await enviar_a_n8n(data['registros'], data['fecha_registro'])
+    registros = data['registros']
+    return {
+        "fecha_registro": data['fecha_registro'],
+        "total": len(registros),
+        "page": page,
+        "page_size": page_size,
+        "columnas": list(COLUMNAS_PREVIEW),
+        "registros": paginar_registros(registros, page, page_size, sort, order)
+    }
+
+@app.post("/confirm/{session_id}")
+async def confirm_insertion(session_id: str, request: Request):
+    """
+    Confirmar e insertar datos (vía n8n o directo en la BD, según KPI_PERSISTENCIA).
+    El envío corre en segundo plano: responde 202 con el trabajo a consultar en /jobs/{id}.
+    """
+    
+    # Reclamo atómico: un doble click u otro worker no envían el mismo lote dos veces.
+    # Las operaciones del almacén de sesiones pueden bloquear (SQLite): van al executor
+    loop = asyncio.get_running_loop()
+    data = await loop.run_in_executor(None, preview_data.reclamar, session_id)
+    if data is None:
+        # Si ya hay un trabajo para esta sesión, se devuelve el mismo
+        trabajo = await cola_confirmaciones.trabajo_de_sesion(session_id)
+        if trabajo is not None and trabajo["status"] != FALLIDO:
+            return respuesta_trabajo_encolado(trabajo)
+        if await loop.run_in_executor(None, preview_data.resumen, session_id) is None:
+            return JSONResponse(
+                status_code=404,
+                content={"status": "error", "detail": "Sesión no encontrada"}
+            )
+        return JSONResponse(
+            status_code=409,
+            content={"status": "error", "detail": "Esta carga ya se está confirmando"}
+        )
+    
+    # El perfil cubre el envío completo, que termina en segundo plano
+    perfil = perfilar_request(request, f"/confirm/{session_id}")
+    
+    async def confirmar():
+        try:
+            if perfil is None:
+                result = await persistir_registros(data['registros'], data['fecha_registro'], f"kpi-upload-{session_id}")
+            else:
+                with perfil.activo():
+                    result = await persistir_registros(data['registros'], data['fecha_registro'], f"kpi-upload-{session_id}")
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        finally:
+            if perfil is not None:
+                perfil.terminar()
         
         if result["success"]:
             # Limpiar datos temporales
-            del preview_data[session_id]
-            
-            return JSONResponse(content={
-                "status": "success",
-                "message": "Datos procesados correctamente",
-                "n8n_response": result.get("data", {})
-            })
+            await loop.run_in_executor(None, preview_data.eliminar, session_id)
         else:
-            return JSONResponse(
-                status_code=500,
-                content={"status": "error", "detail": result.get("error", "Error en n8n")}
-            )
-            
+            # Liberar la sesión para poder reintentar
+            await loop.run_in_executor(None, preview_data.liberar, session_id)
+        return result
+    
+    try:
+        trabajo = await cola_confirmaciones.encolar(session_id, confirmar)
     except Exception as e:
+        if perfil is not None:
+            perfil.terminar()
+        await loop.run_in_executor(None, preview_data.liberar, session_id)
         return JSONResponse(
             status_code=500,
             content={"status": "error", "detail": str(e)}
         )
+    
+    respuesta = respuesta_trabajo_encolado(trabajo)
+    if perfil is not None:
+        respuesta.headers['X-KPI-Perfil'] = perfil.id
+    return respuesta
+
+def respuesta_trabajo_encolado(trabajo: dict) -> JSONResponse:
+    return JSONResponse(
+        status_code=202,
+        content={
+            "status": "accepted",
+            "job_id": trabajo["job_id"],
+            "job_status": trabajo["status"],
+            "status_url": f"/jobs/{trabajo['job_id']}"
+        }
+    )
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Estado de un trabajo de confirmación: queued, running, succeeded o failed"""
+    
+    trabajo = await cola_confirmaciones.obtener(job_id)
+    if trabajo is None:
+        return JSONResponse(
+            status_code=404,
+            content={"status": "error", "detail": "Trabajo no encontrado"}
+        )
+    
+    # El estado del lote en el outbox también se lee de SQLite
+    trabajo = await asyncio.get_running_loop().run_in_executor(None, estado_entrega, trabajo)
+    return {**trabajo, "destino": KPI_PERSISTENCIA}
+
+def estado_entrega(trabajo: dict) -> dict:
+    """
+    Un trabajo que quedó en el outbox ('pending_delivery') se informa según
+    su lote: 'succeeded' cuando n8n lo recibió, 'failed' si quedó como fallido.
+    """
+    if trabajo["status"] != PENDIENTE_ENVIO or outbox_n8n is None:
+        return trabajo
+    lote = outbox_n8n.estado_lote((trabajo.get("resultado") or {}).get("outbox_id"))
+    if lote is None or lote["estado"] == 'pendiente':
+        return trabajo
+    if lote["estado"] == 'enviado':
+        return {**trabajo, "status": EXITOSO}
+    return {**trabajo, "status": FALLIDO, "error": lote["ultimo_error"] or "Error en n8n"}
+
+# --- Lectura de KPIs para el dashboard ---
+
+def _lista_param(valor: Optional[str]) -> list:
+    """'ENERO, febrero' -> ['ENERO', 'febrero'] (vacío -> [])"""
+    if not valor:
+        return []
+    return [parte.strip() for parte in valor.split(',') if parte.strip()]
+
+async def obtener_cacheado(clave: tuple, periodos: list, consultar) -> Tuple[bytes, str]:
+    """(cuerpo, etag) desde cache_lecturas, o consulta (en un thread) y guarda."""
+    loop = asyncio.get_running_loop()
+    if cache_lecturas.sincronizacion_pendiente():
+        # Invalidaciones publicadas por otros workers
+        await loop.run_in_executor(None, cache_lecturas.sincronizar)
+    entrada = cache_lecturas.obtener(clave)
+    if entrada is not None:
+        return entrada
+    generacion = cache_lecturas.generacion()
+    datos = await loop.run_in_executor(None, consultar)
+    cuerpo = JSONResponse(content=jsonable_encoder(datos)).body
+    return cuerpo, cache_lecturas.guardar(clave, cuerpo, periodos, generacion)
+
+async def responder_cacheado(request: Request, clave: tuple, periodos: list, consultar) -> Response:
+    """
+    Sirve una lectura desde cache_lecturas (ver obtener_cacheado).
+    Responde 304 si el cliente ya tiene la misma versión (If-None-Match).
+    """
+    cuerpo, etag = await obtener_cacheado(clave, periodos, consultar)
+    
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_coincide(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cuerpo, media_type="application/json", headers=headers)
+
+@app.get("/kpis")
+async def leer_kpis(
+    request: Request,
+    meses: Optional[str] = None,
+    anio: Optional[int] = None,
+    ejecutivo: Optional[str] = None,
+    campos: Optional[str] = None,
+    limit: int = Query(KPI_API_PAGE_SIZE, ge=1, le=KPI_API_PAGE_SIZE_MAX),
+    cursor: Optional[str] = None
+):
+    """
+    KPIs guardados, filtrados en la BD por mes/año/ejecutivo.
+    `campos` elige las columnas a devolver; si hay más filas, `next_cursor`
+    se pasa como `cursor` para la página siguiente.
+    """
+    
+    lista_meses = [mes.upper() for mes in _lista_param(meses)]
+    invalidos = [mes for mes in lista_meses if mes not in MESES_ESP]
+    if invalidos:
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "detail": f"Mes no válido: {', '.join(invalidos)}"}
+        )
+    
+    lista_campos = _lista_param(campos)
+    desconocidos = [campo for campo in lista_campos if campo not in CAMPOS_API]
+    if desconocidos:
+        return JSONResponse(
+            status_code=400,
+            content={
+                "status": "error",
+                "detail": f"Campo no válido: {', '.join(desconocidos)}. Campos disponibles: {', '.join(CAMPOS_API)}"
+            }
+        )
+    
+    ejecutivos = _lista_param(ejecutivo)
+    clave = ("kpis", tuple(lista_meses), anio, tuple(ejecutivos), tuple(lista_campos), limit, cursor)
+    periodos = [(anio, mes) for mes in lista_meses] or [(anio, None)]
+    try:
+        return await responder_cacheado(
+            request, clave, periodos,
+            lambda: obtener_repositorio().consultar_kpis(
+                meses=lista_meses,
+                anio=anio,
+                ejecutivos=ejecutivos,
+                campos=lista_campos,
+                limite=limit,
+                cursor=cursor
+            )
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"status": "error", "detail": str(e)})
+    except Exception as e:
+        print(f"Error leyendo KPIs: {e}")
+        return JSONResponse(status_code=503, content={"status": "error", "detail": "Base de datos no disponible"})
+
+@app.get("/meses-disponibles")
+async def meses_disponibles(request: Request):
+    """Meses con datos (catálogo de meses), en orden cronológico"""
+    
+    try:
+        return await responder_cacheado(
+            request, ("meses-disponibles",), [(None, None)],
+            lambda: {"meses": obtener_repositorio().meses_disponibles()}
+        )
+    except Exception as e:
+        print(f"Error leyendo meses disponibles: {e}")
+        return JSONResponse(status_code=503, content={"status": "error", "detail": "Base de datos no disponible"})
+
+@app.get("/kpis/historial")
+async def kpis_historial(request: Request, ejecutivo: Optional[str] = None, detalle: bool = False):
+    """
+    Historial mensual desde el resumen por periodo (costo según la cantidad de meses).
+    Por defecto: {'resEP': [...], 'satEP': [...], 'tmo': [...], 'epa': [...], 'satSNL': [...]}
+    con el promedio del equipo; con `ejecutivo`, la serie de ese ejecutivo;
+    con `detalle=true`, también cantidades, mínimos, máximos y cuántos cumplen la meta.
+    """
+    
+    def consultar():
+        repositorio = obtener_repositorio()
+        if ejecutivo:
+            return historial_ejecutivo(repositorio.serie_ejecutivo(ejecutivo))
+        resumen = repositorio.resumen_mensual()
+        return historial_detalle(resumen) if detalle else historial_equipo(resumen)
+    
+    try:
+        return await responder_cacheado(
+            request, ("historial", ejecutivo, detalle if not ejecutivo else False), [(None, None)], consultar
+        )
+    except Exception as e:
+        print(f"Error leyendo historial: {e}")
+        return JSONResponse(status_code=503, content={"status": "error", "detail": "Base de datos no disponible"})
+
+def _periodo_consulta(mes: str, anio: Optional[int]) -> Tuple[Optional[int], str]:
+    """Valida el mes; sin año se usa el más reciente que tenga datos de ese mes."""
+    mes = mes.strip().upper()
+    if mes not in MESES_ESP:
+        raise ValueError(f"Mes no válido: {mes}")
+    if anio is None:
+        anio = obtener_repositorio().ultimo_anio_con_mes(mes)
+    return anio, mes
+
+def _registros_mes(anio: int, mes: str) -> list:
+    """Registros vigentes del mes, desde el snapshot si existe (si no, desde la BD)."""
+    if snapshots_kpi is not None:
+        historia = snapshots_kpi.cargar()
+        if (anio, mes) in historia.columnas:
+            return historia.registros(anio, mes)
+    return obtener_repositorio().registros_vigentes(anio, mes)
+
+@app.get("/kpis/ranking")
+async def kpis_ranking(
+    request: Request,
+    mes: str,
+    anio: Optional[int] = None,
+    top: Optional[int] = Query(None, ge=1)
+):
+    """
+    Ranking del mes como rankingKPIs (más KPIs cumplidos, luego menos rojos).
+    Con `top` (p.ej. 3 para el podio) solo se ordenan los primeros.
+    """
+    
+    def consultar():
+        from evaluacion_kpi import ranking_kpis
+        
+        anio_mes, mes_consulta = _periodo_consulta(mes, anio)
+        registros = _registros_mes(anio_mes, mes_consulta) if anio_mes else []
+        return {
+            "mes": mes_consulta,
+            "anio": anio_mes,
+            "total": len(registros),
+            "ranking": ranking_kpis(registros, top)
+        }
+    
+    try:
+        return await responder_cacheado(
+            request, ("ranking", mes.strip().upper(), anio, top), [(anio, mes.strip().upper())], consultar
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"status": "error", "detail": str(e)})
+    except Exception as e:
+        print(f"Error calculando ranking: {e}")
+        return JSONResponse(status_code=503, content={"status": "error", "detail": "Base de datos no disponible"})
+
+@app.get("/kpis/copc")
+async def kpis_copc(request: Request, mes: str, anio: Optional[int] = None):
+    """Score COPC, nivel (ÓPTIMO/CONTROL/RIESGO), alertas y semáforos de todo el equipo en el mes"""
+    
+    def consultar():
+        from evaluacion_kpi import resumen_copc, score_copc
+        
+        anio_mes, mes_consulta = _periodo_consulta(mes, anio)
+        registros = _registros_mes(anio_mes, mes_consulta) if anio_mes else []
+        evaluados = score_copc(registros)
+        return {
+            "mes": mes_consulta,
+            "anio": anio_mes,
+            "total": len(evaluados),
+            "resumen": resumen_copc(evaluados),
+            "ejecutivos": evaluados
+        }
+    
+    try:
+        return await responder_cacheado(
+            request, ("copc", mes.strip().upper(), anio), [(anio, mes.strip().upper())], consultar
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"status": "error", "detail": str(e)})
+    except Exception as e:
+        print(f"Error calculando score COPC: {e}")
+        return JSONResponse(status_code=503, content={"status": "error", "detail": "Base de datos no disponible"})
+
+def _consulta_pronostico():
+    """(clave, periodos, consultar) del pronóstico completo, compartido con el precálculo."""
+    def consultar():
+        from pronostico_kpi import pronosticar, pronosticar_columnar
+        
+        repositorio = obtener_repositorio()
+        if snapshots_kpi is not None:
+            historia = snapshots_kpi.cargar()
+            catalogo = {(fila['anio'], fila['mes']) for fila in repositorio.meses_disponibles()}
+            # Solo si los snapshots están al día con el catálogo (p.ej. no durante la sincronización inicial)
+            if catalogo and catalogo == set(historia.meses):
+                return pronosticar_columnar(historia)
+        return pronosticar(repositorio.historial_vigente(), repositorio.resumen_mensual())
+    return ("pronostico",), [(None, None)], consultar
+
+@app.get("/kpis/pronostico")
+async def kpis_pronostico(request: Request):
+    """
+    Proyección del próximo mes para el equipo y para cada ejecutivo en todos los KPIs
+    (misma regla que predecir en script.js), con los KPIs que quedarían fuera de meta.
+    Se precalcula al confirmar una carga.
+    """
+    
+    try:
+        return await responder_cacheado(request, *_consulta_pronostico())
+    except Exception as e:
+        print(f"Error calculando pronóstico: {e}")
+        return JSONResponse(status_code=503, content={"status": "error", "detail": "Base de datos no disponible"})
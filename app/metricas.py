@@ -0,0 +1,143 @@
+"""
+Métricas del proceso en formato de texto de Prometheus (GET /metrics).
+
+Contadores e histogramas con etiquetas, sin dependencias externas. Registrar
+una observación es una búsqueda binaria en los buckets y un par de sumas
+bajo un lock, así que se puede llamar en el camino de cada carga. Los
+valores que ya lleva la app (sesiones, caches) se leen recién al exponer,
+con funciones registradas como 'gauge'.
+
+Cada worker de uvicorn tiene sus propias métricas.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Buckets por defecto (segundos), del parseo de un archivo chico a un envío lento a n8n
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Tamaños de archivo subidos (bytes): 16 KB a 32 MB
+BUCKETS_BYTES = tuple(16 * 1024 * 4 ** i for i in range(6)) + (32 * 1024 * 1024,)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _etiquetas(nombres: Tuple[str, ...], valores: Tuple, extra: str = '') -> str:
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _numero(valor: float) -> str:
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, cantidad: float = 1, **etiquetas):
+        clave = tuple(etiquetas.get(nombre, '') for nombre in self.etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def exponer(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            valores = list(self._valores.items())
+        for clave, valor in valores:
+            lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}")
+        return lineas
+
+
+class Histograma:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = BUCKETS_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.buckets = tuple(sorted(buckets))
+        # clave de etiquetas -> [conteo por bucket (+Inf al final), suma]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, **etiquetas):
+        clave = tuple(etiquetas.get(nombre, '') for nombre in self.etiquetas)
+        indice = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+
+    @contextmanager
+    def medir(self, **etiquetas):
+        """Observa la duración del bloque (también si termina con una excepción)."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **etiquetas)
+
+    def exponer(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = [(clave, list(conteos), suma) for clave, (conteos, suma) in self._series.items()]
+        for clave, conteos, suma in series:
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + (float('inf'),), conteos):
+                acumulado += conteo
+                le = f'le="{_numero(limite)}"'
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, le)} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {acumulado}")
+        return lineas
+
+
+class RegistroMetricas:
+    """Conjunto de métricas que se exponen juntas en /metrics."""
+
+    def __init__(self):
+        self._metricas = []
+        self._gauges: List[Tuple[str, str, Callable[[], float]]] = []
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = ()) -> Contador:
+        metrica = Contador(nombre, ayuda, etiquetas)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = (),
+                   buckets: Tuple[float, ...] = BUCKETS_SEGUNDOS) -> Histograma:
+        metrica = Histograma(nombre, ayuda, etiquetas, buckets)
+        self._metricas.append(metrica)
+        return metrica
+
+    def gauge(self, nombre: str, ayuda: str, funcion: Callable[[], float]):
+        """Valor que se calcula al exponer (p.ej. sesiones vivas)."""
+        self._gauges.append((nombre, ayuda, funcion))
+
+    def exponer(self) -> str:
+        lineas = []
+        for metrica in self._metricas:
+            lineas.extend(metrica.exponer())
+        for nombre, ayuda, funcion in self._gauges:
+            try:
+                valor = funcion()
+            except Exception as e:
+                print(f"Error leyendo métrica {nombre}: {e}")
+                continue
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} gauge")
+            lineas.append(f"{nombre} {_numero(valor)}")
+        return "\n".join(lineas) + "\n"
@@ -0,0 +1,44 @@
+"""
+Normas de los KPIs (mismas que KPI_NORMAS / KPI_SEMAFORO_CONFIG en script.js).
+
+Las claves son las columnas de la tabla de KPIs. 'mayor': cumple si el
+valor es >= meta; 'menor' (TMO): cumple si es <= meta. La tolerancia define
+la franja amarilla del semáforo.
+"""
+
+NORMAS_KPI = {
+    'tmo': {'tipo': 'menor', 'meta': 5, 'tolerancia': 0.5},
+    'transfepa': {'tipo': 'mayor', 'meta': 85, 'tolerancia': 3},
+    'tipificaciones': {'tipo': 'mayor', 'meta': 95, 'tolerancia': 3},
+    'satep': {'tipo': 'mayor', 'meta': 95, 'tolerancia': 3},
+    'resep': {'tipo': 'mayor', 'meta': 90, 'tolerancia': 3},
+    'satsnl': {'tipo': 'mayor', 'meta': 95, 'tolerancia': 3},
+    'ressnl': {'tipo': 'mayor', 'meta': 90, 'tolerancia': 3},
+}
+
+# Columna -> nombre de la norma en script.js (KPI_NORMAS / kpiDetalle)
+NOMBRES_NORMA = {
+    'tmo': 'tmo',
+    'transfepa': 'transferenciaEPA',
+    'tipificaciones': 'tipificaciones',
+    'satep': 'satisfaccionEP',
+    'resep': 'resolucionEP',
+    'satsnl': 'satisfaccionSNL',
+    'ressnl': 'resolucionSNL',
+}
+
+
+def cumple_meta(columna: str, valor) -> bool:
+    norma = NORMAS_KPI[columna]
+    if valor is None:
+        return False
+    if norma['tipo'] == 'menor':
+        return valor <= norma['meta']
+    return valor >= norma['meta']
+
+
+def sql_cumple_meta(columna: str) -> str:
+    """Condición SQL equivalente a cumple_meta (NULL no cumple)."""
+    norma = NORMAS_KPI[columna]
+    operador = '<=' if norma['tipo'] == 'menor' else '>='
+    return f"{columna} {operador} {norma['meta']}"
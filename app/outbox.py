@@ -0,0 +1,349 @@
+"""
+Outbox local y durable para los envíos a n8n.
+
+Cada confirmación se escribe primero en una tabla SQLite (sobrevive a
+reinicios y a caídas de n8n) y un flusher en segundo plano la drena. Los
+lotes pendientes de la misma fecha_registro se fusionan en una sola llamada
+al webhook (el payload de n8n es por fecha), hasta un máximo de registros
+por envío; se envía cuando se junta ese máximo o cuando el pendiente más
+antiguo cumple la espera máxima. Al iniciar se reanuda lo que haya quedado.
+
+Un envío fallido se reintenta con backoff exponencial por lote (mientras
+tanto siguen saliendo los lotes de otras fechas; los más nuevos de la misma
+fecha esperan al más antiguo y salen fusionados con él, para que un lote
+viejo nunca pise en n8n los valores de uno más nuevo). Si el error es permanente (un
+4xx que no sea 408/429) o se agotan los intentos, el lote pasa a 'fallido'
+(dead letter): queda en la tabla para revisarlo y no se vuelve a enviar.
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, List, Optional
+
+PENDIENTE = 'pendiente'
+ENVIADO = 'enviado'
+FALLIDO = 'fallido'
+
+# Resultado de enviar un grupo de lotes
+OK = 'ok'
+TRANSITORIO = 'transitorio'
+PERMANENTE = 'permanente'
+
+
+def es_error_permanente(status_code: Optional[int]) -> bool:
+    """Un 4xx no se arregla reintentando el mismo payload (salvo timeout y rate limit)."""
+    return status_code is not None and 400 <= status_code < 500 and status_code not in (408, 429)
+
+
+class OutboxN8N:
+
+    def __init__(self, ruta: str, ttl_reclamo: float = 300, max_intentos: int = 12,
+                 backoff_base: float = 2.0, backoff_max: float = 600.0):
+        self.ruta = ruta
+        self.ttl_reclamo = ttl_reclamo
+        self.max_intentos = max_intentos
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        with self._conexion() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    fecha_registro TEXT NOT NULL,
+                    registros TEXT NOT NULL,
+                    cantidad INTEGER NOT NULL,
+                    creado REAL NOT NULL,
+                    estado TEXT NOT NULL DEFAULT 'pendiente',
+                    reclamado REAL,
+                    intentos INTEGER NOT NULL DEFAULT 0,
+                    ultimo_error TEXT,
+                    enviado REAL,
+                    proximo_intento REAL
+                )
+            """)
+            columnas = {fila[1] for fila in conn.execute("PRAGMA table_info(outbox)")}
+            if 'proximo_intento' not in columnas:
+                # Archivo creado por una versión anterior
+                conn.execute("ALTER TABLE outbox ADD COLUMN proximo_intento REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_estado ON outbox (estado, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_fecha ON outbox (fecha_registro, estado, id)")
+
+    @contextmanager
+    def _conexion(self):
+        conn = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA busy_timeout=30000")
+            yield conn
+        finally:
+            conn.close()
+
+    def agregar(self, registros: list, fecha_registro: str) -> int:
+        """Guarda un lote confirmado. Al volver, el lote ya está en disco."""
+        with self._conexion() as conn:
+            conn.execute("PRAGMA synchronous=FULL")
+            cursor = conn.execute(
+                "INSERT INTO outbox (fecha_registro, registros, cantidad, creado) VALUES (?, ?, ?, ?)",
+                (fecha_registro, json.dumps(registros), len(registros), time.time())
+            )
+            return cursor.lastrowid
+
+    # Pendientes que se pueden enviar ahora: sin reclamo vigente, cumplido el backoff y sin
+    # un pendiente más antiguo de la misma fecha que no se pueda enviar (en backoff o
+    # reclamado por otro worker): ese tiene que salir antes, o junto con este
+    _DISPONIBLES = (
+        "estado = ? AND (reclamado IS NULL OR reclamado < ?) "
+        "AND (proximo_intento IS NULL OR proximo_intento <= ?) "
+        "AND NOT EXISTS (SELECT 1 FROM outbox AS anterior "
+        "WHERE anterior.fecha_registro = outbox.fecha_registro AND anterior.estado = ? AND anterior.id < outbox.id "
+        "AND ((anterior.reclamado IS NOT NULL AND anterior.reclamado >= ?) OR anterior.proximo_intento > ?))"
+    )
+
+    def _parametros_disponibles(self, ahora: float) -> tuple:
+        return (PENDIENTE, ahora - self.ttl_reclamo, ahora) * 2
+
+    def resumen_pendientes(self) -> dict:
+        """Pendientes disponibles: cantidad de lotes, registros y edad del más antiguo."""
+        ahora = time.time()
+        with self._conexion() as conn:
+            lotes, registros, mas_antiguo = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(cantidad), 0), MIN(creado) FROM outbox WHERE " + self._DISPONIBLES,
+                self._parametros_disponibles(ahora)
+            ).fetchone()
+        return {
+            "lotes": lotes,
+            "registros": registros,
+            "edad_s": round(ahora - mas_antiguo, 3) if mas_antiguo else None,
+        }
+
+    def reclamar(self, max_registros: int) -> List[dict]:
+        """
+        Reclama lotes pendientes (los más antiguos primero) hasta juntar
+        max_registros (siempre al menos uno). Es atómico entre procesos.
+        Un lote no se reclama mientras haya uno más antiguo de la misma
+        fecha esperando su backoff o en envío por otro worker.
+        """
+        ahora = time.time()
+        with self._conexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            filas = conn.execute(
+                "SELECT id, fecha_registro, registros, cantidad FROM outbox WHERE " + self._DISPONIBLES + " ORDER BY id",
+                self._parametros_disponibles(ahora)
+            )
+            lotes = []
+            total = 0
+            for id_, fecha_registro, registros, cantidad in filas:
+                if lotes and total + cantidad > max_registros:
+                    break
+                lotes.append({"id": id_, "fecha_registro": fecha_registro, "registros": json.loads(registros)})
+                total += cantidad
+            if lotes:
+                ids = [lote["id"] for lote in lotes]
+                conn.execute(
+                    f"UPDATE outbox SET reclamado = ? WHERE id IN ({', '.join('?' * len(ids))})",
+                    [ahora] + ids
+                )
+            conn.execute("COMMIT")
+        return lotes
+
+    def marcar_enviados(self, ids: List[int]):
+        with self._conexion() as conn:
+            conn.execute(
+                f"UPDATE outbox SET estado = ?, enviado = ?, reclamado = NULL, intentos = intentos + 1 "
+                f"WHERE id IN ({', '.join('?' * len(ids))})",
+                [ENVIADO, time.time()] + ids
+            )
+
+    def liberar(self, ids: List[int]):
+        """Devuelve lotes reclamados sin intentarlos (no cuenta como intento)."""
+        with self._conexion() as conn:
+            conn.execute(
+                f"UPDATE outbox SET reclamado = NULL WHERE id IN ({', '.join('?' * len(ids))})", ids
+            )
+
+    def marcar_fallidos(self, ids: List[int], error: str, permanente: bool = False):
+        """
+        Libera los lotes para reintentarlos tras un backoff exponencial, o los
+        deja en 'fallido' si el error es permanente o se agotaron los intentos.
+        """
+        ahora = time.time()
+        with self._conexion() as conn:
+            conn.execute(
+                f"UPDATE outbox SET reclamado = NULL, intentos = intentos + 1, ultimo_error = ?, "
+                f"estado = CASE WHEN ? OR intentos + 1 >= ? THEN ? ELSE estado END, "
+                f"proximo_intento = ? + MIN(?, ? * (1 << MIN(intentos, 30))) "
+                f"WHERE id IN ({', '.join('?' * len(ids))})",
+                [error, permanente, self.max_intentos, FALLIDO, ahora, self.backoff_max, self.backoff_base] + ids
+            )
+
+    def estado_lote(self, id_: int) -> Optional[dict]:
+        with self._conexion() as conn:
+            fila = conn.execute(
+                "SELECT estado, intentos, ultimo_error FROM outbox WHERE id = ?", (id_,)
+            ).fetchone()
+        if fila is None:
+            return None
+        return {"estado": fila[0], "intentos": fila[1], "ultimo_error": fila[2]}
+
+    def purgar_enviados(self, retencion: float) -> int:
+        with self._conexion() as conn:
+            cursor = conn.execute(
+                "DELETE FROM outbox WHERE estado = ? AND enviado < ?", (ENVIADO, time.time() - retencion)
+            )
+            return cursor.rowcount
+
+    def stats(self) -> dict:
+        with self._conexion() as conn:
+            enviados, = conn.execute("SELECT COUNT(*) FROM outbox WHERE estado = ?", (ENVIADO,)).fetchone()
+            con_error, = conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE estado = ? AND ultimo_error IS NOT NULL", (PENDIENTE,)
+            ).fetchone()
+            fallidos, = conn.execute("SELECT COUNT(*) FROM outbox WHERE estado = ?", (FALLIDO,)).fetchone()
+            ultimos_fallidos = conn.execute(
+                "SELECT id, fecha_registro, cantidad, intentos, ultimo_error FROM outbox "
+                "WHERE estado = ? ORDER BY id DESC LIMIT 10",
+                (FALLIDO,)
+            ).fetchall()
+        return {
+            **self.resumen_pendientes(),
+            "enviados_retenidos": enviados,
+            "pendientes_con_error": con_error,
+            "fallidos": fallidos,
+            "ultimos_fallidos": [
+                {"id": id_, "fecha_registro": fecha, "registros": cantidad, "intentos": intentos, "error": error}
+                for id_, fecha, cantidad, intentos, error in ultimos_fallidos
+            ],
+        }
+
+
+def fusionar_por_fecha(lotes: List[dict]) -> Dict[str, dict]:
+    """
+    Agrupa los lotes por fecha_registro y fusiona sus registros. Si un
+    ejecutivo viene en más de un lote, manda el lote más reciente.
+    """
+    grupos: Dict[str, dict] = {}
+    for lote in lotes:
+        grupo = grupos.setdefault(lote["fecha_registro"], {"ids": [], "registros": {}})
+        grupo["ids"].append(lote["id"])
+        for registro in lote["registros"]:
+            grupo["registros"][registro["ejecutivo"]] = registro
+    return {
+        fecha: {"ids": grupo["ids"], "registros": list(grupo["registros"].values())}
+        for fecha, grupo in grupos.items()
+    }
+
+
+def clave_envio(ids: List[int]) -> str:
+    """Idempotency-Key estable para un mismo conjunto de lotes."""
+    return "kpi-outbox-" + hashlib.sha256(",".join(map(str, ids)).encode()).hexdigest()[:32]
+
+
+class FlusherOutbox:
+    """
+    Drena el outbox en segundo plano. `enviar(registros, fecha_registro, clave)`
+    debe devolver {"success": bool, ...} como enviar_a_n8n.
+    """
+
+    def __init__(self, outbox: OutboxN8N, enviar: Callable[[list, str, str], Awaitable[dict]],
+                 intervalo: float = 2.0, max_registros: int = 5000, max_espera: float = 5.0,
+                 retencion: float = 86400):
+        self.outbox = outbox
+        self.enviar = enviar
+        self.intervalo = intervalo
+        self.max_registros = max_registros
+        self.max_espera = max_espera
+        self.retencion = retencion
+        self._aviso = None
+        self._tarea = None
+
+    def iniciar(self):
+        self._aviso = asyncio.Event()
+        self._tarea = asyncio.create_task(self._ciclo())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            await asyncio.gather(self._tarea, return_exceptions=True)
+            self._tarea = None
+
+    def notificar(self):
+        """Avisa que hay un lote nuevo (para revisar el umbral de tamaño sin esperar)."""
+        if self._aviso is not None:
+            self._aviso.set()
+
+    async def _ciclo(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._aviso.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+            self._aviso.clear()
+            try:
+                await self.drenar()
+            except Exception as e:
+                print(f"Error drenando outbox: {e}")
+
+    async def drenar(self, forzar: bool = False) -> int:
+        """Envía lo pendiente que cumpla el umbral de tamaño o de espera. Devuelve lotes enviados."""
+        loop = asyncio.get_running_loop()
+        enviados = 0
+        while True:
+            resumen = await loop.run_in_executor(None, self.outbox.resumen_pendientes)
+            if not resumen["lotes"]:
+                break
+            listo = (
+                forzar
+                or resumen["registros"] >= self.max_registros
+                or resumen["edad_s"] >= self.max_espera
+            )
+            if not listo:
+                break
+
+            lotes = await loop.run_in_executor(None, self.outbox.reclamar, self.max_registros)
+            if not lotes:
+                break
+            transitorio = False
+            for fecha_registro, grupo in fusionar_por_fecha(lotes).items():
+                resultado = await self._enviar_grupo(grupo["ids"], grupo["registros"], fecha_registro)
+                if resultado == PERMANENTE and len(grupo["ids"]) > 1:
+                    # Un lote malo no debe arrastrar a los otros de la misma fecha: se prueban de a uno,
+                    # del más antiguo al más nuevo
+                    resultado = OK
+                    del_grupo = [lote for lote in lotes if lote["id"] in grupo["ids"]]
+                    for i, lote in enumerate(del_grupo):
+                        individual = await self._enviar_grupo([lote["id"]], lote["registros"], fecha_registro)
+                        if individual == TRANSITORIO:
+                            # Los más nuevos no pueden salir antes que este: esperan su reintento
+                            resultado = TRANSITORIO
+                            restantes = [otro["id"] for otro in del_grupo[i + 1:]]
+                            if restantes:
+                                await loop.run_in_executor(None, self.outbox.liberar, restantes)
+                            break
+                        if individual == OK:
+                            enviados += 1
+                elif resultado == OK:
+                    enviados += len(grupo["ids"])
+                transitorio = transitorio or resultado == TRANSITORIO
+            if transitorio:
+                # n8n con problemas: se reintenta en el próximo ciclo (con backoff por lote)
+                break
+
+        await loop.run_in_executor(None, self.outbox.purgar_enviados, self.retencion)
+        return enviados
+
+    async def _enviar_grupo(self, ids: List[int], registros: list, fecha_registro: str) -> str:
+        """Envía un grupo y marca sus lotes; devuelve OK, TRANSITORIO o PERMANENTE."""
+        loop = asyncio.get_running_loop()
+        result = await self.enviar(registros, fecha_registro, clave_envio(ids))
+        if result.get("success"):
+            await loop.run_in_executor(None, self.outbox.marcar_enviados, ids)
+            return OK
+        permanente = es_error_permanente(result.get("status_code"))
+        error = result.get("error", "Error en n8n")
+        if permanente and len(ids) > 1:
+            # Se decide lote por lote (ver drenar): no se marcan todavía
+            return PERMANENTE
+        await loop.run_in_executor(None, lambda: self.outbox.marcar_fallidos(ids, error, permanente))
+        return PERMANENTE if permanente else TRANSITORIO
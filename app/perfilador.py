@@ -0,0 +1,296 @@
+"""
+Perfilado a pedido de una sola carga (/upload, /preview o /confirm).
+
+Mientras el perfil está activo un hilo toma muestras cada pocos
+milisegundos (sys._current_frames) de las pilas de los hilos que trabajan
+para la carga: el del event loop que la recibió y los que la ejecutan por
+encargo (funciones envueltas con en_perfil o bloques con PerfilCarga.hilo),
+no el resto del proceso. El event loop es compartido, así que sus muestras
+pueden incluir otras peticiones concurrentes. tracemalloc registra las
+asignaciones (esas sí de todo el proceso). Al terminar se arma un reporte con
+las funciones que más muestras acumulan y las líneas que más memoria tenían
+asignada en el pico, y se guarda como JSON en un directorio (así cualquier
+worker puede devolverlo).
+
+Solo puede haber un perfil activo por proceso: tracemalloc y el muestreo
+son globales. Sin perfil activo no hay ningún costo; con tracemalloc la
+carga perfilada corre varias veces más lenta (las proporciones de CPU se
+mantienen aproximadas), así que el seguimiento de memoria se puede apagar.
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, List, Optional
+
+# Funciones donde un hilo está esperando, no trabajando (no cuentan como muestras de CPU)
+_ESPERAS = {
+    ('threading.py', 'wait'),
+    ('selectors.py', 'select'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+    ('socketserver.py', 'serve_forever'),
+    ('connection.py', 'wait'),
+}
+
+# Módulo del parseo, para separar sus líneas en el reporte de memoria
+MODULO_PARSEO = 'procesamiento_kpi.py'
+
+_activo = threading.Lock()
+
+# Perfil de la carga que se está atendiendo en este contexto (ver PerfilCarga.activo)
+_perfil_en_curso: ContextVar[Optional['PerfilCarga']] = ContextVar('perfil_en_curso', default=None)
+
+
+class PerfilCarga:
+    """Un perfil en curso. Se crea con iniciar_perfil() y se cierra con terminar()."""
+
+    def __init__(self, directorio: str, ruta: str, intervalo: float, max_reportes: int, memoria: bool = True):
+        self.id = uuid.uuid4().hex[:16]
+        self.directorio = directorio
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self.max_reportes = max_reportes
+        self.memoria = memoria
+        self._propias = Counter()
+        self._acumuladas = Counter()
+        self._muestras = 0
+        # Hilos a muestrear (ident -> cuántos bloques de la carga corren en él)
+        self._hilos = Counter()
+        self._hilos_lock = threading.Lock()
+        self._hilos_vistos = set()
+        self._snapshot = None
+        self._memoria_snapshot = 0
+        self._detener = threading.Event()
+        self._hilo = None
+        self._inicio = None
+        self._terminado = False
+
+    def iniciar(self):
+        # El hilo que inicia el perfil (el del event loop) se muestrea todo el perfil
+        self._hilos[threading.get_ident()] += 1
+        if self.memoria:
+            tracemalloc.start()
+        self._inicio = time.perf_counter()
+        self._hilo = threading.Thread(target=self._muestrear, name='kpi-perfil', daemon=True)
+        self._hilo.start()
+
+    @contextmanager
+    def hilo(self):
+        """Muestrea el hilo actual mientras dure el bloque."""
+        ident = threading.get_ident()
+        with self._hilos_lock:
+            self._hilos[ident] += 1
+        try:
+            yield
+        finally:
+            with self._hilos_lock:
+                self._hilos[ident] -= 1
+                if self._hilos[ident] <= 0:
+                    del self._hilos[ident]
+
+    def envolver(self, funcion: Callable) -> Callable:
+        """`funcion` de modo que el hilo que la ejecute se muestree mientras corre."""
+        @functools.wraps(funcion)
+        def envuelta(*args, **kwargs):
+            with self.hilo():
+                return funcion(*args, **kwargs)
+        return envuelta
+
+    @contextmanager
+    def activo(self):
+        """Hace de este perfil el de la carga en curso para en_perfil() dentro del bloque."""
+        token = _perfil_en_curso.set(self)
+        try:
+            yield self
+        finally:
+            _perfil_en_curso.reset(token)
+
+    def _muestrear(self):
+        propio = threading.get_ident()
+        ultimo_snapshot = 0.0
+        while not self._detener.wait(self.intervalo):
+            with self._hilos_lock:
+                hilos = set(self._hilos)
+            for ident, frame in sys._current_frames().items():
+                if ident == propio or ident not in hilos:
+                    continue
+                self._hilos_vistos.add(ident)
+                codigo = frame.f_code
+                if (os.path.basename(codigo.co_filename), codigo.co_name) in _ESPERAS:
+                    continue
+                self._muestras += 1
+                self._propias[(codigo.co_filename, frame.f_lineno, codigo.co_name)] += 1
+                vistas = set()
+                while frame is not None:
+                    codigo = frame.f_code
+                    clave = (codigo.co_filename, codigo.co_firstlineno, codigo.co_name)
+                    if clave not in vistas:
+                        vistas.add(clave)
+                        self._acumuladas[clave] += 1
+                    frame = frame.f_back
+
+            if not self.memoria:
+                continue
+            # Cerca del pico se guarda una foto de las asignaciones por línea
+            actual, _ = tracemalloc.get_traced_memory()
+            ahora = time.perf_counter()
+            if actual > self._memoria_snapshot * 1.25 and ahora - ultimo_snapshot > 0.2:
+                self._tomar_snapshot(actual)
+                ultimo_snapshot = ahora
+
+    def _tomar_snapshot(self, memoria: int):
+        self._snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        self._memoria_snapshot = memoria
+
+    def terminar(self) -> Optional[dict]:
+        """Detiene el muestreo, guarda el reporte y lo devuelve (una sola vez)."""
+        if self._terminado:
+            return None
+        self._terminado = True
+        try:
+            self._detener.set()
+            self._hilo.join()
+            duracion = time.perf_counter() - self._inicio
+            pico = 0
+            if self.memoria:
+                actual, pico = tracemalloc.get_traced_memory()
+                if self._snapshot is None or actual > self._memoria_snapshot:
+                    self._tomar_snapshot(actual)
+        finally:
+            if self.memoria:
+                tracemalloc.stop()
+            _activo.release()
+
+        reporte = {
+            "id": self.id,
+            "ruta": self.ruta,
+            "fecha": datetime.now().isoformat(timespec='seconds'),
+            "duracion_s": round(duracion, 4),
+            "intervalo_ms": self.intervalo * 1000,
+            "muestras": self._muestras,
+            "alcance": "hilos de la carga (el del event loop es compartido)",
+            "hilos": len(self._hilos_vistos),
+            "cpu": {
+                "propias": self._top_cpu(self._propias),
+                "acumuladas": self._top_cpu(self._acumuladas),
+            },
+            "memoria": None if not self.memoria else {
+                "pico_kb": round(pico / 1024, 1),
+                "snapshot_kb": round(self._memoria_snapshot / 1024, 1),
+                "por_linea": self._top_memoria(),
+                "parseo": self._top_memoria(MODULO_PARSEO),
+            },
+        }
+        try:
+            guardar_reporte(self.directorio, reporte, self.max_reportes)
+        except OSError as e:
+            print(f"Error guardando perfil {self.id}: {e}")
+        return reporte
+
+    def _top_cpu(self, conteos: Counter, limite: int = 30) -> List[dict]:
+        total = self._muestras or 1
+        return [
+            {"funcion": nombre, "archivo": archivo, "linea": linea, "muestras": n, "pct": round(100 * n / total, 1)}
+            for (archivo, linea, nombre), n in conteos.most_common(limite)
+        ]
+
+    def _top_memoria(self, modulo: Optional[str] = None, limite: int = 25) -> List[dict]:
+        if self._snapshot is None:
+            return []
+        estadisticas = self._snapshot.statistics('lineno')
+        if modulo:
+            estadisticas = [e for e in estadisticas if os.path.basename(e.traceback[0].filename) == modulo]
+        return [
+            {
+                "archivo": e.traceback[0].filename,
+                "linea": e.traceback[0].lineno,
+                "kb": round(e.size / 1024, 1),
+                "bloques": e.count,
+            }
+            for e in estadisticas[:limite]
+        ]
+
+
+def iniciar_perfil(directorio: str, ruta: str, intervalo: float = 0.005, max_reportes: int = 50,
+                   memoria: bool = True) -> Optional[PerfilCarga]:
+    """Empieza un perfil; None si ya hay otro activo en este proceso."""
+    if not _activo.acquire(blocking=False):
+        return None
+    try:
+        perfil = PerfilCarga(directorio, ruta, intervalo, max_reportes, memoria)
+        perfil.iniciar()
+    except Exception:
+        _activo.release()
+        raise
+    return perfil
+
+
+def en_perfil(funcion: Callable) -> Callable:
+    """
+    `funcion` tal cual, o envuelta para que el perfil activo en este contexto
+    muestree el hilo que la ejecute (para loop.run_in_executor).
+    """
+    perfil = _perfil_en_curso.get()
+    return funcion if perfil is None else perfil.envolver(funcion)
+
+
+def guardar_reporte(directorio: str, reporte: dict, max_reportes: int):
+    os.makedirs(directorio, exist_ok=True)
+    temporal = os.path.join(directorio, f".{reporte['id']}.tmp")
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, ensure_ascii=False)
+    os.replace(temporal, os.path.join(directorio, f"{reporte['id']}.json"))
+
+    # Se conservan solo los más recientes
+    archivos = sorted(
+        (os.path.join(directorio, nombre) for nombre in os.listdir(directorio) if nombre.endswith('.json')),
+        key=os.path.getmtime
+    )
+    for ruta in archivos[:-max_reportes]:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+
+def listar_reportes(directorio: str) -> List[dict]:
+    """Resumen de los reportes guardados, el más reciente primero."""
+    if not os.path.isdir(directorio):
+        return []
+    resumen = []
+    for nombre in os.listdir(directorio):
+        if not nombre.endswith('.json'):
+            continue
+        reporte = obtener_reporte(directorio, nombre[:-len('.json')])
+        if reporte is not None:
+            resumen.append({
+                "id": reporte['id'],
+                "ruta": reporte['ruta'],
+                "fecha": reporte['fecha'],
+                "duracion_s": reporte['duracion_s'],
+                "pico_kb": reporte['memoria']['pico_kb'] if reporte['memoria'] else None,
+            })
+    resumen.sort(key=lambda r: r['fecha'], reverse=True)
+    return resumen
+
+
+def obtener_reporte(directorio: str, reporte_id: str) -> Optional[dict]:
+    if not reporte_id.isalnum():
+        return None
+    try:
+        with open(os.path.join(directorio, f"{reporte_id}.json"), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
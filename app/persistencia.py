@@ -0,0 +1,562 @@
+"""
+Escritura directa de los registros KPI en la base de datos.
+
+Cada confirmación se inserta en una sola transacción con upserts multi-fila
+por lotes, clave (ejecutivo, fecha_registro). El backend 'mysql' usa un
+pool de conexiones creado desde DB_CONFIG; el backend 'sqlite' sirve como
+base local para desarrollo y pruebas (misma tabla y misma lógica).
+
+Junto a la tabla de KPIs se mantienen dos tablas por periodo (anio, mes):
+- {tabla}_meses: catálogo con cantidad de filas, ejecutivos y última fecha.
+- {tabla}_resumen: por KPI, cantidad de valores, suma, mínimo, máximo y
+  ejecutivos que cumplen la meta (sobre la carga vigente de cada ejecutivo).
+Ambas se recalculan solo para el periodo que cambia, así /meses-disponibles
+y /kpis/historial no recorren la tabla de KPIs.
+
+En MySQL no se ejecuta DDL: las tablas las crea el DBA con el esquema de
+DOCUMENTACION_PROYECTO.md y al primer uso solo se verifica que existan las
+columnas y la clave única (ejecutivo, fecha_registro) que necesita el
+upsert. SQLite (local) crea sus tablas.
+"""
+import base64
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from normas_kpi import sql_cumple_meta
+
+MESES_ESP = ['ENERO', 'FEBRERO', 'MARZO', 'ABRIL', 'MAYO', 'JUNIO',
+             'JULIO', 'AGOSTO', 'SEPTIEMBRE', 'OCTUBRE', 'NOVIEMBRE', 'DICIEMBRE']
+
+# Columnas de KPI en la tabla (mismas claves que los registros unificados)
+COLUMNAS_KPI = ['tmo', 'transfepa', 'tipificaciones', 'satep', 'resep', 'satsnl', 'ressnl']
+COLUMNAS = ['ejecutivo', 'fecha_registro', 'anio', 'mes'] + COLUMNAS_KPI
+
+# Nombres de campo que usa el dashboard (script.js) -> columna en la tabla
+CAMPOS_API = {
+    'name': 'ejecutivo',
+    'mes': 'mes',
+    'anio': 'anio',
+    'fecha_registro': 'fecha_registro',
+    'tmo': 'tmo',
+    'transfEPA': 'transfepa',
+    'tipificaciones': 'tipificaciones',
+    'satEp': 'satep',
+    'resEp': 'resep',
+    'satSnl': 'satsnl',
+    'resSnl': 'ressnl',
+}
+
+
+def periodo_desde_fecha(fecha_registro: str) -> Tuple[int, str]:
+    """'2026-01-31' -> (2026, 'ENERO')"""
+    fecha_obj = datetime.strptime(fecha_registro, '%Y-%m-%d')
+    return fecha_obj.year, MESES_ESP[fecha_obj.month - 1]
+
+
+def codificar_cursor(fecha_registro, ejecutivo: str) -> str:
+    """Cursor opaco para paginar por (fecha_registro, ejecutivo)."""
+    crudo = json.dumps([str(fecha_registro), ejecutivo]).encode('utf-8')
+    return base64.urlsafe_b64encode(crudo).decode('ascii')
+
+
+def decodificar_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        fecha_registro, ejecutivo = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(fecha_registro), str(ejecutivo)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+class RepositorioKPI:
+    """Base común: arma los upserts por lote y los ejecuta en una transacción."""
+
+    marcador = '%s'
+
+    def __init__(self, tabla: str = 'kpis'):
+        self.tabla = tabla
+        self.tabla_meses = f"{tabla}_meses"
+        self.tabla_resumen = f"{tabla}_resumen"
+        self._tabla_lista = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def conexion(self) -> Iterator:
+        raise NotImplementedError
+
+    def preparar_esquema(self, cursor):
+        """Crea las tablas (SQLite) o verifica que ya existan con lo necesario (MySQL)."""
+        raise NotImplementedError
+
+    def sql_upsert(self, filas: int) -> str:
+        raise NotImplementedError
+
+    def sql_actualizar_catalogo(self) -> str:
+        """INSERT ... SELECT del resumen de un periodo (parámetros: mes_num, anio, mes; la fila anterior ya se borró)."""
+        return (
+            f"INSERT INTO {self.tabla_meses} (anio, mes, mes_num, registros, ejecutivos, ultima_fecha) "
+            f"{self._sql_resumen_periodo()}"
+        )
+
+    def _sql_resumen_periodo(self) -> str:
+        m = self.marcador
+        return (
+            f"SELECT anio, mes, {m}, COUNT(*), COUNT(DISTINCT ejecutivo), MAX(fecha_registro) "
+            f"FROM {self.tabla} WHERE anio = {m} AND mes = {m} GROUP BY anio, mes"
+        )
+
+    def _sql_vigente(self, alias: str = 'k') -> str:
+        """Condición: la fila es la carga más reciente del ejecutivo en su mes."""
+        return (
+            f"{alias}.fecha_registro = (SELECT MAX(k2.fecha_registro) FROM {self.tabla} k2 "
+            f"WHERE k2.ejecutivo = {alias}.ejecutivo AND k2.anio = {alias}.anio AND k2.mes = {alias}.mes)"
+        )
+
+    @property
+    def esquema_listo(self) -> bool:
+        """Las tablas ya se crearon (SQLite) o se verificaron (MySQL)."""
+        return self._tabla_lista
+
+    def _valores_fila(self) -> str:
+        return "(" + ", ".join([self.marcador] * len(COLUMNAS)) + ")"
+
+    def asegurar_tabla(self):
+        if self._tabla_lista:
+            return
+        with self._lock:
+            if self._tabla_lista:
+                return
+            with self.conexion() as conn:
+                cursor = conn.cursor()
+                self.preparar_esquema(cursor)
+                conn.commit()
+                # Primera vez con catálogo/resumen (tabla de KPIs ya poblada): se arman una sola vez
+                cursor.execute(f"SELECT COUNT(*) FROM {self.tabla_meses}")
+                catalogo_vacio = cursor.fetchone()[0] == 0
+                cursor.execute(f"SELECT COUNT(*) FROM {self.tabla_resumen}")
+                resumen_vacio = cursor.fetchone()[0] == 0
+                if catalogo_vacio or resumen_vacio:
+                    cursor.execute(f"SELECT DISTINCT anio, mes FROM {self.tabla}")
+                    for anio, mes in cursor.fetchall():
+                        self._actualizar_periodo(cursor, anio, mes)
+                    conn.commit()
+            self._tabla_lista = True
+
+    def _actualizar_periodo(self, cursor, anio: int, mes: str):
+        """Recalcula catálogo y resumen de un periodo (solo lee las filas de ese mes)."""
+        mes_num = MESES_ESP.index(mes) + 1 if mes in MESES_ESP else 13
+        m = self.marcador
+        # Sin filas en el periodo el INSERT ... SELECT no inserta nada: la entrada se borra antes
+        cursor.execute(f"DELETE FROM {self.tabla_meses} WHERE anio = {m} AND mes = {m}", (anio, mes))
+        cursor.execute(self.sql_actualizar_catalogo(), (mes_num, anio, mes))
+
+        agregados = ", ".join(
+            f"COUNT({col}), SUM({col}), MIN({col}), MAX({col}), SUM(CASE WHEN {sql_cumple_meta(col)} THEN 1 ELSE 0 END)"
+            for col in COLUMNAS_KPI
+        )
+        cursor.execute(
+            f"SELECT {agregados} FROM {self.tabla} k WHERE k.anio = {m} AND k.mes = {m} AND {self._sql_vigente()}",
+            (anio, mes)
+        )
+        fila = cursor.fetchone()
+        cursor.execute(f"DELETE FROM {self.tabla_resumen} WHERE anio = {m} AND mes = {m}", (anio, mes))
+        parametros = []
+        for i, col in enumerate(COLUMNAS_KPI):
+            n, suma, minimo, maximo, cumplen = fila[i * 5:i * 5 + 5]
+            if not n:
+                continue
+            parametros.extend([anio, mes, mes_num, col, n, float(suma), float(minimo), float(maximo), int(cumplen or 0)])
+        if parametros:
+            valores = ", ".join(["(" + ", ".join([m] * 9) + ")"] * (len(parametros) // 9))
+            cursor.execute(
+                f"INSERT INTO {self.tabla_resumen} "
+                f"(anio, mes, mes_num, kpi, n, suma, minimo, maximo, cumplen) VALUES {valores}",
+                parametros
+            )
+
+    def actualizar_periodo(self, anio: int, mes: str):
+        """Recalcula catálogo y resumen de un solo periodo (cuando otro proceso, p.ej. n8n, escribió)."""
+        self.asegurar_tabla()
+        with self.conexion() as conn:
+            cursor = conn.cursor()
+            try:
+                self._actualizar_periodo(cursor, anio, mes)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def insertar_registros(self, registros: list, fecha_registro: str, batch_size: int = 500) -> dict:
+        """
+        Inserta (o actualiza) todos los registros de una fecha en una sola
+        transacción. Si un lote falla, no queda nada a medias.
+        """
+        self.asegurar_tabla()
+        anio, mes = periodo_desde_fecha(fecha_registro)
+
+        lotes = 0
+        with self.conexion() as conn:
+            cursor = conn.cursor()
+            try:
+                for inicio in range(0, len(registros), batch_size):
+                    lote = registros[inicio:inicio + batch_size]
+                    parametros = []
+                    for reg in lote:
+                        parametros.extend([reg['ejecutivo'], fecha_registro, anio, mes])
+                        parametros.extend(reg.get(col) for col in COLUMNAS_KPI)
+                    cursor.execute(self.sql_upsert(len(lote)), parametros)
+                    lotes += 1
+                # Catálogo y resumen se actualizan en la misma transacción que los datos
+                self._actualizar_periodo(cursor, anio, mes)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        return {
+            "registros": len(registros),
+            "lotes": lotes,
+            "fecha_registro": fecha_registro,
+            "anio": anio,
+            "mes": mes
+        }
+
+    def consultar_kpis(self, meses: Optional[List[str]] = None, anio: Optional[int] = None,
+                       ejecutivos: Optional[List[str]] = None, campos: Optional[List[str]] = None,
+                       limite: int = 1000, cursor: Optional[str] = None) -> dict:
+        """
+        Lee los KPIs filtrando en SQL por mes/año/ejecutivo, solo con los
+        campos pedidos y paginando por keyset (fecha_registro, ejecutivo).
+        Si un ejecutivo tiene varias cargas en el mes, se usa la más reciente.
+        """
+        self.asegurar_tabla()
+        campos = campos or list(CAMPOS_API)
+        m = self.marcador
+
+        condiciones = [self._sql_vigente()]
+        parametros = []
+        if meses:
+            condiciones.append(f"k.mes IN ({', '.join([m] * len(meses))})")
+            parametros.extend(meses)
+        if anio is not None:
+            condiciones.append(f"k.anio = {m}")
+            parametros.append(anio)
+        if ejecutivos:
+            condiciones.append(f"k.ejecutivo IN ({', '.join([m] * len(ejecutivos))})")
+            parametros.extend(ejecutivos)
+        if cursor:
+            fecha_cursor, ejecutivo_cursor = decodificar_cursor(cursor)
+            condiciones.append(f"(k.fecha_registro > {m} OR (k.fecha_registro = {m} AND k.ejecutivo > {m}))")
+            parametros.extend([fecha_cursor, fecha_cursor, ejecutivo_cursor])
+
+        # Siempre se leen las columnas del cursor, aunque no se devuelvan
+        columnas = list(dict.fromkeys(['fecha_registro', 'ejecutivo'] + [CAMPOS_API[c] for c in campos]))
+        sql = (
+            f"SELECT {', '.join('k.' + c for c in columnas)} FROM {self.tabla} k "
+            f"WHERE {' AND '.join(condiciones)} "
+            f"ORDER BY k.fecha_registro, k.ejecutivo LIMIT {int(limite) + 1}"
+        )
+
+        with self.conexion() as conn:
+            cur = conn.cursor()
+            cur.execute(sql, parametros)
+            filas = cur.fetchall()
+
+        hay_mas = len(filas) > limite
+        filas = filas[:limite]
+        indice = {columna: i for i, columna in enumerate(columnas)}
+        data = [{campo: fila[indice[CAMPOS_API[campo]]] for campo in campos} for fila in filas]
+        siguiente = None
+        if hay_mas and filas:
+            ultima = filas[-1]
+            siguiente = codificar_cursor(ultima[indice['fecha_registro']], ultima[indice['ejecutivo']])
+        return {"data": data, "count": len(data), "next_cursor": siguiente}
+
+    def meses_disponibles(self) -> list:
+        """
+        Meses con datos desde el catálogo, en orden cronológico:
+        [{"mes": "ENERO", "anio": 2026, "registros": 120, "ejecutivos": 60, ...}, ...]
+        """
+        self.asegurar_tabla()
+        with self.conexion() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                f"SELECT anio, mes, registros, ejecutivos, ultima_fecha, actualizado "
+                f"FROM {self.tabla_meses} ORDER BY anio, mes_num"
+            )
+            filas = cur.fetchall()
+        return [
+            {
+                "mes": mes,
+                "anio": anio,
+                "registros": registros,
+                "ejecutivos": ejecutivos,
+                "ultima_fecha": str(ultima_fecha),
+                "actualizado": str(actualizado)
+            }
+            for anio, mes, registros, ejecutivos, ultima_fecha, actualizado in filas
+        ]
+
+    def resumen_mensual(self) -> list:
+        """Filas del resumen por periodo y KPI, en orden cronológico."""
+        self.asegurar_tabla()
+        with self.conexion() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                f"SELECT anio, mes, kpi, n, suma, minimo, maximo, cumplen "
+                f"FROM {self.tabla_resumen} ORDER BY anio, mes_num"
+            )
+            filas = cur.fetchall()
+        return [
+            {
+                "anio": anio,
+                "mes": mes,
+                "kpi": kpi,
+                "n": n,
+                "promedio": float(suma) / n,
+                "minimo": float(minimo),
+                "maximo": float(maximo),
+                "cumplen": cumplen
+            }
+            for anio, mes, kpi, n, suma, minimo, maximo, cumplen in filas
+        ]
+
+    def registros_vigentes(self, anio: int, mes: str) -> list:
+        """
+        Carga vigente de cada ejecutivo en un periodo, ordenada por ejecutivo,
+        con el mismo formato que unificar_datos_kpi ({'ejecutivo', 'tmo', ...}).
+        """
+        self.asegurar_tabla()
+        m = self.marcador
+        with self.conexion() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                f"SELECT ejecutivo, {', '.join(COLUMNAS_KPI)} FROM {self.tabla} k "
+                f"WHERE k.anio = {m} AND k.mes = {m} AND {self._sql_vigente()} ORDER BY k.ejecutivo",
+                (anio, mes)
+            )
+            filas = cur.fetchall()
+        return [
+            {
+                "ejecutivo": fila[0],
+                **{col: (float(valor) if valor is not None else None) for col, valor in zip(COLUMNAS_KPI, fila[1:])}
+            }
+            for fila in filas
+        ]
+
+    def historial_vigente(self) -> list:
+        """
+        Carga vigente de cada ejecutivo en cada mes, en orden cronológico:
+        [{'anio', 'mes', 'ejecutivo', 'tmo', ...}, ...]
+        """
+        self.asegurar_tabla()
+        with self.conexion() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                f"SELECT anio, mes, ejecutivo, {', '.join(COLUMNAS_KPI)} FROM {self.tabla} k "
+                f"WHERE {self._sql_vigente()} ORDER BY k.fecha_registro, k.ejecutivo"
+            )
+            filas = cur.fetchall()
+        return [
+            {
+                "anio": fila[0],
+                "mes": fila[1],
+                "ejecutivo": fila[2],
+                **{col: (float(valor) if valor is not None else None) for col, valor in zip(COLUMNAS_KPI, fila[3:])}
+            }
+            for fila in filas
+        ]
+
+    def ultimo_anio_con_mes(self, mes: str) -> Optional[int]:
+        """Año más reciente del catálogo que tiene datos para `mes`."""
+        self.asegurar_tabla()
+        with self.conexion() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT MAX(anio) FROM {self.tabla_meses} WHERE mes = {self.marcador}", (mes,))
+            fila = cur.fetchone()
+        return fila[0] if fila else None
+
+    def serie_ejecutivo(self, ejecutivo: str) -> list:
+        """Carga vigente de un ejecutivo en cada mes, en orden cronológico (usa el índice por ejecutivo)."""
+        self.asegurar_tabla()
+        m = self.marcador
+        with self.conexion() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                f"SELECT anio, mes, {', '.join(COLUMNAS_KPI)} FROM {self.tabla} k "
+                f"WHERE k.ejecutivo = {m} AND {self._sql_vigente()} ORDER BY k.fecha_registro",
+                (ejecutivo,)
+            )
+            filas = cur.fetchall()
+        return [
+            {
+                "anio": fila[0],
+                "mes": fila[1],
+                **{col: (float(valor) if valor is not None else None) for col, valor in zip(COLUMNAS_KPI, fila[2:])}
+            }
+            for fila in filas
+        ]
+
+
+class RepositorioMySQL(RepositorioKPI):
+    """MySQL con pool de conexiones (mysql.connector.pooling)."""
+
+    def __init__(self, db_config: dict, pool_size: int = 5, tabla: str = 'kpis'):
+        super().__init__(tabla)
+        from mysql.connector import pooling
+
+        self._pool = pooling.MySQLConnectionPool(
+            pool_name='kpi_pool',
+            pool_size=pool_size,
+            pool_reset_session=True,
+            autocommit=False,
+            **db_config
+        )
+
+    @contextmanager
+    def conexion(self):
+        conn = self._pool.get_connection()
+        try:
+            yield conn
+        finally:
+            # En una conexión del pool, close() la devuelve al pool
+            conn.close()
+
+    def preparar_esquema(self, cursor):
+        """
+        Verifica el esquema existente (no ejecuta DDL): columnas de las tres
+        tablas y la clave única (ejecutivo, fecha_registro) del upsert.
+        """
+        requeridas = {
+            self.tabla: COLUMNAS,
+            self.tabla_meses: ['anio', 'mes', 'mes_num', 'registros', 'ejecutivos', 'ultima_fecha', 'actualizado'],
+            self.tabla_resumen: ['anio', 'mes', 'mes_num', 'kpi', 'n', 'suma', 'minimo', 'maximo', 'cumplen'],
+        }
+        cursor.execute(
+            "SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN (%s, %s, %s)",
+            tuple(requeridas)
+        )
+        existentes = {(tabla, columna.lower()) for tabla, columna in cursor.fetchall()}
+        faltantes = [f"{tabla}.{col}" for tabla, columnas in requeridas.items()
+                     for col in columnas if (tabla, col) not in existentes]
+        if faltantes:
+            raise RuntimeError(
+                f"Esquema MySQL incompleto, faltan: {', '.join(faltantes)} "
+                f"(crear las tablas según DOCUMENTACION_PROYECTO.md)"
+            )
+
+        cursor.execute(
+            "SELECT INDEX_NAME, GROUP_CONCAT(LOWER(COLUMN_NAME) ORDER BY SEQ_IN_INDEX) FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND NON_UNIQUE = 0 GROUP BY INDEX_NAME",
+            (self.tabla,)
+        )
+        if 'ejecutivo,fecha_registro' not in {columnas for _, columnas in cursor.fetchall()}:
+            raise RuntimeError(
+                f"La tabla {self.tabla} necesita una clave única (ejecutivo, fecha_registro) para el upsert"
+            )
+
+    def sql_upsert(self, filas: int) -> str:
+        # Alias de fila (MySQL 8.0.19+) en lugar de VALUES(col), obsoleto en ON DUPLICATE KEY UPDATE
+        valores = ", ".join([self._valores_fila()] * filas)
+        actualizar = ", ".join(f"{col} = nuevo.{col}" for col in ['anio', 'mes'] + COLUMNAS_KPI)
+        return (
+            f"INSERT INTO {self.tabla} ({', '.join(COLUMNAS)}) VALUES {valores} AS nuevo "
+            f"ON DUPLICATE KEY UPDATE {actualizar}"
+        )
+
+
+class RepositorioSQLite(RepositorioKPI):
+    """SQLite local con la misma tabla, para desarrollo y pruebas sin MySQL."""
+
+    marcador = '?'
+    # SQLite limita la cantidad de parámetros por sentencia
+    MAX_PARAMETROS = 32766
+
+    def __init__(self, ruta: str, tabla: str = 'kpis'):
+        super().__init__(tabla)
+        self.ruta = ruta
+
+    @contextmanager
+    def conexion(self):
+        conn = sqlite3.connect(self.ruta, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def preparar_esquema(self, cursor):
+        cursor.execute(self.sql_crear_tabla())
+        cursor.execute(self.sql_crear_catalogo())
+        cursor.execute(self.sql_crear_resumen())
+
+    def sql_crear_tabla(self) -> str:
+        columnas_kpi = ",\n".join(f"    {col} REAL" for col in COLUMNAS_KPI)
+        return f"""
+CREATE TABLE IF NOT EXISTS {self.tabla} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ejecutivo TEXT NOT NULL,
+    fecha_registro TEXT NOT NULL,
+    anio INTEGER NOT NULL,
+    mes TEXT NOT NULL,
+{columnas_kpi},
+    actualizado TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (ejecutivo, fecha_registro)
+)
+"""
+
+    def sql_crear_catalogo(self) -> str:
+        return f"""
+CREATE TABLE IF NOT EXISTS {self.tabla_meses} (
+    anio INTEGER NOT NULL,
+    mes TEXT NOT NULL,
+    mes_num INTEGER NOT NULL,
+    registros INTEGER NOT NULL,
+    ejecutivos INTEGER NOT NULL,
+    ultima_fecha TEXT NOT NULL,
+    actualizado TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (anio, mes)
+)
+"""
+
+    def sql_crear_resumen(self) -> str:
+        return f"""
+CREATE TABLE IF NOT EXISTS {self.tabla_resumen} (
+    anio INTEGER NOT NULL,
+    mes TEXT NOT NULL,
+    mes_num INTEGER NOT NULL,
+    kpi TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    suma REAL NOT NULL,
+    minimo REAL NOT NULL,
+    maximo REAL NOT NULL,
+    cumplen INTEGER NOT NULL,
+    PRIMARY KEY (anio, mes, kpi)
+)
+"""
+
+    def sql_upsert(self, filas: int) -> str:
+        valores = ", ".join([self._valores_fila()] * filas)
+        actualizar = ", ".join(f"{col} = excluded.{col}" for col in ['anio', 'mes'] + COLUMNAS_KPI)
+        return (
+            f"INSERT INTO {self.tabla} ({', '.join(COLUMNAS)}) VALUES {valores} "
+            f"ON CONFLICT (ejecutivo, fecha_registro) DO UPDATE SET {actualizar}, actualizado = CURRENT_TIMESTAMP"
+        )
+
+    def insertar_registros(self, registros: list, fecha_registro: str, batch_size: int = 500) -> dict:
+        batch_size = min(batch_size, self.MAX_PARAMETROS // len(COLUMNAS))
+        return super().insertar_registros(registros, fecha_registro, batch_size)
+
+
+def crear_repositorio(backend: str, db_config: dict, pool_size: int = 5,
+                      ruta_sqlite: Optional[str] = None, tabla: str = 'kpis') -> RepositorioKPI:
+    """Crea el repositorio según KPI_DB_BACKEND ('mysql' o 'sqlite')."""
+    if backend == 'mysql':
+        return RepositorioMySQL(db_config, pool_size=pool_size, tabla=tabla)
+    if backend == 'sqlite':
+        return RepositorioSQLite(ruta_sqlite, tabla=tabla)
+    raise ValueError(f"Backend de base de datos desconocido: {backend}")
@@ -0,0 +1,379 @@
+"""
+Lectura y unificación de los archivos KPI exportados desde el reporte.
+
+Los archivos se leen directamente desde lo subido (bytes, el spool del
+upload o su ruta en disco), fila a fila. El formato se decide por el
+contenido y no por la extensión: los .xlsx se recorren con openpyxl en modo
+read-only y los .csv con el lector de csv, detectando encoding, separador y
+coma decimal. Ambos caminos aplican las mismas reglas de columnas y pie.
+"""
+import codecs
+import csv
+import os
+import re
+from contextlib import contextmanager
+from io import BytesIO
+from itertools import chain
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+KPIS = ['TMO', 'TransfEPA', 'Tipificaciones', 'SatEP', 'ResEP', 'SatSNL', 'ResSNL']
+
+# Subir cuando cambie la forma de leer/convertir los archivos (invalida el cache de parseo)
+VERSION_PARSER = 3
+
+# Firmas de los primeros bytes: .xlsx es un zip; .xls (Excel 97-2003) es un archivo OLE2
+FIRMA_XLSX = b'PK\x03\x04'
+FIRMA_XLS = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+# Separadores que se prueban en los .csv (Excel es-CL guarda con ';')
+SEPARADORES_CSV = (';', ',', '\t', '|')
+# Bytes que se leen para detectar encoding, separador y coma decimal
+MUESTRA_CSV = 64 * 1024
+BLOQUE_CSV = 256 * 1024
+
+_NUMERO = re.compile(r'[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?')
+_DECIMAL_COMA = re.compile(r'-?\d+,\d+%?')
+_DECIMAL_PUNTO = re.compile(r'-?\d+\.\d+%?')
+
+# Bytes del archivo, ruta en disco o archivo binario abierto (p.ej. el spool del upload)
+FuenteArchivo = Union[bytes, str, BinaryIO]
+
+
+def _es_fila_vacia(fila: tuple) -> bool:
+    return all(celda is None or celda == '' for celda in fila)
+
+
+def _es_pie(ejecutivo) -> bool:
+    """Filas de pie del reporte ('Total' / 'Filtros aplicados')."""
+    return isinstance(ejecutivo, str) and ('Filtros aplicados' in ejecutivo or ejecutivo == 'Total')
+
+
+def _valor_numerico(valor) -> Optional[float]:
+    """Deja solo valores numéricos (texto, fechas, errores de Excel -> None)."""
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return valor
+    return None
+
+
+def _a_porcentaje(valores: np.ndarray) -> np.ndarray:
+    """
+    Convierte las fracciones del reporte a porcentaje (x100, 2 decimales).
+
+    np.round no redondea igual que round() en los empates exactos (p.ej.
+    0.005), así que esos pocos casos se resuelven con round() para que el
+    resultado sea idéntico al cálculo fila a fila.
+    """
+    porcentajes = valores * 100
+    redondeados = np.round(porcentajes, 2)
+    escalados = porcentajes * 100
+    empates = np.abs(escalados - np.floor(escalados) - 0.5) < 1e-6
+    if empates.any():
+        redondeados[empates] = [round(v, 2) for v in porcentajes[empates].tolist()]
+    return redondeados
+
+
+def _ancho_fila(fila: tuple) -> int:
+    """Cantidad de columnas hasta la última celda con contenido."""
+    ancho = len(fila)
+    while ancho and fila[ancho - 1] is None:
+        ancho -= 1
+    return ancho
+
+
+@contextmanager
+def _abrir_fuente(archivo: FuenteArchivo):
+    """Abre la fuente como archivo binario (openpyxl valida la extensión de las rutas)."""
+    if isinstance(archivo, (bytes, bytearray, memoryview)):
+        yield BytesIO(archivo)
+    elif isinstance(archivo, str):
+        with open(archivo, 'rb') as f:
+            yield f
+    else:
+        yield archivo
+
+
+def detectar_formato(fuente: BinaryIO) -> str:
+    """
+    'xlsx' o 'csv' según los primeros bytes del archivo (la posición de
+    lectura queda donde estaba). Los .xls y los binarios desconocidos se
+    rechazan con un mensaje que se informa por KPI.
+    """
+    posicion = fuente.tell()
+    inicio = fuente.read(1024)
+    fuente.seek(posicion)
+
+    if inicio.startswith(FIRMA_XLSX):
+        return 'xlsx'
+    if inicio.startswith(FIRMA_XLS):
+        raise ValueError("Formato .xls (Excel 97-2003) no soportado: exportar como .xlsx o .csv")
+    if b'\x00' in inicio and not inicio.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        raise ValueError("Formato de archivo no reconocido: se esperaba .xlsx o .csv")
+    return 'csv'
+
+
+def _detectar_encoding(muestra: bytes, cortada: bool) -> str:
+    """BOM si lo hay; si no, UTF-8 cuando decodifica y si no Windows-1252 (Excel en Windows)."""
+    if muestra.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if muestra.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        muestra.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # La muestra puede cortar un carácter de varios bytes justo al final
+        if not cortada or e.start < len(muestra) - 3:
+            return 'cp1252'
+    return 'utf-8'
+
+
+def _detectar_separador(lineas: list) -> str:
+    """
+    El separador que más columnas da en el encabezado (no trae números, así
+    que una coma decimal no confunde). Respeta la línea 'sep=;' de Excel.
+    """
+    encabezado = next((linea for linea in lineas if linea.strip()), '')
+    if encabezado.lower().startswith('sep=') and len(encabezado.strip()) == 5:
+        return encabezado.strip()[4]
+    columnas = {
+        separador: len(next(csv.reader([encabezado], delimiter=separador), []))
+        for separador in SEPARADORES_CSV
+    }
+    mejor = max(SEPARADORES_CSV, key=lambda separador: columnas[separador])
+    return mejor if columnas[mejor] > 1 else ','
+
+
+def _detectar_coma_decimal(lineas: list, separador: str) -> bool:
+    """Coma decimal si en la muestra hay más valores tipo '0,9312' que tipo '0.9312'."""
+    comas = puntos = 0
+    for fila in csv.reader(lineas, delimiter=separador):
+        for celda in fila[1:]:
+            celda = celda.strip()
+            if _DECIMAL_COMA.fullmatch(celda):
+                comas += 1
+            elif _DECIMAL_PUNTO.fullmatch(celda):
+                puntos += 1
+    return comas > puntos
+
+
+def _lineas_texto(fuente: BinaryIO, encoding: str) -> Iterator[str]:
+    """Decodifica el archivo por bloques y entrega líneas con su salto (lo que espera csv.reader)."""
+    decodificador = codecs.getincrementaldecoder(encoding)(errors='replace')
+    pendiente = ''
+    while True:
+        bloque = fuente.read(BLOQUE_CSV)
+        texto = pendiente + decodificador.decode(bloque, final=not bloque)
+        if not bloque:
+            if texto:
+                yield texto
+            return
+        lineas = texto.splitlines(keepends=True)
+        # La última línea puede estar incompleta: se completa con el bloque siguiente
+        pendiente = lineas.pop() if lineas and not lineas[-1].endswith(('\n', '\r')) else ''
+        yield from lineas
+
+
+def _convertidor_csv(coma_decimal: bool) -> Callable[[Optional[str]], Optional[float]]:
+    """
+    Convierte una celda de texto al número que habría dejado Excel: '0,9312'
+    o '0.9312' -> 0.9312, '93,12%' -> 0.9312. Lo que no es número (p.ej. '-')
+    queda como None, igual que el texto en el camino xlsx.
+    """
+    def convertir(celda: Optional[str]) -> Optional[float]:
+        if celda is None:
+            return None
+        texto = celda.strip()
+        porcentaje = texto.endswith('%')
+        if porcentaje:
+            texto = texto[:-1].rstrip()
+        if coma_decimal:
+            texto = texto.replace('.', '').replace(',', '.')
+        else:
+            texto = texto.replace(',', '')
+        if not _NUMERO.fullmatch(texto):
+            return None
+        valor = float(texto)
+        return valor / 100 if porcentaje else valor
+    return convertir
+
+
+def _filas_csv(fuente: BinaryIO) -> Tuple[Iterator[tuple], Callable]:
+    """
+    Filas del .csv (celdas vacías como None, el resto como texto) y la
+    función que convierte las celdas de valor según la coma decimal detectada.
+    """
+    posicion = fuente.tell()
+    muestra = fuente.read(MUESTRA_CSV)
+    fuente.seek(posicion)
+
+    encoding = _detectar_encoding(muestra, cortada=len(muestra) == MUESTRA_CSV)
+    decodificador = codecs.getincrementaldecoder(encoding)(errors='replace')
+    lineas_muestra = decodificador.decode(muestra).splitlines(keepends=True)
+    if len(muestra) == MUESTRA_CSV and lineas_muestra:
+        # La última línea de la muestra puede estar cortada
+        lineas_muestra.pop()
+    separador = _detectar_separador(lineas_muestra)
+    coma_decimal = _detectar_coma_decimal(lineas_muestra, separador)
+
+    lineas = _lineas_texto(fuente, encoding)
+    primera = next(lineas, '')
+    if not (primera.lower().startswith('sep=') and len(primera.strip()) == 5):
+        lineas = chain([primera], lineas)
+
+    filas = (
+        tuple(celda if celda != '' else None for celda in fila)
+        for fila in csv.reader(lineas, delimiter=separador)
+    )
+    return filas, _convertidor_csv(coma_decimal)
+
+
+def _columnas_kpi(filas: Iterable[tuple], kpi_nombre: str, convertir: Callable) -> Tuple[list, list]:
+    """
+    Reglas del reporte, iguales para xlsx y csv: encabezado más una fila que
+    lo repite, ejecutivo en la primera columna, valor en la segunda (o en la
+    última con contenido para Tipificaciones) y corte en el pie.
+    """
+    filas = iter(filas)
+
+    # La primera fila es el encabezado y la segunda repite el nombre de la columna.
+    # Se saltan por posición, antes de descartar filas vacías (igual que read_excel +
+    # iloc[1:]): si la segunda fila viene vacía no se lleva al primer ejecutivo.
+    encabezado = next(filas, None)
+    if encabezado is None:
+        return [], []
+    next(filas, None)
+    filas = (fila for fila in filas if not _es_fila_vacia(fila))
+
+    ejecutivos = []
+    valores = []
+    if kpi_nombre == 'Tipificaciones':
+        # Para Tipificaciones, la columna correcta es la última (Total.1 que contiene %Tipif).
+        # El ancho real solo se conoce al terminar, así que se guarda cada fila.
+        ancho = _ancho_fila(encabezado)
+        pendientes = []
+        for fila in filas:
+            if _es_pie(fila[0]):
+                break
+            ancho = max(ancho, _ancho_fila(fila))
+            pendientes.append(fila)
+        for fila in pendientes:
+            ejecutivos.append(fila[0])
+            valores.append(convertir(fila[ancho - 1]) if 0 < ancho <= len(fila) else None)
+    else:
+        for fila in filas:
+            if _es_pie(fila[0]):
+                break
+            ejecutivos.append(fila[0])
+            valores.append(convertir(fila[1]) if len(fila) > 1 else None)
+
+    return ejecutivos, valores
+
+
+def leer_columnas_kpi(archivo: FuenteArchivo, kpi_nombre: str) -> Tuple[list, list]:
+    """
+    Lee la columna del ejecutivo y la del KPI hasta el pie del reporte
+    ('Total' / 'Filtros aplicados'), sin construir la hoja completa.
+    """
+    with _abrir_fuente(archivo) as fuente:
+        if detectar_formato(fuente) == 'csv':
+            filas, convertir = _filas_csv(fuente)
+            return _columnas_kpi(filas, kpi_nombre, convertir)
+
+        wb = load_workbook(fuente, read_only=True, data_only=True)
+        try:
+            ws = wb.worksheets[0]
+            # Algunos exportadores escriben dimensiones incorrectas (p.ej. "A1")
+            ws.reset_dimensions()
+            return _columnas_kpi(ws.iter_rows(values_only=True), kpi_nombre, _valor_numerico)
+        finally:
+            wb.close()
+
+
+def extraer_kpi(archivo: FuenteArchivo, kpi_nombre: str) -> pd.Series:
+    """
+    Extrae los valores de un KPI como serie indexada por ejecutivo.
+    Los valores faltantes quedan como NaN. Si el archivo no se puede leer
+    la excepción se propaga, para poder informarla por KPI.
+    """
+    ejecutivos, valores = leer_columnas_kpi(archivo, kpi_nombre)
+
+    serie = pd.Series(
+        np.array(valores, dtype=float),
+        index=pd.Index(ejecutivos, dtype=object, name='ejecutivo'),
+        name=kpi_nombre,
+    )
+
+    # Filtrar filas sin ejecutivo
+    validos = serie.index.notna() & (serie.index != '')
+    serie = serie[validos]
+    # Si un ejecutivo aparece dos veces, manda la última fila (igual que un dict)
+    serie = serie[~serie.index.duplicated(keep='last')]
+
+    serie[:] = _a_porcentaje(serie.to_numpy())
+    # Para las métricas: filas descartadas = leídas - las que quedan en la serie
+    serie.attrs['filas_leidas'] = len(ejecutivos)
+    return serie
+
+
+def calentar_worker() -> int:
+    """Tarea vacía del precalentamiento: para recibirla el worker ya importó este módulo."""
+    return os.getpid()
+
+
+def tamano_serie(serie: pd.Series) -> int:
+    """Bytes aproximados que ocupa una serie (incluye los nombres de ejecutivos)."""
+    return int(serie.memory_usage(index=True, deep=True))
+
+
+def _a_registros(df: pd.DataFrame) -> list:
+    """DataFrame indexado por ejecutivo -> lista de dicts con None en lugar de NaN."""
+    df = df.astype(object).where(df.notna(), None)
+    return df.reset_index().to_dict('records')
+
+
+def procesar_archivo_kpi(archivo_bytes: bytes, kpi_nombre: str) -> Dict[str, float]:
+    """
+    Procesa un archivo KPI y extrae los valores por ejecutivo.
+    """
+    try:
+        serie = extraer_kpi(archivo_bytes, kpi_nombre)
+    except Exception as e:
+        print(f"Error procesando {kpi_nombre}: {e}")
+        return {}
+    return {r['ejecutivo']: r[kpi_nombre] for r in _a_registros(serie.to_frame())}
+
+
+def unificar_datos_kpi(archivos_data: Dict[str, bytes], kpis_omitidos: list) -> list:
+    """
+    Unifica los datos de todos los archivos KPI.
+    """
+    # Procesar cada archivo (solo los que no están omitidos)
+    series = []
+    for kpi_nombre, archivo_bytes in archivos_data.items():
+        if kpi_nombre in kpis_omitidos:
+            continue
+        try:
+            series.append(extraer_kpi(archivo_bytes, kpi_nombre))
+        except Exception as e:
+            print(f"Error procesando {kpi_nombre}: {e}")
+    return unir_series_kpi(series)
+
+
+def unir_series_kpi(series: list) -> list:
+    """
+    Une las series de cada KPI (outer join por ejecutivo) y arma los
+    registros ordenados por ejecutivo. Los KPIs sin archivo u omitidos
+    quedan en None.
+    """
+    series = [s for s in series if len(s)]
+    if not series:
+        return []
+
+    df = pd.concat(series, axis=1, join='outer').sort_index()
+    df = df.reindex(columns=KPIS)
+    df.columns = [kpi.lower() for kpi in KPIS]
+    df.index.name = 'ejecutivo'
+    return _a_registros(df)
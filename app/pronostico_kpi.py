@@ -0,0 +1,142 @@
+"""
+Pronóstico del próximo mes para todos los ejecutivos y KPIs a la vez.
+
+Misma regla que proyectarSiguiente/riesgoFuturo en script.js: la pendiente
+promedio de la serie ((último - primero) / (n - 1)) se suma al último valor
+y se redondea; el KPI queda en 'riesgo' si la proyección no cumple la meta.
+Acá se calcula sobre un cubo series x meses x KPIs con numpy, en lugar de
+una serie a la vez. Un KPI sin datos queda 'sin_datos' (script.js lo
+proyectaría como 0).
+"""
+from typing import Dict, List
+
+import numpy as np
+
+from historial_kpi import CLAVES_DETALLE
+from normas_kpi import NORMAS_KPI
+
+COLUMNAS = list(NORMAS_KPI)
+
+_META = np.array([NORMAS_KPI[col]['meta'] for col in COLUMNAS], dtype=float)
+_MENOR = np.array([NORMAS_KPI[col]['tipo'] == 'menor' for col in COLUMNAS])
+
+
+def proyectar_cubo(cubo: np.ndarray):
+    """
+    cubo: (series, meses, KPIs) con NaN donde no hay dato. Los meses sin dato
+    se saltan, como en las series compactas del historial.
+    Devuelve (proyeccion, pendiente, riesgo, n), cada uno (series, KPIs).
+    """
+    presente = ~np.isnan(cubo)
+    n = presente.sum(axis=1)
+    meses = cubo.shape[1]
+    if meses == 0:
+        vacio = np.zeros((cubo.shape[0], cubo.shape[2]))
+        return vacio, vacio, vacio.astype(bool), n
+
+    indice_primero = np.argmax(presente, axis=1)
+    indice_ultimo = meses - 1 - np.argmax(presente[:, ::-1, :], axis=1)
+    primero = np.take_along_axis(cubo, indice_primero[:, None, :], axis=1)[:, 0, :]
+    ultimo = np.take_along_axis(cubo, indice_ultimo[:, None, :], axis=1)[:, 0, :]
+
+    with np.errstate(invalid='ignore'):
+        pendiente = np.where(n >= 2, (ultimo - primero) / np.maximum(n - 1, 1), 0.0)
+        # Math.round de JS: los .5 hacia arriba
+        proyeccion = np.floor(np.where(n > 0, ultimo + pendiente, 0.0) + 0.5)
+    riesgo = (n > 0) & np.where(_MENOR, proyeccion > _META, proyeccion < _META)
+    return proyeccion, np.where(n > 0, pendiente, 0.0), riesgo, n
+
+
+def _kpis_pronostico(proyeccion, pendiente, riesgo, n, i) -> Dict[str, dict]:
+    resultado = {}
+    for j, col in enumerate(COLUMNAS):
+        if n[i, j] == 0:
+            estado = 'sin_datos'
+        else:
+            estado = 'riesgo' if riesgo[i, j] else 'ok'
+        resultado[CLAVES_DETALLE[col]] = {
+            "valor": float(proyeccion[i, j]) if n[i, j] else None,
+            "estado": estado,
+            "tendencia": round(float(pendiente[i, j]), 4),
+            "meta": NORMAS_KPI[col]['meta'],
+            "meses": int(n[i, j]),
+        }
+    return resultado
+
+
+def pronosticar(historial: List[dict], resumen: List[dict]) -> dict:
+    """
+    historial: cargas vigentes en orden cronológico (historial_vigente).
+    resumen: resumen mensual por KPI (resumen_mensual), para el equipo.
+    """
+    meses = []
+    indice_mes = {}
+    for fila in historial:
+        periodo = (fila['anio'], fila['mes'])
+        if periodo not in indice_mes:
+            indice_mes[periodo] = len(meses)
+            meses.append({"mes": fila['mes'], "anio": fila['anio']})
+    ejecutivos = sorted({fila['ejecutivo'] for fila in historial})
+    indice_ejecutivo = {nombre: i for i, nombre in enumerate(ejecutivos)}
+
+    cubo = np.full((len(ejecutivos), len(meses), len(COLUMNAS)), np.nan)
+    for fila in historial:
+        i = indice_ejecutivo[fila['ejecutivo']]
+        t = indice_mes[(fila['anio'], fila['mes'])]
+        for j, col in enumerate(COLUMNAS):
+            if fila[col] is not None:
+                cubo[i, t, j] = fila[col]
+
+    # Equipo: la serie de promedios mensuales (lo que ve el modal predictivo)
+    periodos_equipo = []
+    indice_equipo = {}
+    for fila in resumen:
+        periodo = (fila['anio'], fila['mes'])
+        if periodo not in indice_equipo:
+            indice_equipo[periodo] = len(periodos_equipo)
+            periodos_equipo.append(periodo)
+    cubo_equipo = np.full((1, len(periodos_equipo), len(COLUMNAS)), np.nan)
+    for fila in resumen:
+        if fila['kpi'] in NORMAS_KPI:
+            cubo_equipo[0, indice_equipo[(fila['anio'], fila['mes'])], COLUMNAS.index(fila['kpi'])] = round(fila['promedio'], 2)
+
+    return pronosticar_cubo(ejecutivos, meses, cubo, cubo_equipo)
+
+
+def pronosticar_columnar(historia) -> dict:
+    """Mismo resultado que pronosticar, desde los snapshots columnares (HistoriaColumnar)."""
+    ejecutivos, cubo = historia.cubo()
+    meses = [{"mes": mes, "anio": anio} for anio, mes in historia.meses]
+    # Promedio del equipo por mes, redondeado como en el historial
+    with np.errstate(invalid='ignore'):
+        presentes = (~np.isnan(cubo)).sum(axis=0)
+        sumas = np.nansum(cubo, axis=0)
+        promedio = np.where(presentes > 0, sumas / np.maximum(presentes, 1), np.nan)
+    cubo_equipo = np.round(promedio, 2)[None, :, :]
+    return pronosticar_cubo(ejecutivos, meses, cubo, cubo_equipo)
+
+
+def pronosticar_cubo(ejecutivos: List[str], meses: List[dict], cubo: np.ndarray, cubo_equipo: np.ndarray) -> dict:
+    equipo = _kpis_pronostico(*proyectar_cubo(cubo_equipo), 0)
+
+    proyeccion, pendiente, riesgo, n = proyectar_cubo(cubo)
+    por_ejecutivo = []
+    for i, nombre in enumerate(ejecutivos):
+        kpis = _kpis_pronostico(proyeccion, pendiente, riesgo, n, i)
+        por_ejecutivo.append({
+            "name": nombre,
+            "kpis": kpis,
+            "riesgos": [clave for clave, datos in kpis.items() if datos['estado'] == 'riesgo'],
+        })
+
+    en_riesgo = riesgo.sum(axis=0)
+    return {
+        "meses": meses,
+        "equipo": equipo,
+        "ejecutivos": por_ejecutivo,
+        "resumen": {
+            "ejecutivos": len(ejecutivos),
+            "en_riesgo": {CLAVES_DETALLE[col]: int(en_riesgo[j]) for j, col in enumerate(COLUMNAS)},
+            "con_algun_riesgo": int(riesgo.any(axis=1).sum()) if len(ejecutivos) else 0,
+        },
+    }
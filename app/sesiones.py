@@ -0,0 +1,303 @@
+"""
+Almacén de sesiones de vista previa (/upload -> /preview -> /confirm).
+
+Cada sesión guarda los registros unificados hasta que se confirman. Las
+sesiones vencen por edad y el almacén está acotado por cantidad y por
+memoria aproximada, para que las vistas previas abandonadas no se acumulen.
+
+Backends:
+- AlmacenSesionesMemoria: en memoria del proceso (un solo worker).
+- AlmacenSesionesSQLite: archivo SQLite en modo WAL, compartido por todos
+  los workers de la máquina. Otro backend (p.ej. Redis) solo necesita
+  implementar la interfaz AlmacenSesiones.
+"""
+import json
+import secrets
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from cache_lru import CacheLRU
+
+
+def nuevo_session_id() -> str:
+    """ID aleatorio y no adivinable (la vista previa se abre solo con el ID)."""
+    return secrets.token_urlsafe(16)
+
+
+def resumen_sesion(data: dict) -> dict:
+    """Todo menos los registros, más la cantidad: lo que necesita el inicio de la vista previa."""
+    resumen = {clave: valor for clave, valor in data.items() if clave != 'registros'}
+    resumen['total'] = len(data.get('registros', []))
+    return resumen
+
+
+def tamano_sesion(data: dict) -> int:
+    """Bytes aproximados de una sesión (dominados por la lista de registros)."""
+    registros = data.get('registros', [])
+    tamano = sys.getsizeof(data) + sys.getsizeof(registros)
+    for registro in registros:
+        tamano += sys.getsizeof(registro)
+        for valor in registro.values():
+            tamano += sys.getsizeof(valor)
+    return tamano
+
+
+class AlmacenSesiones:
+    """
+    Interfaz de los backends de sesiones.
+
+    `reclamar` toma la sesión en forma atómica para confirmarla: solo una
+    llamada (de cualquier worker) la obtiene hasta que se `libere` (si el
+    envío falla) o se `elimine` (si se confirmó). Un reclamo más antiguo que
+    `ttl_reclamo` se considera abandonado (worker caído) y puede retomarse.
+    """
+
+    def crear(self, data: dict) -> str:
+        raise NotImplementedError
+
+    def obtener(self, session_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def resumen(self, session_id: str) -> Optional[dict]:
+        """La sesión sin los registros (ver resumen_sesion), sin leerlos ni decodificarlos."""
+        raise NotImplementedError
+
+    def reclamar(self, session_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def liberar(self, session_id: str):
+        raise NotImplementedError
+
+    def eliminar(self, session_id: str):
+        raise NotImplementedError
+
+    def limpiar_expiradas(self) -> int:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+class AlmacenSesionesMemoria(AlmacenSesiones):
+    """Sesiones en memoria del proceso, con TTL y límite LRU por cantidad y bytes."""
+
+    def __init__(self, ttl: float, max_sesiones: int, max_bytes: int, ttl_reclamo: float = 300):
+        self._cache = CacheLRU(max_entradas=max_sesiones, max_bytes=max_bytes, ttl=ttl, medir=tamano_sesion)
+        self.ttl_reclamo = ttl_reclamo
+        self._reclamos: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def crear(self, data: dict) -> str:
+        session_id = nuevo_session_id()
+        self._cache.put(session_id, data)
+        if session_id not in self._cache:
+            raise ValueError("La carga es demasiado grande para guardar la vista previa")
+        return session_id
+
+    def obtener(self, session_id: str) -> Optional[dict]:
+        return self._cache.get(session_id)
+
+    def resumen(self, session_id: str) -> Optional[dict]:
+        data = self._cache.get(session_id)
+        return resumen_sesion(data) if data is not None else None
+
+    def reclamar(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            data = self._cache.get(session_id)
+            if data is None:
+                return None
+            reclamada = self._reclamos.get(session_id)
+            if reclamada is not None and time.time() - reclamada < self.ttl_reclamo:
+                return None
+            self._reclamos[session_id] = time.time()
+            return data
+
+    def liberar(self, session_id: str):
+        with self._lock:
+            self._reclamos.pop(session_id, None)
+
+    def eliminar(self, session_id: str):
+        with self._lock:
+            self._reclamos.pop(session_id, None)
+            self._cache.pop(session_id)
+
+    def limpiar_expiradas(self) -> int:
+        eliminadas = self._cache.limpiar_expiradas()
+        with self._lock:
+            for session_id in [s for s in self._reclamos if s not in self._cache]:
+                del self._reclamos[session_id]
+        return eliminadas
+
+    def stats(self) -> dict:
+        datos = self._cache.stats()
+        return {
+            "backend": "memoria",
+            "sesiones": datos["entradas"],
+            "bytes": datos["bytes"],
+            "max_sesiones": datos["max_entradas"],
+            "max_bytes": datos["max_bytes"],
+            "ttl": datos["ttl"],
+            "expiradas": datos["expiradas"],
+            "descartadas": datos["evictions"],
+        }
+
+
+class AlmacenSesionesSQLite(AlmacenSesiones):
+    """
+    Sesiones en un archivo SQLite (WAL) compartido entre procesos.
+    Los registros se guardan como JSON y, aparte, el resumen (fecha, KPIs
+    omitidos, total), para leerlo sin decodificar todos los registros. El
+    orden LRU usa la fecha del último acceso.
+    """
+
+    def __init__(self, ruta: str, ttl: float, max_sesiones: int, max_bytes: int, ttl_reclamo: float = 300):
+        self.ruta = ruta
+        self.ttl = ttl
+        self.max_sesiones = max_sesiones
+        self.max_bytes = max_bytes
+        self.ttl_reclamo = ttl_reclamo
+        self.expiradas = 0
+        self.descartadas = 0
+        with self._conexion() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sesiones (
+                    session_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    creada REAL NOT NULL,
+                    accedida REAL NOT NULL,
+                    reclamada REAL,
+                    resumen TEXT
+                )
+            """)
+            columnas = {fila[1] for fila in conn.execute("PRAGMA table_info(sesiones)")}
+            if 'resumen' not in columnas:
+                # Archivo creado por una versión anterior
+                conn.execute("ALTER TABLE sesiones ADD COLUMN resumen TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sesiones_accedida ON sesiones (accedida)")
+
+    @contextmanager
+    def _conexion(self):
+        # Una conexión por operación: es barato en SQLite y evita compartirla entre threads
+        conn = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def _vigente_desde(self) -> float:
+        return time.time() - self.ttl
+
+    def crear(self, data: dict) -> str:
+        session_id = nuevo_session_id()
+        contenido = json.dumps(data, ensure_ascii=False)
+        # El límite es en bytes: con tildes o ñ el texto UTF-8 ocupa más que len(str)
+        tamano = len(contenido.encode('utf-8'))
+        if tamano > self.max_bytes:
+            raise ValueError("La carga es demasiado grande para guardar la vista previa")
+
+        ahora = time.time()
+        with self._conexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO sesiones (session_id, data, bytes, creada, accedida, resumen) VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, contenido, tamano, ahora, ahora, json.dumps(resumen_sesion(data)))
+            )
+            # Descartar las menos usadas si se pasa del límite de cantidad o de bytes. Las que
+            # se están confirmando (reclamo vigente) cuentan para el límite pero no se descartan
+            cursor = conn.execute("""
+                DELETE FROM sesiones WHERE session_id IN (
+                    SELECT session_id FROM (
+                        SELECT session_id, reclamada,
+                               ROW_NUMBER() OVER (ORDER BY reclamada >= ? DESC, accedida DESC) AS posicion,
+                               SUM(bytes) OVER (ORDER BY reclamada >= ? DESC, accedida DESC) AS acumulado
+                        FROM sesiones
+                    ) WHERE (posicion > ? OR acumulado > ?) AND (reclamada IS NULL OR reclamada < ?)
+                      AND session_id != ?
+                )
+            """, (ahora - self.ttl_reclamo, ahora - self.ttl_reclamo, self.max_sesiones, self.max_bytes,
+                  ahora - self.ttl_reclamo, session_id))
+            self.descartadas += cursor.rowcount
+            conn.execute("COMMIT")
+        return session_id
+
+    def obtener(self, session_id: str) -> Optional[dict]:
+        with self._conexion() as conn:
+            fila = conn.execute(
+                "UPDATE sesiones SET accedida = ? WHERE session_id = ? AND creada >= ? RETURNING data",
+                (time.time(), session_id, self._vigente_desde())
+            ).fetchone()
+        return json.loads(fila[0]) if fila else None
+
+    def resumen(self, session_id: str) -> Optional[dict]:
+        with self._conexion() as conn:
+            fila = conn.execute(
+                "UPDATE sesiones SET accedida = ? WHERE session_id = ? AND creada >= ? RETURNING resumen",
+                (time.time(), session_id, self._vigente_desde())
+            ).fetchone()
+        if fila is None:
+            return None
+        if fila[0] is None:
+            # Sesión guardada antes de que existiera la columna
+            data = self.obtener(session_id)
+            return resumen_sesion(data) if data is not None else None
+        return json.loads(fila[0])
+
+    def reclamar(self, session_id: str) -> Optional[dict]:
+        ahora = time.time()
+        with self._conexion() as conn:
+            # Un solo UPDATE condicional: solo un worker puede ganar el reclamo
+            fila = conn.execute("""
+                UPDATE sesiones SET reclamada = ?, accedida = ?
+                WHERE session_id = ? AND creada >= ? AND (reclamada IS NULL OR reclamada < ?)
+                RETURNING data
+            """, (ahora, ahora, session_id, self._vigente_desde(), ahora - self.ttl_reclamo)).fetchone()
+        return json.loads(fila[0]) if fila else None
+
+    def liberar(self, session_id: str):
+        with self._conexion() as conn:
+            conn.execute("UPDATE sesiones SET reclamada = NULL WHERE session_id = ?", (session_id,))
+
+    def eliminar(self, session_id: str):
+        with self._conexion() as conn:
+            conn.execute("DELETE FROM sesiones WHERE session_id = ?", (session_id,))
+
+    def limpiar_expiradas(self) -> int:
+        with self._conexion() as conn:
+            cursor = conn.execute("DELETE FROM sesiones WHERE creada < ?", (self._vigente_desde(),))
+        self.expiradas += cursor.rowcount
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        with self._conexion() as conn:
+            sesiones, total_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM sesiones WHERE creada >= ?",
+                (self._vigente_desde(),)
+            ).fetchone()
+        return {
+            "backend": "sqlite",
+            "sesiones": sesiones,
+            "bytes": total_bytes,
+            "max_sesiones": self.max_sesiones,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "expiradas": self.expiradas,
+            "descartadas": self.descartadas,
+        }
+
+
+def crear_almacen_sesiones(backend: str, ttl: float, max_sesiones: int, max_bytes: int,
+                           ruta_sqlite: Optional[str] = None) -> AlmacenSesiones:
+    """Crea el almacén según KPI_SESSION_BACKEND ('memoria' o 'sqlite')."""
+    if backend == 'sqlite':
+        return AlmacenSesionesSQLite(ruta_sqlite, ttl=ttl, max_sesiones=max_sesiones, max_bytes=max_bytes)
+    if backend == 'memoria':
+        return AlmacenSesionesMemoria(ttl=ttl, max_sesiones=max_sesiones, max_bytes=max_bytes)
+    raise ValueError(f"Backend de sesiones desconocido: {backend}")
@@ -0,0 +1,221 @@
+"""
+Snapshots columnares del historial, en disco y abiertos con memory-mapping.
+
+Por cada mes confirmado se escribe un directorio con un arreglo .npy por KPI
+(float64, NaN = sin dato) y un arreglo int32 con el código de cada
+ejecutivo. Los nombres se internan en un diccionario global (ejecutivos.npy,
+texto de ancho fijo) cuyos códigos no cambian: solo se agregan nombres.
+Todo se abre con np.load(mmap_mode='r'), sin parseo, y las páginas las
+comparte el sistema operativo entre los workers.
+
+Un manifiesto JSON dice qué versión de cada mes y del diccionario está
+vigente; se reemplaza en forma atómica (os.replace) después de escribir los
+archivos nuevos, así un lector nunca ve un mes a medio escribir. Solo se
+reescribe el mes que cambió. Los escritores se coordinan con un lock de
+archivo (fcntl).
+"""
+import fcntl
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from normas_kpi import NORMAS_KPI
+
+COLUMNAS = list(NORMAS_KPI)
+
+
+class HistoriaColumnar:
+    """Vista de solo lectura de los snapshots: meses en orden cronológico."""
+
+    def __init__(self, meses: List[Tuple[int, str]], columnas: Dict[Tuple[int, str], Dict[str, np.ndarray]],
+                 nombres: np.ndarray):
+        self.meses = meses
+        self.columnas = columnas
+        self.nombres = nombres
+
+    def registros(self, anio: int, mes: str) -> list:
+        """Registros de un mes con el formato de unificar_datos_kpi."""
+        datos = self.columnas.get((anio, mes))
+        if datos is None:
+            return []
+        nombres = self.nombres[datos['ejecutivo']]
+        valores = {col: datos[col] for col in COLUMNAS}
+        return [
+            {
+                "ejecutivo": str(nombre),
+                **{col: (None if np.isnan(valores[col][i]) else float(valores[col][i])) for col in COLUMNAS}
+            }
+            for i, nombre in enumerate(nombres)
+        ]
+
+    def cubo(self) -> Tuple[List[str], np.ndarray]:
+        """
+        (nombres, cubo ejecutivos x meses x KPIs) con NaN donde no hay dato.
+        Solo incluye a los ejecutivos que aparecen en algún mes, ordenados por nombre.
+        """
+        codigos = [self.columnas[periodo]['ejecutivo'] for periodo in self.meses]
+        presentes = np.unique(np.concatenate(codigos)) if codigos else np.zeros(0, dtype=np.int32)
+        presentes = presentes[np.argsort(self.nombres[presentes], kind='stable')]
+        fila = np.full(len(self.nombres), -1, dtype=np.int64)
+        fila[presentes] = np.arange(len(presentes))
+
+        cubo = np.full((len(presentes), len(self.meses), len(COLUMNAS)), np.nan)
+        for t, periodo in enumerate(self.meses):
+            datos = self.columnas[periodo]
+            filas = fila[datos['ejecutivo']]
+            for j, col in enumerate(COLUMNAS):
+                cubo[filas, t, j] = datos[col]
+        return [str(nombre) for nombre in self.nombres[presentes]], cubo
+
+
+class SnapshotsKPI:
+
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self._ruta_manifiesto = os.path.join(directorio, 'manifiesto.json')
+        self._lock = threading.Lock()
+        self._lock_escritor = threading.Lock()
+        # Historia cargada en este proceso y la versión del manifiesto que le corresponde
+        self._cargada: Optional[HistoriaColumnar] = None
+        self._version_cargada = None
+
+    @contextmanager
+    def _lock_escritura(self):
+        with self._lock_escritor, open(os.path.join(self.directorio, 'snapshots.lock'), 'w') as archivo_lock:
+            fcntl.flock(archivo_lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(archivo_lock, fcntl.LOCK_UN)
+
+    def _leer_manifiesto(self) -> dict:
+        try:
+            with open(self._ruta_manifiesto, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"ejecutivos": None, "meses": {}}
+
+    def _escribir_manifiesto(self, manifiesto: dict):
+        temporal = f"{self._ruta_manifiesto}.{uuid.uuid4().hex}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(manifiesto, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self._ruta_manifiesto)
+
+    def _guardar(self, nombre: str, arreglo: np.ndarray):
+        ruta = os.path.join(self.directorio, nombre)
+        with open(ruta, 'wb') as f:
+            np.save(f, arreglo)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _borrar(self, nombre: Optional[str]):
+        # Un lector que ya tiene el archivo mapeado lo sigue viendo hasta cerrarlo
+        if not nombre:
+            return
+        ruta = os.path.join(self.directorio, nombre)
+        if os.path.isdir(ruta):
+            shutil.rmtree(ruta, ignore_errors=True)
+        elif os.path.exists(ruta):
+            os.remove(ruta)
+
+    def versiones(self) -> Dict[str, str]:
+        """Mes ('2026-01') -> sello guardado al construirlo (para saber si está al día)."""
+        return {clave: datos['sello'] for clave, datos in self._leer_manifiesto()['meses'].items()}
+
+    @staticmethod
+    def clave_mes(anio: int, mes_num: int) -> str:
+        return f"{anio}-{mes_num:02d}"
+
+    def reconstruir_mes(self, anio: int, mes: str, mes_num: int, registros: List[dict], sello: str = ''):
+        """Escribe el snapshot de un mes (registros como unificar_datos_kpi) y lo publica."""
+        with self._lock_escritura():
+            manifiesto = self._leer_manifiesto()
+
+            nombres_actuales = []
+            if manifiesto['ejecutivos']:
+                nombres_actuales = np.load(os.path.join(self.directorio, manifiesto['ejecutivos'])).tolist()
+            indice = {nombre: i for i, nombre in enumerate(nombres_actuales)}
+            nuevos = [r['ejecutivo'] for r in registros if r['ejecutivo'] not in indice]
+            for nombre in nuevos:
+                indice.setdefault(nombre, len(indice))
+
+            version = uuid.uuid4().hex[:12]
+            anterior_diccionario = None
+            if len(indice) != len(nombres_actuales):
+                nombres = sorted(indice, key=indice.get)
+                archivo_nombres = f"ejecutivos.{version}.npy"
+                self._guardar(archivo_nombres, np.array(nombres, dtype=str))
+                anterior_diccionario = manifiesto['ejecutivos']
+                manifiesto['ejecutivos'] = archivo_nombres
+
+            clave = self.clave_mes(anio, mes_num)
+            directorio_mes = f"{clave}.{version}"
+            os.makedirs(os.path.join(self.directorio, directorio_mes))
+            self._guardar(
+                os.path.join(directorio_mes, 'ejecutivo.npy'),
+                np.array([indice[r['ejecutivo']] for r in registros], dtype=np.int32)
+            )
+            for col in COLUMNAS:
+                self._guardar(
+                    os.path.join(directorio_mes, f"{col}.npy"),
+                    np.array([np.nan if r.get(col) is None else r[col] for r in registros], dtype=np.float64)
+                )
+
+            anterior_mes = manifiesto['meses'].get(clave, {}).get('directorio')
+            manifiesto['meses'][clave] = {"anio": anio, "mes": mes, "directorio": directorio_mes, "sello": sello}
+            self._escribir_manifiesto(manifiesto)
+            self._borrar(anterior_mes)
+            self._borrar(anterior_diccionario)
+
+    def cargar(self) -> HistoriaColumnar:
+        """
+        Abre todos los meses con memory-mapping. Mientras el manifiesto no
+        cambie se reutiliza lo ya abierto en este proceso.
+        """
+        try:
+            estado = os.stat(self._ruta_manifiesto)
+            version = (estado.st_mtime_ns, estado.st_size, estado.st_ino)
+        except FileNotFoundError:
+            version = None
+        with self._lock:
+            if self._cargada is not None and version == self._version_cargada:
+                return self._cargada
+
+            # Si un escritor publica justo ahora, los archivos del manifiesto leído
+            # pueden haberse reemplazado: se vuelve a leer el manifiesto
+            for intento in range(3):
+                try:
+                    self._cargada = self._abrir(self._leer_manifiesto())
+                    break
+                except FileNotFoundError:
+                    if intento == 2:
+                        raise
+            self._version_cargada = version
+            return self._cargada
+
+    def _abrir(self, manifiesto: dict) -> HistoriaColumnar:
+        if manifiesto['ejecutivos']:
+            nombres = np.load(os.path.join(self.directorio, manifiesto['ejecutivos']), mmap_mode='r')
+        else:
+            nombres = np.zeros(0, dtype=str)
+        meses = []
+        columnas = {}
+        for clave in sorted(manifiesto['meses']):
+            datos = manifiesto['meses'][clave]
+            periodo = (datos['anio'], datos['mes'])
+            ruta = os.path.join(self.directorio, datos['directorio'])
+            columnas[periodo] = {
+                nombre: np.load(os.path.join(ruta, f"{nombre}.npy"), mmap_mode='r')
+                for nombre in ['ejecutivo'] + COLUMNAS
+            }
+            meses.append(periodo)
+        return HistoriaColumnar(meses, columnas, nombres)
@@ -170,12 +170,21 @@ async function loadAvailableMonths() {
     // INTENTO 2: Extraer meses de /kpis (sin filtro = todos los datos)
     try {
         console.log('[meses] Extrayendo meses desde /kpis...');
-        const response = await window.apiFetch('/kpis');
+        // Todas las páginas, siguiendo next_cursor (como fetchSheet)
+        let rows = [];
+        let response;
+        let cursor = null;
+        do {
+            let url = '/kpis?campos=mes,anio';
+            if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+            response = await window.apiFetch(url);
+            if (!response.ok) break;
+            const json = await response.json();
+            if (Array.isArray(json.data)) rows = rows.concat(json.data);
+            cursor = json.next_cursor || null;
+        } while (cursor);
         
         if (response.ok) {
-            const json = await response.json();
-            const rows = Array.isArray(json.data) ? json.data : [];
-            
             if (rows.length > 0) {
                 // Extraer meses únicos y años
                 const mesesSet = new Map(); // mes -> anio más reciente
@@ -455,15 +464,63 @@ function predecir(historial) {
     return predicciones;
 }
 
-// Renderiza la lista predictiva en la UI usando IA.predecir(historial)
+// Pronóstico del equipo calculado en el servidor (/kpis/pronostico); null si no responde
+async function loadPronosticoEquipo() {
+    if (!isAuthenticated()) return null;
+    try {
+        const resp = await window.apiFetch(`/kpis/pronostico`, {cache: 'no-store'});
+        if (!resp.ok) return null;
+        const json = await resp.json();
+        return json && json.equipo ? json.equipo : null;
+    } catch (err) {
+        console.warn('[loadPronosticoEquipo] Error de red:', err.message || err);
+        return null;
+    }
+}
+
+// Predicciones {kpi: {valor, estado}} desde el pronóstico del servidor (sin los KPIs sin datos)
+function prediccionesServidor(equipo) {
+    const predicciones = {};
+    for (const kpi in equipo) {
+        const item = equipo[kpi];
+        if (!item || item.estado === 'sin_datos') continue;
+        predicciones[kpi] = { valor: item.valor, estado: item.estado };
+    }
+    return predicciones;
+}
+
+// Igual que priorizarRiesgo, con la tendencia que ya calculó el servidor
+function priorizarRiesgoServidor(equipo) {
+    let riesgoPrioritario = null;
+    let mayorScore = -Infinity;
+
+    for (const kpi in equipo) {
+        const item = equipo[kpi];
+        if (!item || item.estado !== 'riesgo') continue;
+        const impacto = impactoKPI[kpi] || 1;
+        const score = Math.abs(item.tendencia) * impacto;
+        if (score > mayorScore) {
+            mayorScore = score;
+            riesgoPrioritario = { kpi, proyeccion: item.valor, tendencia: item.tendencia, impacto };
+        }
+    }
+
+    return riesgoPrioritario;
+}
+
+// Renderiza la lista predictiva en la UI con /kpis/pronostico
+// (si la API no responde, se calcula acá con IA.predecir(historial))
 async function renderPredictivo() {
     const lista = document.getElementById('lista-predictivo');
     if (!lista) return;
     lista.innerHTML = "";
 
     try {
-        const hist = await loadHistorialFromDB();
-        const predicciones = (typeof IA !== 'undefined' && typeof IA.predecir === 'function') ? IA.predecir(hist) : predecir(hist);
+        const equipo = await loadPronosticoEquipo();
+        const hist = equipo ? null : await loadHistorialFromDB();
+        const predicciones = equipo
+            ? prediccionesServidor(equipo)
+            : ((typeof IA !== 'undefined' && typeof IA.predecir === 'function') ? IA.predecir(hist) : predecir(hist));
 
         for (const kpi in predicciones) {
             const item = predicciones[kpi];
@@ -479,7 +536,9 @@ async function renderPredictivo() {
 
             // Mostrar riesgo priorizado en la UI
             try {
-                const riesgo = (typeof IA !== 'undefined' && typeof IA.priorizarRiesgo === 'function') ? IA.priorizarRiesgo(hist) : (typeof priorizarRiesgo === 'function' ? priorizarRiesgo(hist) : null);
+                const riesgo = equipo
+                    ? priorizarRiesgoServidor(equipo)
+                    : ((typeof IA !== 'undefined' && typeof IA.priorizarRiesgo === 'function') ? IA.priorizarRiesgo(hist) : (typeof priorizarRiesgo === 'function' ? priorizarRiesgo(hist) : null));
 
                 const textoEl = document.getElementById('riesgo-texto');
                 const motivoEl = document.getElementById('riesgo-motivo');
@@ -1868,15 +1927,23 @@ async function fetchSheet(month, force = false) {
     // SIEMPRE consultar API - caché deshabilitado
     console.log(`[fetchSheet] Consultando API para: ${month}`);
 
-    // Fetch desde API FastAPI
-    const response = await window.apiFetch(`/kpis?meses=${encodeURIComponent(month)}`, { cache: 'no-cache' });
-    if (!response.ok) {
-        console.error(`[fetchSheet] API error para "${month}": ${response.status}`);
-        throw new Error(`La API no tiene datos para ${month}.`);
-    }
+    // Fetch desde API FastAPI (solo las columnas que se muestran, siguiendo next_cursor)
+    const campos = 'name,mes,tmo,transfEPA,tipificaciones,satEp,resEp,satSnl,resSnl';
+    let rows = [];
+    let cursor = null;
+    do {
+        let url = `/kpis?meses=${encodeURIComponent(month)}&campos=${campos}`;
+        if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+        const response = await window.apiFetch(url, { cache: 'no-cache' });
+        if (!response.ok) {
+            console.error(`[fetchSheet] API error para "${month}": ${response.status}`);
+            throw new Error(`La API no tiene datos para ${month}.`);
+        }
 
-    const json = await response.json();
-    const rows = Array.isArray(json.data) ? json.data : [];
+        const json = await response.json();
+        if (Array.isArray(json.data)) rows = rows.concat(json.data);
+        cursor = json.next_cursor || null;
+    } while (cursor);
 
     if (rows.length === 0) {
         console.log(`[fetchSheet] API devolvió data vacía para: ${month}`);
@@ -2477,9 +2544,34 @@ function getTmoColor(val) {
     return 'sem-red';
 }
 
+// Evita que una respuesta lenta de /kpis/ranking pise un podio más reciente
+let podiumRequestId = 0;
+
 function updatePodium(kpiKey) {
+    const requestId = ++podiumRequestId;
     const top3 = getTopPerformers(currentData, kpiKey);
     renderPodium(top3, kpiKey);
+
+    // Ranking general de un mes: el orden oficial (KPIs cumplidos, luego menos rojos) lo da la API
+    const sel = getSelectedMonths();
+    if (kpiKey !== 'todos' || sel.length !== 1 || top3.length < 3) return;
+    fetchRankingTop3(sel[0]).then(ranking => {
+        if (ranking && ranking.length >= 3 && requestId === podiumRequestId) renderPodium(ranking, kpiKey);
+    });
+}
+
+// Top 3 del mes desde /kpis/ranking; null si la API no responde
+async function fetchRankingTop3(month) {
+    if (!isAuthenticated()) return null;
+    try {
+        const resp = await window.apiFetch(`/kpis/ranking?mes=${encodeURIComponent(month)}&top=3`, { cache: 'no-cache' });
+        if (!resp.ok) return null;
+        const json = await resp.json();
+        return Array.isArray(json.ranking) ? json.ranking.slice(0, 3) : null;
+    } catch (err) {
+        console.warn('[fetchRankingTop3] Error de red:', err.message || err);
+        return null;
+    }
 }
 
 function getTopPerformers(data, kpiKey) {
@@ -0,0 +1,256 @@
+"""
+Cola de trabajos de confirmación en segundo plano.
+
+/confirm encola el envío y responde de inmediato; un grupo fijo de workers
+asyncio ejecuta los trabajos (eso también limita cuántas escrituras hacia
+n8n/BD corren a la vez). El estado de cada trabajo se consulta en /jobs/{id}
+y se conserva un tiempo acotado después de terminar.
+
+El trabajo corre en el worker que recibió /confirm, pero su estado (y qué
+trabajo corresponde a cada sesión) se guarda en un almacén, cuyas llamadas
+(bloqueantes con SQLite) corren en el executor por defecto:
+- AlmacenTrabajosMemoria: en memoria del proceso (un solo worker).
+- AlmacenTrabajosSQLite: tabla en el mismo archivo SQLite de las sesiones,
+  así /jobs/{id} responde igual en cualquier worker.
+"""
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Optional
+
+from cache_lru import CacheLRU
+
+EN_COLA = 'queued'
+EN_EJECUCION = 'running'
+EXITOSO = 'succeeded'
+FALLIDO = 'failed'
+# Aceptado y guardado para enviarse después (outbox): no es un éxito todavía
+PENDIENTE_ENVIO = 'pending_delivery'
+
+
+class AlmacenTrabajos:
+    """Interfaz de los backends del estado de los trabajos."""
+
+    def guardar(self, trabajo: dict):
+        raise NotImplementedError
+
+    def obtener(self, job_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def de_sesion(self, session_id: str) -> Optional[dict]:
+        """El último trabajo encolado para la sesión."""
+        raise NotImplementedError
+
+
+class AlmacenTrabajosMemoria(AlmacenTrabajos):
+
+    def __init__(self, ttl: float, max_trabajos: int):
+        self._trabajos = CacheLRU(max_entradas=max_trabajos, ttl=ttl)
+        self._por_sesion = CacheLRU(max_entradas=max_trabajos, ttl=ttl)
+
+    def guardar(self, trabajo: dict):
+        self._trabajos.put(trabajo["job_id"], trabajo)
+        self._por_sesion.put(trabajo["session_id"], trabajo["job_id"])
+
+    def obtener(self, job_id: str) -> Optional[dict]:
+        return self._trabajos.get(job_id)
+
+    def de_sesion(self, session_id: str) -> Optional[dict]:
+        job_id = self._por_sesion.get(session_id)
+        return self._trabajos.get(job_id) if job_id else None
+
+
+class AlmacenTrabajosSQLite(AlmacenTrabajos):
+    """
+    Trabajos en una tabla SQLite (WAL) compartida entre procesos. Vencen
+    `ttl` segundos después de su última actualización y se conservan a lo
+    más `max_trabajos` (los más recientes).
+    """
+
+    def __init__(self, ruta: str, ttl: float, max_trabajos: int):
+        self.ruta = ruta
+        self.ttl = ttl
+        self.max_trabajos = max_trabajos
+        with self._conexion() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS trabajos (
+                    job_id TEXT PRIMARY KEY,
+                    session_id TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    creado REAL NOT NULL,
+                    actualizado REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_trabajos_sesion ON trabajos (session_id, creado)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_trabajos_creado ON trabajos (creado)")
+
+    @contextmanager
+    def _conexion(self):
+        conn = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def _vigente_desde(self) -> float:
+        return time.time() - self.ttl
+
+    def guardar(self, trabajo: dict):
+        ahora = time.time()
+        with self._conexion() as conn:
+            cursor = conn.execute("""
+                UPDATE trabajos SET data = ?, actualizado = ? WHERE job_id = ?
+            """, (json.dumps(trabajo, default=str), ahora, trabajo["job_id"]))
+            if cursor.rowcount:
+                return
+            # Trabajo nuevo: de paso se descartan los vencidos y los que sobran
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO trabajos (job_id, session_id, data, creado, actualizado) VALUES (?, ?, ?, ?, ?)",
+                (trabajo["job_id"], trabajo["session_id"], json.dumps(trabajo, default=str), trabajo["creado"], ahora)
+            )
+            conn.execute("DELETE FROM trabajos WHERE actualizado < ?", (self._vigente_desde(),))
+            conn.execute("""
+                DELETE FROM trabajos WHERE job_id IN (
+                    SELECT job_id FROM trabajos ORDER BY creado DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_trabajos,))
+            conn.execute("COMMIT")
+
+    def obtener(self, job_id: str) -> Optional[dict]:
+        with self._conexion() as conn:
+            fila = conn.execute(
+                "SELECT data FROM trabajos WHERE job_id = ? AND actualizado >= ?",
+                (job_id, self._vigente_desde())
+            ).fetchone()
+        return json.loads(fila[0]) if fila else None
+
+    def de_sesion(self, session_id: str) -> Optional[dict]:
+        with self._conexion() as conn:
+            fila = conn.execute("""
+                SELECT data FROM trabajos WHERE session_id = ? AND actualizado >= ?
+                ORDER BY creado DESC LIMIT 1
+            """, (session_id, self._vigente_desde())).fetchone()
+        return json.loads(fila[0]) if fila else None
+
+
+def crear_almacen_trabajos(backend: str, ttl: float, max_trabajos: int,
+                           ruta_sqlite: Optional[str] = None) -> AlmacenTrabajos:
+    """Mismo backend que las sesiones (KPI_SESSION_BACKEND: 'memoria' o 'sqlite')."""
+    if backend == 'sqlite':
+        return AlmacenTrabajosSQLite(ruta_sqlite, ttl=ttl, max_trabajos=max_trabajos)
+    if backend == 'memoria':
+        return AlmacenTrabajosMemoria(ttl=ttl, max_trabajos=max_trabajos)
+    raise ValueError(f"Backend de trabajos desconocido: {backend}")
+
+
+class ColaTrabajos:
+
+    def __init__(self, workers: int, almacen: AlmacenTrabajos):
+        self.workers = workers
+        self.almacen = almacen
+        self._cola: Optional[asyncio.Queue] = None
+        self._tareas = []
+
+    def iniciar(self):
+        self._cola = asyncio.Queue()
+        self._tareas = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def detener(self):
+        """
+        Cancela los workers. Los trabajos en curso o en cola quedan como
+        fallidos (no se van a terminar), no como 'running'/'queued' para siempre.
+        """
+        for tarea in self._tareas:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        self._tareas = []
+        while self._cola is not None and not self._cola.empty():
+            trabajo, _ = self._cola.get_nowait()
+            self._cancelado(trabajo)
+            await self._guardar(trabajo)
+
+    async def _en_executor(self, funcion: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, funcion, *args)
+
+    async def encolar(self, session_id: str, funcion: Callable[[], Awaitable[dict]]) -> dict:
+        """
+        Encola `funcion`, que debe devolver {"success": bool, "data"/"error": ...}
+        y "pendiente_envio": True si los datos solo quedaron encolados.
+        """
+        trabajo = {
+            "job_id": uuid.uuid4().hex,
+            "session_id": session_id,
+            "status": EN_COLA,
+            "creado": time.time(),
+            "iniciado": None,
+            "terminado": None,
+            "espera_s": None,
+            "duracion_s": None,
+            "resultado": None,
+            "error": None,
+        }
+        await self._en_executor(self.almacen.guardar, trabajo)
+        self._cola.put_nowait((trabajo, funcion))
+        return trabajo
+
+    async def obtener(self, job_id: str) -> Optional[dict]:
+        return await self._en_executor(self.almacen.obtener, job_id)
+
+    async def trabajo_de_sesion(self, session_id: str) -> Optional[dict]:
+        return await self._en_executor(self.almacen.de_sesion, session_id)
+
+    def pendientes(self) -> int:
+        return self._cola.qsize() if self._cola is not None else 0
+
+    async def _worker(self):
+        while True:
+            trabajo, funcion = await self._cola.get()
+            try:
+                await self._ejecutar(trabajo, funcion)
+            finally:
+                self._cola.task_done()
+
+    async def _guardar(self, trabajo: dict):
+        # Un error del almacén no debe botar el worker ni el envío
+        try:
+            await self._en_executor(self.almacen.guardar, trabajo)
+        except Exception as e:
+            print(f"Error guardando el estado del trabajo {trabajo['job_id']}: {e}")
+
+    @staticmethod
+    def _cancelado(trabajo: dict):
+        trabajo["status"] = FALLIDO
+        trabajo["terminado"] = time.time()
+        trabajo["error"] = "Trabajo cancelado al detener el servidor"
+
+    async def _ejecutar(self, trabajo: dict, funcion: Callable[[], Awaitable[dict]]):
+        trabajo["status"] = EN_EJECUCION
+        trabajo["iniciado"] = time.time()
+        trabajo["espera_s"] = round(trabajo["iniciado"] - trabajo["creado"], 3)
+        await self._guardar(trabajo)
+        try:
+            resultado: Any = await funcion()
+        except asyncio.CancelledError:
+            self._cancelado(trabajo)
+            trabajo["duracion_s"] = round(trabajo["terminado"] - trabajo["iniciado"], 3)
+            await self._guardar(trabajo)
+            raise
+        except Exception as e:
+            resultado = {"success": False, "error": str(e)}
+
+        trabajo["terminado"] = time.time()
+        trabajo["duracion_s"] = round(trabajo["terminado"] - trabajo["iniciado"], 3)
+        if resultado.get("success"):
+            trabajo["status"] = PENDIENTE_ENVIO if resultado.get("pendiente_envio") else EXITOSO
+            trabajo["resultado"] = resultado.get("data", {})
+        else:
+            trabajo["status"] = FALLIDO
+            trabajo["error"] = resultado.get("error", "Error al insertar datos")
+        await self._guardar(trabajo)
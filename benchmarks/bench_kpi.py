@@ -0,0 +1,356 @@
+"""
+Benchmarks de la carga de KPIs, sobre archivos generados con generar_kpi.
+
+Casos, para cada cantidad de ejecutivos de --tamanos:
+- parse: extraer_kpi de los 7 archivos (openpyxl + conversión)
+- parse_csv: lo mismo con los 7 archivos exportados como .csv (';', coma decimal)
+- unificar: unir_series_kpi de las 7 series ya leídas (pandas)
+- preview: GET /preview/{id} completo (HTML transmitido por partes)
+- flujo: /upload -> /preview -> /confirm -> /jobs hasta terminar, con un
+  servidor local en lugar del webhook de n8n
+- arranque: en procesos nuevos (pool de parseo 'process', como en producción),
+  tiempo de `import main`, del primer /health, hasta que /ready responde 200
+  con el precalentamiento, y del primer /upload con y sin precalentamiento
+  (solo con la menor cantidad de --tamanos)
+
+De cada caso se informan los percentiles de latencia (p50/p95/p99) y el pico
+de memoria (tracemalloc, en una pasada aparte para no afectar los tiempos).
+Si hay una línea base (baseline.json) el script termina con código 1 cuando
+un caso la supera más allá de la tolerancia.
+
+    python benchmarks/bench_kpi.py                      # corre y compara con baseline.json
+    python benchmarks/bench_kpi.py --guardar-baseline   # reemplaza la línea base
+
+La línea base depende de la máquina: se regenera en la máquina donde se
+comparan los resultados.
+"""
+import argparse
+import gc
+import gzip
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DIRECTORIO, '..', 'app'))
+sys.path.insert(0, DIRECTORIO)
+
+from generar_kpi import generar_lote  # noqa: E402
+
+BASELINE = os.path.join(DIRECTORIO, 'baseline.json')
+DIRECTORIO_APP = os.path.join(DIRECTORIO, '..', 'app')
+
+# Campo del formulario de /upload -> KPI (CAMPOS_KPI en main.py)
+CAMPOS_UPLOAD = {
+    'TMO': 'tmo',
+    'TransfEPA': 'transf_epa',
+    'Tipificaciones': 'tipificaciones',
+    'SatEP': 'sat_ep',
+    'ResEP': 'res_ep',
+    'SatSNL': 'sat_snl',
+    'ResSNL': 'res_snl',
+}
+
+
+class _WebhookLocal(BaseHTTPRequestHandler):
+    """Responde como el webhook de n8n: 200 con un JSON, después de leer el lote."""
+
+    recibidos = 0
+
+    def do_POST(self):
+        cuerpo = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            cuerpo = gzip.decompress(cuerpo)
+        registros = json.loads(cuerpo).get('registros', [])
+        _WebhookLocal.recibidos += len(registros)
+        respuesta = json.dumps({"ok": True, "registros": len(registros)}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(respuesta)))
+        self.end_headers()
+        self.wfile.write(respuesta)
+
+    def log_message(self, *args):
+        pass
+
+
+def iniciar_webhook_local() -> ThreadingHTTPServer:
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), _WebhookLocal)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def percentiles(tiempos: List[float], pico: Optional[int] = None) -> dict:
+    p50, p95, p99 = np.percentile(tiempos, [50, 95, 99])
+    return {
+        "n": len(tiempos),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(max(tiempos), 2),
+        "pico_kb": round(pico / 1024, 1) if pico is not None else None,
+    }
+
+
+def medir(funcion: Callable[[], object], repeticiones: int, calentamiento: int) -> dict:
+    """Latencias (ms) de `repeticiones` llamadas y pico de memoria de una llamada más."""
+    for _ in range(calentamiento):
+        funcion()
+    gc.collect()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return percentiles(tiempos, pico)
+
+
+# Corre en un proceso nuevo e imprime los tiempos de arranque como JSON en la última línea
+_SCRIPT_ARRANQUE = '''
+import json, sys, time
+inicio = time.perf_counter()
+import main
+importado = time.perf_counter()
+from fastapi.testclient import TestClient
+
+archivos = {}
+for campo, ruta in json.loads(sys.argv[1]).items():
+    with open(ruta, 'rb') as f:
+        archivos[campo] = (ruta.rsplit('/', 1)[-1], f.read())
+
+with TestClient(main.app) as cliente:
+    t = time.perf_counter()
+    cliente.get('/health').raise_for_status()
+    health = time.perf_counter() - t
+    if main.KPI_WARMUP:
+        while cliente.get('/ready').status_code != 200:
+            time.sleep(0.01)
+    listo = time.perf_counter() - inicio
+    t = time.perf_counter()
+    cliente.post('/upload', data={'fecha_registro': '2026-01-31'}, files=archivos).raise_for_status()
+    carga = time.perf_counter() - t
+
+print(json.dumps({"import": importado - inicio, "health": health, "listo": listo, "carga": carga}))
+'''
+
+
+def medir_arranque(n: int, repeticiones: int, directorio_tmp: str) -> Dict[str, dict]:
+    """Tiempos de arranque en frío, cada repetición en un proceso nuevo."""
+    rutas = {}
+    for kpi, contenido in generar_lote(n, 'xlsx').items():
+        rutas[CAMPOS_UPLOAD[kpi]] = os.path.join(directorio_tmp, f"{kpi}.xlsx")
+        with open(rutas[CAMPOS_UPLOAD[kpi]], 'wb') as f:
+            f.write(contenido)
+
+    medidas = {False: [], True: []}
+    for precalentar in (False, True):
+        entorno = {
+            **os.environ,
+            'KPI_WARMUP': '1' if precalentar else '0',
+            'KPI_PARSE_POOL': 'process',
+            'KPI_PARSE_CACHE_ENTRIES': '0',
+            'KPI_DB_BACKEND': 'sqlite',
+            'KPI_DB_SQLITE_PATH': os.path.join(directorio_tmp, 'arranque.sqlite3'),
+        }
+        for _ in range(repeticiones):
+            salida = subprocess.run(
+                [sys.executable, '-c', _SCRIPT_ARRANQUE, json.dumps(rutas)],
+                cwd=DIRECTORIO_APP, env=entorno, capture_output=True, text=True, check=True
+            )
+            medidas[precalentar].append(json.loads(salida.stdout.strip().splitlines()[-1]))
+
+    def ms(precalentar: Optional[bool], clave: str) -> List[float]:
+        grupos = [medidas[precalentar]] if precalentar is not None else list(medidas.values())
+        return [m[clave] * 1000 for grupo in grupos for m in grupo]
+
+    return {
+        "import_main": percentiles(ms(None, 'import')),
+        "health_en_frio": percentiles(ms(None, 'health')),
+        "hasta_listo": percentiles(ms(True, 'listo')),
+        f"primera_carga[{n}]": percentiles(ms(False, 'carga')),
+        f"primera_carga_precalentada[{n}]": percentiles(ms(True, 'carga')),
+    }
+
+
+def preparar_app(directorio_tmp: str, url_webhook: str):
+    """Importa main con la configuración del benchmark (sin cache de parseo ni outbox)."""
+    os.environ.update({
+        'N8N_WEBHOOK_URL': url_webhook,
+        'N8N_RETRIES': '0',
+        'KPI_PERSISTENCIA': 'n8n',
+        'KPI_N8N_OUTBOX': '0',
+        'KPI_PARSE_CACHE_ENTRIES': '0',
+        'KPI_DB_BACKEND': 'sqlite',
+        'KPI_DB_SQLITE_PATH': os.path.join(directorio_tmp, 'bench.sqlite3'),
+    })
+    os.environ.setdefault('KPI_PARSE_POOL', 'thread')
+    import main
+    return main
+
+
+def correr(tamanos: List[int], repeticiones: int, calentamiento: int, casos: List[str],
+           repeticiones_arranque: int = 3) -> Dict[str, dict]:
+    resultados = {}
+    if 'arranque' in casos:
+        # Antes de importar main en este proceso
+        with tempfile.TemporaryDirectory(prefix='kpi_bench_') as directorio_tmp:
+            resultados.update(medir_arranque(min(tamanos), repeticiones_arranque, directorio_tmp))
+        print("  arranque listo", file=sys.stderr)
+
+    from fastapi.testclient import TestClient
+    from procesamiento_kpi import extraer_kpi, unir_series_kpi
+
+    servidor = iniciar_webhook_local()
+    with tempfile.TemporaryDirectory(prefix='kpi_bench_') as directorio_tmp:
+        main = preparar_app(directorio_tmp, f"http://127.0.0.1:{servidor.server_port}/webhook")
+        with TestClient(main.app) as cliente:
+            for n in tamanos:
+                archivos = generar_lote(n, 'xlsx')
+                archivos_csv = generar_lote(n, 'csv')
+                series = [extraer_kpi(contenido, kpi) for kpi, contenido in archivos.items()]
+                registros = unir_series_kpi(series)
+
+                def parse():
+                    return [extraer_kpi(contenido, kpi) for kpi, contenido in archivos.items()]
+
+                def parse_csv():
+                    return [extraer_kpi(contenido, kpi) for kpi, contenido in archivos_csv.items()]
+
+                def unificar():
+                    return unir_series_kpi(series)
+
+                sesion = main.preview_data.crear({
+                    'registros': registros, 'fecha_registro': '2026-01-31', 'kpis_omitidos': []
+                })
+
+                def preview():
+                    respuesta = cliente.get(f"/preview/{sesion}", params={'page_size': 1000})
+                    respuesta.raise_for_status()
+                    return respuesta.content
+
+                def flujo():
+                    respuesta = cliente.post(
+                        "/upload",
+                        data={'fecha_registro': '2026-01-31'},
+                        files={
+                            campo: (f"{kpi}.xlsx", archivos[kpi], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+                            for kpi, campo in CAMPOS_UPLOAD.items()
+                        }
+                    )
+                    respuesta.raise_for_status()
+                    session_id = respuesta.json()['preview_url'].rsplit('/', 1)[-1]
+                    cliente.get(f"/preview/{session_id}").raise_for_status()
+                    trabajo = cliente.post(f"/confirm/{session_id}").json()
+                    while True:
+                        estado = cliente.get(trabajo['status_url']).json()
+                        if estado['status'] in ('succeeded', 'failed'):
+                            break
+                        time.sleep(0.002)
+                    if estado['status'] != 'succeeded':
+                        raise RuntimeError(f"Confirmación fallida: {estado}")
+
+                for caso, funcion in (('parse', parse), ('parse_csv', parse_csv), ('unificar', unificar),
+                                      ('preview', preview), ('flujo', flujo)):
+                    if caso in casos:
+                        resultados[f"{caso}[{n}]"] = medir(funcion, repeticiones, calentamiento)
+                        print(f"  {caso}[{n}] listo", file=sys.stderr)
+    servidor.shutdown()
+    return resultados
+
+
+def comparar(resultados: Dict[str, dict], linea_base: Dict[str, dict], tolerancia_tiempo: float,
+             tolerancia_memoria: float, margen_ms: float = 0) -> List[str]:
+    """
+    Casos que empeoraron respecto de la línea base (p50 y pico de memoria).
+    margen_ms evita falsas alarmas en los casos de pocos milisegundos.
+    """
+    regresiones = []
+    for caso, actual in resultados.items():
+        base = linea_base.get(caso)
+        if base is None:
+            continue
+        if actual['p50_ms'] > base['p50_ms'] * (1 + tolerancia_tiempo) + margen_ms:
+            regresiones.append(f"{caso}: p50 {actual['p50_ms']} ms > {base['p50_ms']} ms (+{tolerancia_tiempo:.0%})")
+        if actual['pico_kb'] is not None and base.get('pico_kb') is not None \
+                and actual['pico_kb'] > base['pico_kb'] * (1 + tolerancia_memoria):
+            regresiones.append(f"{caso}: pico {actual['pico_kb']} KB > {base['pico_kb']} KB (+{tolerancia_memoria:.0%})")
+    return regresiones
+
+
+def imprimir(resultados: Dict[str, dict], linea_base: Dict[str, dict]):
+    print(f"{'caso':<32}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'pico KB':>12}{'base p50':>10}")
+    for caso, r in resultados.items():
+        base = linea_base.get(caso, {}).get('p50_ms', '-')
+        pico = r['pico_kb'] if r['pico_kb'] is not None else '-'
+        print(f"{caso:<32}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{pico:>12}{base:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de la carga de KPIs")
+    parser.add_argument('--tamanos', default='300,3000', help="Cantidades de ejecutivos, separadas por coma")
+    parser.add_argument('--repeticiones', type=int, default=10)
+    parser.add_argument('--calentamiento', type=int, default=1)
+    parser.add_argument('--casos', default='parse,parse_csv,unificar,preview,flujo,arranque')
+    parser.add_argument('--repeticiones-arranque', type=int, default=3, help="Procesos nuevos por modo de arranque")
+    parser.add_argument('--baseline', default=BASELINE, help="Archivo JSON con la línea base")
+    parser.add_argument('--guardar-baseline', action='store_true', help="Guarda los resultados como línea base")
+    parser.add_argument('--tolerancia-tiempo', type=float, default=0.30, help="Aumento permitido del p50 (0.30 = 30%%)")
+    parser.add_argument('--tolerancia-memoria', type=float, default=0.20, help="Aumento permitido del pico de memoria")
+    parser.add_argument('--margen-ms', type=float, default=5, help="Margen absoluto sobre el p50 (ms)")
+    parser.add_argument('--json', help="Escribe los resultados en este archivo")
+    args = parser.parse_args()
+
+    tamanos = [int(t) for t in args.tamanos.split(',') if t.strip()]
+    casos = [c.strip() for c in args.casos.split(',') if c.strip()]
+    resultados = correr(tamanos, args.repeticiones, args.calentamiento, casos, args.repeticiones_arranque)
+
+    linea_base = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            linea_base = json.load(f).get('casos', {})
+    imprimir(resultados, linea_base)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"casos": resultados}, f, indent=2)
+
+    if args.guardar_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                "python": platform.python_version(),
+                "plataforma": platform.platform(),
+                "casos": {**linea_base, **resultados},
+            }, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f"Línea base guardada en {args.baseline}")
+        return
+
+    regresiones = comparar(resultados, linea_base, args.tolerancia_tiempo, args.tolerancia_memoria, args.margen_ms)
+    if regresiones:
+        print("\nRegresiones respecto de la línea base:")
+        for regresion in regresiones:
+            print(f"  - {regresion}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
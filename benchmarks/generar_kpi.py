@@ -0,0 +1,142 @@
+"""
+Generador de archivos KPI sintéticos con la forma del reporte exportado.
+
+Cada archivo tiene lo que espera procesar_archivo_kpi:
+- una fila de encabezado y una segunda fila que repite el nombre de la columna
+- el nombre del ejecutivo en la columna 1 y el valor como fracción (0.9312)
+- en Tipificaciones varias columnas de conteo y el porcentaje en la última
+- el pie 'Total' y 'Filtros aplicados: ...' al final
+
+Se puede usar como módulo (generar_xlsx / generar_csv / generar_lote) o desde
+la línea de comandos:
+
+    python benchmarks/generar_kpi.py --ejecutivos 5000 --formato xlsx --salida /tmp/kpis
+"""
+import argparse
+import csv
+import io
+import os
+import random
+from typing import Dict, List, Optional
+
+from openpyxl import Workbook
+
+KPIS = ['TMO', 'TransfEPA', 'Tipificaciones', 'SatEP', 'ResEP', 'SatSNL', 'ResSNL']
+
+# Rango de cada KPI como fracción (x100 da el valor que muestra el dashboard)
+RANGOS = {
+    'TMO': (0.03, 0.08),
+    'TransfEPA': (0.70, 0.99),
+    'Tipificaciones': (0.85, 1.0),
+    'SatEP': (0.80, 1.0),
+    'ResEP': (0.75, 0.99),
+    'SatSNL': (0.80, 1.0),
+    'ResSNL': (0.75, 0.99),
+}
+
+# Columnas de conteo que trae el reporte de Tipificaciones antes del porcentaje
+COLUMNAS_TIPIFICACIONES = ['Atenciones', 'Tipificadas', 'Sin tipificar', 'Total']
+
+_NOMBRES = ['Camila', 'Javiera', 'Valentina', 'Francisca', 'Constanza', 'Catalina', 'Fernanda',
+            'Matías', 'Sebastián', 'Benjamín', 'Nicolás', 'Diego', 'Felipe', 'Tomás', 'José', 'María']
+_APELLIDOS = ['González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva',
+              'Martínez', 'Sepúlveda', 'Morales', 'Rodríguez', 'López', 'Fuentes', 'Hernández', 'Araya']
+
+
+def nombres_ejecutivos(n: int, semilla: int = 0) -> List[str]:
+    """n nombres distintos con tildes y eñes, como los del reporte."""
+    rnd = random.Random(semilla)
+    nombres = []
+    for i in range(n):
+        nombre = f"{rnd.choice(_NOMBRES)} {rnd.choice(_APELLIDOS)} {rnd.choice(_APELLIDOS)}"
+        nombres.append(f"{nombre} {i:05d}")
+    return nombres
+
+
+def filas_kpi(kpi: str, ejecutivos: List[str], semilla: int = 0, faltantes: float = 0.02) -> List[list]:
+    """
+    Filas del reporte de un KPI, encabezados y pie incluidos. Una fracción
+    `faltantes` de los ejecutivos trae '-' en lugar del valor (texto, se lee
+    como sin dato).
+    """
+    rnd = random.Random(f"{semilla}-{kpi}")
+    minimo, maximo = RANGOS[kpi]
+    if kpi == 'Tipificaciones':
+        encabezado = ['Ejecutivo'] + COLUMNAS_TIPIFICACIONES + ['Total']
+    else:
+        encabezado = ['Ejecutivo', kpi]
+
+    filas = [encabezado, ['Ejecutivo'] + [f"%{kpi}"] * (len(encabezado) - 1)]
+    for ejecutivo in ejecutivos:
+        valor = '-' if rnd.random() < faltantes else round(rnd.uniform(minimo, maximo), 4)
+        if kpi == 'Tipificaciones':
+            atenciones = rnd.randint(200, 1500)
+            tipificadas = int(atenciones * valor) if valor != '-' else 0
+            filas.append([ejecutivo, atenciones, tipificadas, atenciones - tipificadas, atenciones, valor])
+        else:
+            filas.append([ejecutivo, valor])
+
+    total = round((minimo + maximo) / 2, 4)
+    filas.append(['Total'] + [None] * (len(encabezado) - 2) + [total])
+    filas.append([f"Filtros aplicados: Periodo es el mes actual; KPI es {kpi}"])
+    return filas
+
+
+def generar_xlsx(kpi: str, ejecutivos: List[str], semilla: int = 0, faltantes: float = 0.02) -> bytes:
+    """Bytes de un .xlsx con el reporte del KPI."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(kpi)
+    for fila in filas_kpi(kpi, ejecutivos, semilla, faltantes):
+        ws.append(fila)
+    salida = io.BytesIO()
+    wb.save(salida)
+    return salida.getvalue()
+
+
+def generar_csv(kpi: str, ejecutivos: List[str], semilla: int = 0, faltantes: float = 0.02,
+                delimitador: str = ';', coma_decimal: bool = True, encoding: str = 'utf-8-sig') -> bytes:
+    """
+    Bytes de un .csv con el mismo contenido. Por defecto como lo guarda Excel
+    en configuración regional es-CL: ';' como separador y coma decimal.
+    """
+    texto = io.StringIO()
+    escritor = csv.writer(texto, delimiter=delimitador, lineterminator='\r\n')
+    for fila in filas_kpi(kpi, ejecutivos, semilla, faltantes):
+        celdas = []
+        for celda in fila:
+            if celda is None:
+                celdas.append('')
+            elif isinstance(celda, float) and coma_decimal:
+                celdas.append(repr(celda).replace('.', ','))
+            else:
+                celdas.append(celda)
+        escritor.writerow(celdas)
+    return texto.getvalue().encode(encoding)
+
+
+def generar_lote(n_ejecutivos: int, formato: str = 'xlsx', semilla: int = 0,
+                 kpis: Optional[List[str]] = None) -> Dict[str, bytes]:
+    """Un archivo por KPI para los mismos ejecutivos: {kpi: bytes}."""
+    ejecutivos = nombres_ejecutivos(n_ejecutivos, semilla)
+    generar = generar_xlsx if formato == 'xlsx' else generar_csv
+    return {kpi: generar(kpi, ejecutivos, semilla) for kpi in (kpis or KPIS)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera archivos KPI sintéticos (uno por KPI)")
+    parser.add_argument('--ejecutivos', type=int, default=300)
+    parser.add_argument('--formato', choices=['xlsx', 'csv'], default='xlsx')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--salida', default='kpis_sinteticos')
+    args = parser.parse_args()
+
+    os.makedirs(args.salida, exist_ok=True)
+    for kpi, contenido in generar_lote(args.ejecutivos, args.formato, args.semilla).items():
+        ruta = os.path.join(args.salida, f"{kpi}.{args.formato}")
+        with open(ruta, 'wb') as f:
+            f.write(contenido)
+        print(f"{ruta}: {len(contenido) / 1024:.1f} KB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Configuración común de las pruebas: los módulos de app/ se importan planos
+(igual que cuando main.py corre con app/ como directorio de trabajo).
+"""
+import gzip
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'app'))
+# generar_kpi.py arma archivos KPI con la forma del reporte
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+
+class WebhookStub:
+    """
+    Webhook local que responde con los códigos de `respuestas` en orden (el
+    último se repite) y guarda cada request: headers y payload ya decodificado.
+    """
+
+    def __init__(self):
+        self.respuestas = [200]
+        self.recibidos = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                cuerpo = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                crudo = gzip.decompress(cuerpo) if self.headers.get('Content-Encoding') == 'gzip' else cuerpo
+                with stub._lock:
+                    stub.recibidos.append({"headers": dict(self.headers), "bytes": len(cuerpo), "payload": json.loads(crudo)})
+                    indice = min(len(stub.recibidos), len(stub.respuestas)) - 1
+                    status = stub.respuestas[indice]
+                respuesta = json.dumps({"ok": status == 200}).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(respuesta)))
+                self.end_headers()
+                self.wfile.write(respuesta)
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.servidor.server_port}/webhook"
+        self._hilo = threading.Thread(target=self.servidor.serve_forever, daemon=True)
+        self._hilo.start()
+
+    def cerrar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+@pytest.fixture
+def webhook():
+    stub = WebhookStub()
+    yield stub
+    stub.cerrar()
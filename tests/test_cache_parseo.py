@@ -0,0 +1,70 @@
+import hashlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from cache_lru import CacheLRU
+from generar_kpi import generar_xlsx, nombres_ejecutivos
+from procesamiento_kpi import VERSION_PARSER
+
+
+@pytest.fixture
+def cliente():
+    main.parse_cache.limpiar()
+    return TestClient(main.app)
+
+
+def subir(cliente, archivo):
+    respuesta = cliente.post('/upload', data={'fecha_registro': '2026-01-15'},
+                             files={'tmo': ('tmo.xlsx', archivo)})
+    assert respuesta.status_code == 200
+    datos = cliente.get(respuesta.json()['preview_url'] + '/registros', params={'page_size': 500})
+    assert datos.status_code == 200
+    return datos.json()['registros']
+
+
+def test_mismo_archivo_se_toma_del_cache_por_sha256(cliente, monkeypatch):
+    archivo = generar_xlsx('TMO', nombres_ejecutivos(30, semilla=2), semilla=2, faltantes=0)
+    huella = hashlib.sha256(archivo).hexdigest()
+
+    primera = subir(cliente, archivo)
+    assert (huella, 'TMO', VERSION_PARSER) in main.parse_cache
+
+    def no_parsear(*args, **kwargs):
+        raise AssertionError("el archivo se volvió a parsear")
+    monkeypatch.setattr(main, 'obtener_parse_executor', no_parsear)
+    hits = main.parse_cache.hits
+
+    assert subir(cliente, archivo) == primera
+    assert main.parse_cache.hits == hits + 1
+
+
+def test_archivo_distinto_no_usa_el_cache(cliente):
+    subir(cliente, generar_xlsx('TMO', nombres_ejecutivos(30, semilla=2), semilla=2, faltantes=0))
+    misses = main.parse_cache.misses
+
+    subir(cliente, generar_xlsx('TMO', nombres_ejecutivos(30, semilla=2), semilla=3, faltantes=0))
+
+    assert main.parse_cache.misses == misses + 1
+    assert len(main.parse_cache) == 2
+
+
+def test_cache_lru_respeta_bytes_y_ttl(monkeypatch):
+    ahora = [100.0]
+    monkeypatch.setattr('cache_lru.time.monotonic', lambda: ahora[0])
+    cache = CacheLRU(max_entradas=10, max_bytes=10, ttl=60, medir=len)
+
+    cache.put('a', 'xxxx')
+    cache.put('b', 'xxxx')
+    cache.get('a')
+    cache.put('c', 'xxxx')
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+
+    cache.put('grande', 'x' * 11)
+    assert 'grande' not in cache
+
+    ahora[0] += 61
+    assert cache.get('a') is None
+    assert cache.limpiar_expiradas() == 1
+    assert len(cache) == 0
@@ -0,0 +1,79 @@
+from cache_respuestas import CacheRespuestas, InvalidacionesSQLite, calcular_etag, etag_coincide
+
+
+def nuevo_cache():
+    return CacheRespuestas(max_entradas=100, max_bytes=1024 * 1024, ttl=60)
+
+
+def guardar(cache, clave, periodos):
+    return cache.guardar(clave, repr(clave).encode(), periodos, cache.generacion())
+
+
+def test_invalidar_periodo_solo_borra_lo_que_lo_abarca():
+    cache = nuevo_cache()
+    guardar(cache, 'enero-2026', [(2026, 'ENERO')])
+    guardar(cache, 'febrero-2026', [(2026, 'FEBRERO')])
+    guardar(cache, 'enero-2025', [(2025, 'ENERO')])
+    guardar(cache, 'enero-sin-anio', [(None, 'ENERO')])
+    guardar(cache, 'todo-2026', [(2026, None)])
+    guardar(cache, 'historial', [(None, None)])
+    guardar(cache, 'enero-y-febrero', [(2026, 'ENERO'), (2026, 'FEBRERO')])
+
+    assert cache.invalidar_periodo(2026, 'ENERO') == 5
+
+    assert cache.obtener('febrero-2026') is not None
+    assert cache.obtener('enero-2025') is not None
+    for clave in ('enero-2026', 'enero-sin-anio', 'todo-2026', 'historial', 'enero-y-febrero'):
+        assert cache.obtener(clave) is None
+
+
+def test_no_guarda_respuestas_consultadas_antes_de_una_invalidacion():
+    cache = nuevo_cache()
+    generacion = cache.generacion()
+    cache.invalidar_periodo(2026, 'ENERO')
+
+    cache.guardar('enero-2026', b'viejo', [(2026, 'ENERO')], generacion)
+
+    assert cache.obtener('enero-2026') is None
+
+
+def test_etag_y_if_none_match():
+    cache = nuevo_cache()
+    etag = guardar(cache, 'meses', [(None, None)])
+
+    assert cache.obtener('meses') == (repr('meses').encode(), etag)
+    assert etag == calcular_etag(repr('meses').encode())
+    assert etag_coincide(f'"otro", {etag}', etag)
+    assert etag_coincide('*', etag)
+    assert not etag_coincide(None, etag)
+
+
+def test_invalidacion_compartida_llega_a_otro_worker(tmp_path):
+    ruta = str(tmp_path / 'sesiones.sqlite3')
+    worker_a = CacheRespuestas(100, 1024 * 1024, 60, compartidas=InvalidacionesSQLite(ruta), intervalo_sync=0)
+    worker_b = CacheRespuestas(100, 1024 * 1024, 60, compartidas=InvalidacionesSQLite(ruta), intervalo_sync=0)
+    guardar(worker_b, 'enero-2026', [(2026, 'ENERO')])
+    guardar(worker_b, 'febrero-2026', [(2026, 'FEBRERO')])
+    generacion_b = worker_b.generacion()
+
+    worker_a.invalidar_periodo(2026, 'ENERO')
+
+    assert worker_b.sincronizacion_pendiente()
+    assert worker_b.sincronizar() == 1
+    assert worker_b.obtener('enero-2026') is None
+    assert worker_b.obtener('febrero-2026') is not None
+    # Una consulta de B iniciada antes de la invalidación de A no se guarda
+    worker_b.guardar('enero-2026', b'viejo', [(2026, 'ENERO')], generacion_b)
+    assert worker_b.obtener('enero-2026') is None
+    # A no vuelve a aplicar su propia invalidación
+    guardar(worker_a, 'enero-2026', [(2026, 'ENERO')])
+    assert worker_a.sincronizar() == 0
+    assert worker_a.obtener('enero-2026') is not None
+
+
+def test_sincronizacion_respeta_el_intervalo(tmp_path):
+    cache = CacheRespuestas(100, 1024 * 1024, 60, compartidas=InvalidacionesSQLite(str(tmp_path / 's.sqlite3')),
+                            intervalo_sync=3600)
+
+    assert not cache.sincronizacion_pendiente()
+    assert not nuevo_cache().sincronizacion_pendiente()
@@ -0,0 +1,83 @@
+import asyncio
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from carga_archivos import SpoolKPI
+
+
+@pytest.fixture
+def cliente():
+    return TestClient(main.app)
+
+
+def test_spool_pasa_a_un_archivo_propio_al_superar_el_limite():
+    spool = SpoolKPI(10)
+    asyncio.run(spool.escribir(b'12345'))
+    assert spool.ruta is None
+
+    asyncio.run(spool.escribir(b'6789012'))
+    assert spool.ruta is not None and os.path.exists(spool.ruta)
+    assert spool.tell() == 12
+
+    spool.seek(0)
+    assert spool.read() == b'123456789012'
+    with open(spool.ruta, 'rb') as f:
+        assert f.read() == b'123456789012'
+
+    spool.close()
+    assert not os.path.exists(spool.ruta)
+
+
+def test_archivo_sobre_el_limite_devuelve_413(cliente, monkeypatch):
+    monkeypatch.setattr(main, 'KPI_UPLOAD_MAX_FILE_BYTES', 1000)
+
+    respuesta = cliente.post('/upload', data={'fecha_registro': '2026-01-15'},
+                             files={'tmo': ('tmo.xlsx', b'x' * 1001)})
+
+    assert respuesta.status_code == 413
+    assert respuesta.json()['status'] == 'error'
+    assert "'tmo'" in respuesta.json()['detail']
+
+
+def test_envio_sobre_el_limite_devuelve_413(cliente, monkeypatch):
+    monkeypatch.setattr(main, 'KPI_UPLOAD_MAX_REQUEST_BYTES', 2000)
+
+    respuesta = cliente.post('/upload', data={'fecha_registro': '2026-01-15'},
+                             files={'tmo': ('tmo.xlsx', b'x' * 1500), 'satEP': ('sat.xlsx', b'x' * 1500)})
+
+    assert respuesta.status_code == 413
+    assert 'por envío' in respuesta.json()['detail']
+
+
+def test_body_que_no_es_multipart_devuelve_415(cliente):
+    respuesta = cliente.post('/upload', json={'fecha_registro': '2026-01-15'})
+
+    assert respuesta.status_code == 415
+    assert respuesta.json()['status'] == 'error'
+
+
+@pytest.mark.parametrize('content_type, body', [
+    ('multipart/form-data', b'sin boundary'),
+    ('multipart/form-data; boundary=xyz', b'--xyz\r\nContent-Disposition: form-data\r\n\r\nvalor\r\n--xyz--\r\n'),
+])
+def test_multipart_mal_formado_devuelve_400(cliente, content_type, body):
+    respuesta = cliente.post('/upload', content=body, headers={'Content-Type': content_type})
+
+    assert respuesta.status_code == 400
+    assert respuesta.json()['status'] == 'error'
+
+
+def test_archivo_en_disco_se_procesa_igual(cliente, monkeypatch):
+    from generar_kpi import generar_xlsx, nombres_ejecutivos
+    monkeypatch.setattr(main, 'KPI_UPLOAD_SPOOL_BYTES', 1024)
+    archivo = generar_xlsx('TMO', nombres_ejecutivos(50, semilla=1), semilla=1, faltantes=0)
+    assert len(archivo) > 1024
+
+    respuesta = cliente.post('/upload', data={'fecha_registro': '2026-01-15'},
+                             files={'tmo': ('tmo.xlsx', archivo)})
+
+    assert respuesta.status_code == 200
+    assert respuesta.json()['preview_url'].startswith('/preview/')
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from cliente_n8n import ClienteN8N, ErrorN8N
+from metricas import RegistroMetricas
+
+
+def enviar(webhook, payload, clave=None, **opciones):
+    async def correr():
+        cliente = ClienteN8N(webhook.url, backoff_base=0, **opciones)
+        try:
+            return await cliente.enviar(payload, clave)
+        finally:
+            await cliente.cerrar()
+    return asyncio.run(correr())
+
+
+def test_reintenta_5xx_con_la_misma_idempotency_key(webhook):
+    webhook.respuestas = [503, 502, 200]
+
+    response = enviar(webhook, {"registros": [1, 2, 3]}, 'kpi-upload-abc', reintentos=3)
+
+    assert response.status_code == 200
+    assert len(webhook.recibidos) == 3
+    assert {r["headers"]["Idempotency-Key"] for r in webhook.recibidos} == {'kpi-upload-abc'}
+
+
+def test_sin_clave_genera_una_y_la_mantiene(webhook):
+    webhook.respuestas = [500, 200]
+
+    enviar(webhook, {"registros": []}, reintentos=1)
+
+    claves = [r["headers"]["Idempotency-Key"] for r in webhook.recibidos]
+    assert len(claves) == 2 and claves[0] == claves[1] and claves[0]
+
+
+def test_4xx_no_se_reintenta(webhook):
+    webhook.respuestas = [422]
+
+    response = enviar(webhook, {"registros": []}, reintentos=3)
+
+    assert response.status_code == 422
+    assert len(webhook.recibidos) == 1
+
+
+def test_agota_los_reintentos(webhook):
+    webhook.respuestas = [503]
+
+    with pytest.raises(ErrorN8N) as error:
+        enviar(webhook, {"registros": []}, reintentos=2)
+
+    assert error.value.status_code == 503
+    assert error.value.intentos == 3
+    assert len(webhook.recibidos) == 3
+
+
+def test_gzip_solo_sobre_el_umbral(webhook):
+    grande = {"registros": [{"ejecutivo": f"Ejecutivo {i}", "tmo": 4.5} for i in range(2000)]}
+    enviar(webhook, {"registros": [{"ejecutivo": "Ana"}]}, gzip_min_bytes=1024)
+    enviar(webhook, grande, gzip_min_bytes=1024)
+
+    chico, comprimido = webhook.recibidos
+    assert 'Content-Encoding' not in chico["headers"]
+    assert comprimido["headers"]["Content-Encoding"] == 'gzip'
+    assert comprimido["payload"] == grande
+    assert comprimido["bytes"] < len(str(grande)) / 4
+
+
+def test_error_de_conexion_se_reintenta_y_falla():
+    async def correr():
+        # Puerto cerrado: cada intento es un error de transporte
+        cliente = ClienteN8N("http://127.0.0.1:9/webhook", reintentos=1, backoff_base=0, timeout_conexion=1)
+        try:
+            await cliente.enviar({"registros": []})
+        finally:
+            await cliente.cerrar()
+
+    with pytest.raises(ErrorN8N) as error:
+        asyncio.run(correr())
+    assert error.value.status_code is None
+    assert error.value.intentos == 2
+
+
+def test_reintentos_se_cuentan_en_metricas(webhook):
+    registro = RegistroMetricas()
+    reintentos = registro.contador('kpi_n8n_reintentos_total', 'Reintentos', ['motivo'])
+    webhook.respuestas = [503, 502, 200]
+
+    enviar(webhook, {"registros": []}, reintentos=3, contador_reintentos=reintentos)
+
+    assert 'kpi_n8n_reintentos_total{motivo="http_5xx"} 2' in registro.exponer()
+
+
+def test_un_solo_cliente_aunque_se_pida_desde_varios_threads(monkeypatch):
+    import main
+    monkeypatch.setattr(main, '_cliente_n8n', None)
+    creados = []
+
+    class ClienteLento:
+        def __init__(self, *args, **kwargs):
+            creados.append(self)
+            time.sleep(0.05)
+
+    monkeypatch.setattr('cliente_n8n.ClienteN8N', ClienteLento)
+    hilos = [threading.Thread(target=main.obtener_cliente_n8n) for _ in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert len(creados) == 1
+    assert main.obtener_cliente_n8n() is creados[0]
@@ -0,0 +1,98 @@
+"""
+Los valores esperados salen de correr las funciones de script.js
+(rankingKPIs/contarRojos sobre los valores de cálculo de processData, es
+decir, con normalizePercent, y calcularScoreCOPC/clasificarCOPC con las
+alertas de processData) sobre este mismo equipo en el dashboard.
+"""
+from evaluacion_kpi import ranking_kpis, resumen_copc, score_copc
+
+# Mismo equipo con los nombres de campo del dashboard -> columnas de la tabla
+EQUIPO = [
+    {"ejecutivo": "Ana Rojas", "tmo": 4.5, "transfepa": 88, "tipificaciones": 97, "satep": 96, "resep": 92, "satsnl": 96, "ressnl": 91},
+    {"ejecutivo": "Bruno Díaz", "tmo": 5.4, "transfepa": 83, "tipificaciones": 93, "satep": 93, "resep": 88, "satsnl": 94, "ressnl": 89},
+    {"ejecutivo": "Carla Soto", "tmo": 7, "transfepa": 70, "tipificaciones": 80, "satep": 85, "resep": 75, "satsnl": 80, "ressnl": 70},
+    {"ejecutivo": "Diego Muñoz", "tmo": 5, "transfepa": 85, "tipificaciones": 95, "satep": 95, "resep": 90, "satsnl": 95, "ressnl": 90},
+    {"ejecutivo": "Elena Vera", "tmo": 6, "transfepa": 90, "tipificaciones": 99, "satep": 97, "resep": 91, "satsnl": 92, "ressnl": 86},
+    {"ejecutivo": "Felipe Lagos", "tmo": 4.8, "transfepa": None, "tipificaciones": 96, "satep": None, "resep": 93, "satsnl": 97, "ressnl": 92},
+    # Porcentajes como fracción: processData los lleva a 0-100 antes de contar kpiTotal
+    {"ejecutivo": "Gloria Paz", "tmo": 5.2, "transfepa": 0.9, "tipificaciones": 0.97, "satep": 0.96, "resep": 0.88, "satsnl": 0.95, "ressnl": 0.9},
+    {"ejecutivo": "Hugo Tapia", "tmo": 6, "transfepa": 90, "tipificaciones": 99, "satep": 97, "resep": 91, "satsnl": 92, "ressnl": 86},
+]
+
+# rankingKPIs(equipo con normalizePercent).map(e => [e.name, e.kpiTotal, contarRojos(e)])
+RANKING_SCRIPT_JS = [
+    ["Ana Rojas", 7, 0], ["Diego Muñoz", 7, 0], ["Gloria Paz", 5, 0], ["Felipe Lagos", 5, 2],
+    ["Elena Vera", 4, 2], ["Hugo Tapia", 4, 2], ["Bruno Díaz", 0, 0], ["Carla Soto", 0, 7],
+]
+
+# calcularScoreCOPC + clasificarCOPC, en el orden del equipo
+COPC_SCRIPT_JS = [
+    ["Ana Rojas", 100, "ÓPTIMO"], ["Bruno Díaz", 62, "RIESGO"], ["Carla Soto", 0, "RIESGO"],
+    ["Diego Muñoz", 100, "ÓPTIMO"], ["Elena Vera", 71, "RIESGO"], ["Felipe Lagos", 45, "RIESGO"],
+    ["Gloria Paz", 89, "CONTROL"], ["Hugo Tapia", 71, "RIESGO"],
+]
+
+
+def test_ranking_como_script_js():
+    ranking = ranking_kpis(EQUIPO)
+
+    assert [[r["name"], r["kpiTotal"], r["rojos"]] for r in ranking] == RANKING_SCRIPT_JS
+    assert [r["ranking"] for r in ranking] == list(range(1, len(EQUIPO) + 1))
+
+
+def test_ranking_normaliza_porcentajes_en_fraccion_pero_no_el_tmo():
+    en_fraccion = {"ejecutivo": "A", "tmo": 1, "transfepa": 0.9, "tipificaciones": 0.97, "satep": 0.96,
+                   "resep": 0.92, "satsnl": 0.96, "ressnl": 0.91}
+    en_porcentaje = {**en_fraccion, "ejecutivo": "B", "transfepa": 90, "tipificaciones": 97, "satep": 96,
+                     "resep": 92, "satsnl": 96, "ressnl": 91}
+
+    a, b = ranking_kpis([en_fraccion, en_porcentaje])
+
+    assert (a["kpiTotal"], a["rojos"], a["kpiDetalle"]) == (b["kpiTotal"], b["rojos"], b["kpiDetalle"])
+    # El TMO de 1 minuto no se escala a 100: cumple la meta
+    assert a["kpiDetalle"]["tmo"] == 1
+    # La respuesta conserva el valor original, como el dashboard
+    assert a["satEp"] == 0.96
+
+
+def test_ranking_top_es_el_prefijo_del_ranking_completo():
+    completo = ranking_kpis(EQUIPO)
+
+    for top in (1, 3, 5):
+        assert ranking_kpis(EQUIPO, top) == completo[:top]
+    assert ranking_kpis(EQUIPO, 50) == completo
+    assert ranking_kpis([]) == []
+
+
+def test_ranking_detalle_y_campos_de_la_api():
+    felipe = next(r for r in ranking_kpis(EQUIPO) if r["name"] == "Felipe Lagos")
+
+    assert felipe["kpiDetalle"]["satisfaccionEP"] == 0
+    assert felipe["kpiDetalle"]["tmo"] == 1
+    assert felipe["satEp"] is None and felipe["tmo"] == 4.8
+
+
+def test_score_copc_como_script_js():
+    evaluados = score_copc(EQUIPO)
+
+    assert [[e["name"], e["score"], e["nivel"]] for e in evaluados] == COPC_SCRIPT_JS
+
+
+def test_score_copc_alertas_y_semaforos():
+    felipe, gloria = (e for e in score_copc(EQUIPO) if e["name"] in ("Felipe Lagos", "Gloria Paz"))
+
+    # Un KPI faltante cuenta como 0: lejos de la meta, alerta crítica
+    assert {"kpi": "satEp", "nivel": "critica"} in felipe["alertas"]
+    assert felipe["normalizados"]["satEp"] == 0
+    assert felipe["semaforos"]["satisfaccionEP"] == "ROJO"
+    # Los porcentajes en fracción se evalúan ya escalados
+    assert gloria["semaforos"]["satisfaccionEP"] == "VERDE"
+    assert {a["kpi"] for a in gloria["alertas"]} == {"tmo", "resEp"}
+
+
+def test_resumen_copc():
+    resumen = resumen_copc(score_copc(EQUIPO))
+
+    assert resumen["por_nivel"] == {"ÓPTIMO": 2, "CONTROL": 1, "RIESGO": 5}
+    assert resumen["score_promedio"] == round((100 + 62 + 0 + 100 + 71 + 45 + 89 + 71) / 8, 2)
+    assert resumen_copc([]) == {"por_nivel": {"ÓPTIMO": 0, "CONTROL": 0, "RIESGO": 0}, "score_promedio": None}
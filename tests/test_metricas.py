@@ -0,0 +1,80 @@
+from fastapi.testclient import TestClient
+
+import main
+from metricas import RegistroMetricas
+
+
+def muestras(texto):
+    """Líneas de muestra (sin # HELP / # TYPE) como {nombre_con_etiquetas: valor}."""
+    return {linea.rsplit(' ', 1)[0]: linea.rsplit(' ', 1)[1]
+            for linea in texto.splitlines() if linea and not linea.startswith('#')}
+
+
+def test_formato_de_texto_de_prometheus():
+    registro = RegistroMetricas()
+    filas = registro.contador('filas_total', 'Filas leídas', ['kpi'])
+    latencia = registro.histograma('etapa_segundos', 'Duración', ['etapa'], buckets=(0.1, 1))
+    registro.gauge('sesiones', 'Sesiones vivas', lambda: 3)
+    registro.gauge('roto', 'Falla al leer', lambda: 1 / 0)
+
+    filas.inc(5, kpi='tmo')
+    filas.inc(kpi='tmo')
+    filas.inc(kpi='sat "EP"\n')
+    for valor in (0.05, 0.1, 0.5, 2.0):
+        latencia.observar(valor, etapa='parse')
+
+    texto = registro.exponer()
+
+    assert texto.endswith('\n')
+    assert '# HELP filas_total Filas leídas\n# TYPE filas_total counter' in texto
+    assert '# TYPE etapa_segundos histogram' in texto
+    assert '# TYPE sesiones gauge' in texto
+    # Un gauge que falla no rompe la exposición
+    assert 'roto' not in texto
+    assert muestras(texto) == {
+        'filas_total{kpi="tmo"}': '6',
+        'filas_total{kpi="sat \\"EP\\"\\n"}': '1',
+        # Buckets acumulados; el límite es inclusivo (le)
+        'etapa_segundos_bucket{etapa="parse",le="0.1"}': '2',
+        'etapa_segundos_bucket{etapa="parse",le="1"}': '3',
+        'etapa_segundos_bucket{etapa="parse",le="+Inf"}': '4',
+        'etapa_segundos_sum{etapa="parse"}': '2.65',
+        'etapa_segundos_count{etapa="parse"}': '4',
+        'sesiones': '3',
+    }
+
+
+def test_medir_observa_tambien_si_falla():
+    registro = RegistroMetricas()
+    latencia = registro.histograma('etapa_segundos', 'Duración', ['etapa'])
+
+    try:
+        with latencia.medir(etapa='db'):
+            raise ValueError()
+    except ValueError:
+        pass
+
+    assert muestras(registro.exponer())['etapa_segundos_count{etapa="db"}'] == '1'
+
+
+def test_endpoint_metrics_registra_la_carga():
+    from generar_kpi import generar_xlsx, nombres_ejecutivos
+
+    cliente = TestClient(main.app)
+    antes = muestras(cliente.get('/metrics').text)
+    archivo = generar_xlsx('TMO', nombres_ejecutivos(20, semilla=22), semilla=22, faltantes=0)
+    assert cliente.post('/upload', data={'fecha_registro': '2026-01-15'},
+                        files={'tmo': ('tmo.xlsx', archivo)}).status_code == 200
+
+    respuesta = cliente.get('/metrics')
+
+    assert respuesta.status_code == 200
+    assert respuesta.headers['content-type'].startswith('text/plain; version=0.0.4')
+    despues = muestras(respuesta.text)
+    # Archivo nuevo (semilla propia): se parsea, no sale del cache de parseo
+    for muestra, incremento in (('kpi_parse_segundos_count{kpi="TMO"}', 1),
+                                ('kpi_archivo_bytes_count{kpi="TMO"}', 1),
+                                ('kpi_filas_leidas_total{kpi="TMO"}', 20)):
+        assert int(despues[muestra]) - int(antes.get(muestra, 0)) == incremento
+    for etapa in ('multipart', 'parse', 'unificar'):
+        assert f'kpi_etapa_segundos_count{{etapa="{etapa}"}}' in despues
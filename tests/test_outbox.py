@@ -0,0 +1,177 @@
+import asyncio
+import time
+
+import pytest
+
+from outbox import ENVIADO, FALLIDO, PENDIENTE, FlusherOutbox, OutboxN8N, clave_envio, fusionar_por_fecha
+
+
+def lote(*ejecutivos, tmo=5.0):
+    return [{"ejecutivo": ejecutivo, "tmo": tmo} for ejecutivo in ejecutivos]
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return OutboxN8N(str(tmp_path / 'outbox.sqlite3'), backoff_base=0)
+
+
+class EnvioFalso:
+    """enviar(registros, fecha_registro, clave) que responde con `resultados` en orden (el último se repite)."""
+
+    def __init__(self, *resultados):
+        self.resultados = list(resultados) or [{"success": True}]
+        self.llamadas = []
+
+    async def __call__(self, registros, fecha_registro, clave):
+        self.llamadas.append({"registros": registros, "fecha_registro": fecha_registro, "clave": clave})
+        resultado = self.resultados[min(len(self.llamadas), len(self.resultados)) - 1]
+        return resultado(registros) if callable(resultado) else resultado
+
+
+def drenar(outbox, enviar, **opciones):
+    flusher = FlusherOutbox(outbox, enviar, **opciones)
+    return asyncio.run(flusher.drenar(forzar=True))
+
+
+def test_fusionar_por_fecha_manda_el_lote_mas_reciente():
+    lotes = [
+        {"id": 1, "fecha_registro": '2026-01-31', "registros": lote('Ana', 'Bruno', tmo=7.0)},
+        {"id": 2, "fecha_registro": '2026-02-28', "registros": lote('Ana')},
+        {"id": 3, "fecha_registro": '2026-01-31', "registros": lote('Ana', tmo=4.0)},
+    ]
+
+    grupos = fusionar_por_fecha(lotes)
+
+    assert grupos['2026-01-31']["ids"] == [1, 3]
+    assert {r["ejecutivo"]: r["tmo"] for r in grupos['2026-01-31']["registros"]} == {'Ana': 4.0, 'Bruno': 7.0}
+    assert grupos['2026-02-28'] == {"ids": [2], "registros": lote('Ana')}
+
+
+def test_reclamar_junta_hasta_max_registros_y_es_exclusivo(outbox):
+    for i in range(4):
+        outbox.agregar(lote(f"A{i}", f"B{i}"), '2026-01-31' if i < 2 else '2026-02-28')
+
+    primeros = outbox.reclamar(max_registros=5)
+    assert [l["id"] for l in primeros] == [1, 2]
+    # Los reclamados no se vuelven a entregar mientras dure el reclamo
+    assert [l["id"] for l in outbox.reclamar(max_registros=100)] == [3, 4]
+    assert outbox.reclamar(max_registros=100) == []
+
+
+def test_reclamar_siempre_entrega_al_menos_un_lote(outbox):
+    outbox.agregar(lote(*[f"E{i}" for i in range(10)]), '2026-01-31')
+
+    assert len(outbox.reclamar(max_registros=3)) == 1
+
+
+def test_flusher_fusiona_la_misma_fecha_en_un_envio(outbox):
+    outbox.agregar(lote('Ana', 'Bruno', tmo=7.0), '2026-01-31')
+    outbox.agregar(lote('Carla'), '2026-02-28')
+    outbox.agregar(lote('Ana', tmo=4.0), '2026-01-31')
+    enviar = EnvioFalso()
+
+    assert drenar(outbox, enviar) == 3
+
+    por_fecha = {llamada["fecha_registro"]: llamada for llamada in enviar.llamadas}
+    assert len(enviar.llamadas) == 2
+    assert {r["ejecutivo"]: r["tmo"] for r in por_fecha['2026-01-31']["registros"]} == {'Ana': 4.0, 'Bruno': 7.0}
+    assert por_fecha['2026-01-31']["clave"] == clave_envio([1, 3])
+    assert all(outbox.estado_lote(i)["estado"] == ENVIADO for i in (1, 2, 3))
+    assert outbox.stats()["lotes"] == 0
+
+
+def test_error_transitorio_deja_el_lote_pendiente_para_reintentar(outbox):
+    outbox.agregar(lote('Ana'), '2026-01-31')
+    enviar = EnvioFalso({"success": False, "error": "Error en n8n: 503", "status_code": 503}, {"success": True})
+
+    assert drenar(outbox, enviar) == 0
+    estado = outbox.estado_lote(1)
+    assert estado["estado"] == PENDIENTE and estado["intentos"] == 1
+
+    assert drenar(outbox, enviar) == 1
+    assert outbox.estado_lote(1)["estado"] == ENVIADO
+    assert enviar.llamadas[0]["clave"] == enviar.llamadas[1]["clave"]
+
+
+def test_error_permanente_aisla_el_lote_malo(outbox):
+    outbox.agregar(lote('Ana'), '2026-01-31')
+    outbox.agregar(lote('Malo'), '2026-01-31')
+    outbox.agregar(lote('Carla'), '2026-01-31')
+
+    def responder(registros):
+        if any(r["ejecutivo"] == 'Malo' for r in registros):
+            return {"success": False, "error": "Error en n8n: 422", "status_code": 422}
+        return {"success": True}
+
+    assert drenar(outbox, EnvioFalso(responder)) == 2
+
+    assert [outbox.estado_lote(i)["estado"] for i in (1, 2, 3)] == [ENVIADO, FALLIDO, ENVIADO]
+    stats = outbox.stats()
+    assert stats["fallidos"] == 1
+    assert stats["ultimos_fallidos"][0]["id"] == 2
+
+
+def test_se_agotan_los_intentos(tmp_path):
+    outbox = OutboxN8N(str(tmp_path / 'outbox.sqlite3'), max_intentos=3, backoff_base=0)
+    outbox.agregar(lote('Ana'), '2026-01-31')
+    enviar = EnvioFalso({"success": False, "error": "sin conexión", "status_code": None})
+
+    for _ in range(5):
+        drenar(outbox, enviar)
+
+    assert len(enviar.llamadas) == 3
+    assert outbox.estado_lote(1) == {"estado": FALLIDO, "intentos": 3, "ultimo_error": "sin conexión"}
+
+
+def test_reclamo_en_curso_bloquea_los_mas_nuevos_de_la_misma_fecha(outbox):
+    outbox.agregar(lote('Ana', tmo=7.0), '2026-01-31')
+    assert [l["id"] for l in outbox.reclamar(max_registros=100)] == [1]
+
+    outbox.agregar(lote('Ana', tmo=4.0), '2026-01-31')
+    outbox.agregar(lote('Bruno'), '2026-02-28')
+
+    # Mientras otro worker envía el lote 1, el 2 (misma fecha) no sale; el de otra fecha sí
+    assert [l["id"] for l in outbox.reclamar(max_registros=100)] == [3]
+
+
+def test_lote_antiguo_en_backoff_no_pisa_al_mas_nuevo(tmp_path):
+    outbox = OutboxN8N(str(tmp_path / 'outbox.sqlite3'), backoff_base=0.2)
+    outbox.agregar(lote('Ana', 'Bruno', tmo=7.0), '2026-01-31')
+    enviar = EnvioFalso({"success": False, "error": "Error en n8n: 503", "status_code": 503}, {"success": True})
+    assert drenar(outbox, enviar) == 0
+
+    # Llega un lote más nuevo de la misma fecha mientras el primero espera su backoff
+    outbox.agregar(lote('Ana', tmo=4.0), '2026-01-31')
+    assert drenar(outbox, enviar) == 0
+    assert outbox.estado_lote(2)["intentos"] == 0
+
+    time.sleep(0.25)
+    assert drenar(outbox, enviar) == 2
+
+    # Salen juntos y fusionados: el valor de Ana es el del lote más nuevo
+    ultimo = enviar.llamadas[-1]
+    assert ultimo["clave"] == clave_envio([1, 2])
+    assert {r["ejecutivo"]: r["tmo"] for r in ultimo["registros"]} == {'Ana': 4.0, 'Bruno': 7.0}
+
+
+def test_error_transitorio_de_un_lote_retiene_a_los_mas_nuevos(outbox):
+    outbox.agregar(lote('Malo'), '2026-01-31')
+    outbox.agregar(lote('Ana', tmo=7.0), '2026-01-31')
+    outbox.agregar(lote('Ana', tmo=4.0), '2026-01-31')
+    respuestas = iter([
+        {"success": False, "error": "Error en n8n: 422", "status_code": 422},  # los tres juntos
+        {"success": False, "error": "Error en n8n: 422", "status_code": 422},  # 'Malo' solo
+        {"success": False, "error": "Error en n8n: 503", "status_code": 503},  # lote 2 solo
+    ])
+    enviar = EnvioFalso(lambda registros: next(respuestas, {"success": True}))
+
+    assert drenar(outbox, enviar) == 0
+
+    # El lote 3 no se envió antes que el 2: queda liberado sin gastar intentos
+    assert len(enviar.llamadas) == 3
+    assert [outbox.estado_lote(i)["estado"] for i in (1, 2, 3)] == [FALLIDO, PENDIENTE, PENDIENTE]
+    assert outbox.estado_lote(3)["intentos"] == 0
+
+    assert drenar(outbox, enviar) == 2
+    assert enviar.llamadas[-1]["clave"] == clave_envio([2, 3])
+    assert enviar.llamadas[-1]["registros"] == lote('Ana', tmo=4.0)
@@ -0,0 +1,76 @@
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from perfilador import guardar_reporte, listar_reportes, obtener_reporte
+
+TOKEN = 'secreto-de-prueba'
+
+
+@pytest.fixture
+def cliente(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'KPI_PROFILING_TOKEN', TOKEN)
+    monkeypatch.setattr(main, 'KPI_PROFILING_DIR', str(tmp_path / 'perfiles'))
+    monkeypatch.setattr(main, 'KPI_PROFILING_MEMORY', False)
+    return TestClient(main.app)
+
+
+def subir(cliente, **kwargs):
+    from generar_kpi import generar_xlsx, nombres_ejecutivos
+
+    archivo = generar_xlsx('TMO', nombres_ejecutivos(30, semilla=3), semilla=3, faltantes=0)
+    return cliente.post('/upload', data={'fecha_registro': '2026-01-15'}, files={'tmo': ('tmo.xlsx', archivo)}, **kwargs)
+
+
+def test_el_header_con_el_token_perfila_la_carga(cliente):
+    respuesta = subir(cliente, headers={'X-KPI-Profile': TOKEN})
+
+    assert respuesta.status_code == 200
+    perfil_id = respuesta.headers['X-KPI-Perfil']
+    reporte = cliente.get(f'/debug/perfiles/{perfil_id}', headers={'X-KPI-Profile': TOKEN}).json()
+    assert reporte['id'] == perfil_id and reporte['ruta'] == '/upload'
+    assert reporte['memoria'] is None
+    listado = cliente.get('/debug/perfiles', headers={'X-KPI-Profile': TOKEN}).json()['perfiles']
+    assert [p['id'] for p in listado] == [perfil_id]
+
+
+def test_el_token_en_la_url_no_se_acepta(cliente):
+    respuesta = subir(cliente, params={'profile': TOKEN})
+
+    assert respuesta.status_code == 200
+    assert 'X-KPI-Perfil' not in respuesta.headers
+    assert cliente.get('/debug/perfiles', params={'profile': TOKEN}).status_code == 403
+    assert cliente.get('/debug/perfiles', headers={'X-KPI-Profile': 'otro'}).status_code == 403
+
+
+def test_sin_token_configurado_el_perfilado_no_existe(cliente, monkeypatch):
+    monkeypatch.setattr(main, 'KPI_PROFILING_TOKEN', '')
+
+    assert 'X-KPI-Perfil' not in subir(cliente, headers={'X-KPI-Profile': TOKEN}).headers
+    assert cliente.get('/debug/perfiles', headers={'X-KPI-Profile': TOKEN}).status_code == 404
+
+
+def test_se_conservan_solo_los_reportes_mas_recientes(tmp_path):
+    directorio = str(tmp_path)
+    for i in range(5):
+        reporte = {"id": f"perfil{i}", "ruta": "/upload", "fecha": f"2026-01-0{i + 1}T00:00:00",
+                   "duracion_s": 0.1, "memoria": None}
+        guardar_reporte(directorio, reporte, max_reportes=3)
+        # mtime explícito: el orden no depende de la resolución del reloj del sistema de archivos
+        os.utime(os.path.join(directorio, f"perfil{i}.json"), (1000 + i, 1000 + i))
+
+    assert sorted(os.listdir(directorio)) == ['perfil2.json', 'perfil3.json', 'perfil4.json']
+    assert [r['id'] for r in listar_reportes(directorio)] == ['perfil4', 'perfil3', 'perfil2']
+
+
+def test_obtener_reporte_rechaza_ids_que_no_son_alfanumericos(tmp_path):
+    with open(tmp_path / 'secreto.json', 'w', encoding='utf-8') as f:
+        json.dump({"id": "secreto"}, f)
+    directorio = str(tmp_path / 'perfiles')
+    os.makedirs(directorio)
+
+    assert obtener_reporte(directorio, '../secreto') is None
+    assert obtener_reporte(directorio, 'noexiste') is None
@@ -0,0 +1,172 @@
+import sqlite3
+
+import pytest
+
+from persistencia import (COLUMNAS, RepositorioKPI, RepositorioMySQL, RepositorioSQLite, codificar_cursor,
+                          decodificar_cursor)
+
+
+def registro(ejecutivo, **kpis):
+    base = {'ejecutivo': ejecutivo, 'tmo': 5.0, 'transfepa': 85.0, 'tipificaciones': 95.0,
+            'satep': 95.0, 'resep': 90.0, 'satsnl': 95.0, 'ressnl': 90.0}
+    base.update(kpis)
+    return base
+
+
+@pytest.fixture
+def repositorio(tmp_path):
+    return RepositorioSQLite(str(tmp_path / 'kpis.sqlite3'))
+
+
+def filas_tabla(repositorio):
+    with sqlite3.connect(repositorio.ruta) as conn:
+        return conn.execute("SELECT ejecutivo, fecha_registro, tmo FROM kpis ORDER BY ejecutivo, fecha_registro").fetchall()
+
+
+def test_upsert_misma_fecha_actualiza_sin_duplicar(repositorio):
+    repositorio.insertar_registros([registro('Ana', tmo=4.0), registro('Bruno')], '2026-01-31')
+    repositorio.insertar_registros([registro('Ana', tmo=6.5)], '2026-01-31')
+
+    assert filas_tabla(repositorio) == [('Ana', '2026-01-31', 6.5), ('Bruno', '2026-01-31', 5.0)]
+    catalogo = repositorio.meses_disponibles()
+    assert [(m['anio'], m['mes'], m['registros'], m['ejecutivos']) for m in catalogo] == [(2026, 'ENERO', 2, 2)]
+
+
+def test_insertar_en_varios_lotes(repositorio):
+    registros = [registro(f"Ejecutivo {i:03d}") for i in range(25)]
+    resultado = repositorio.insertar_registros(registros, '2026-02-28', batch_size=10)
+
+    assert resultado['lotes'] == 3
+    assert resultado['anio'] == 2026 and resultado['mes'] == 'FEBRERO'
+    assert len(filas_tabla(repositorio)) == 25
+
+
+def test_vigente_es_la_carga_mas_reciente_del_mes(repositorio):
+    repositorio.insertar_registros([registro('Ana', tmo=7.0), registro('Bruno', tmo=4.0)], '2026-01-15')
+    # Segunda carga del mes solo para Ana: reemplaza su fila vigente, Bruno sigue con la primera
+    repositorio.insertar_registros([registro('Ana', tmo=4.5)], '2026-01-31')
+
+    vigentes = repositorio.registros_vigentes(2026, 'ENERO')
+    assert [(r['ejecutivo'], r['tmo']) for r in vigentes] == [('Ana', 4.5), ('Bruno', 4.0)]
+
+    data = repositorio.consultar_kpis(meses=['ENERO'], campos=['name', 'tmo', 'fecha_registro'])['data']
+    assert sorted((r['name'], r['tmo'], r['fecha_registro']) for r in data) == [
+        ('Ana', 4.5, '2026-01-31'), ('Bruno', 4.0, '2026-01-15')
+    ]
+
+    # El resumen del mes solo promedia las cargas vigentes
+    tmo = next(f for f in repositorio.resumen_mensual() if f['kpi'] == 'tmo')
+    assert tmo['n'] == 2
+    assert tmo['promedio'] == pytest.approx(4.25)
+    assert tmo['cumplen'] == 2
+
+
+def test_vigente_es_por_mes(repositorio):
+    repositorio.insertar_registros([registro('Ana', satep=90.0)], '2026-01-31')
+    repositorio.insertar_registros([registro('Ana', satep=97.0)], '2026-02-28')
+
+    assert [(f['mes'], f['satep']) for f in repositorio.historial_vigente()] == [('ENERO', 90.0), ('FEBRERO', 97.0)]
+    assert [(f['mes'], f['satep']) for f in repositorio.serie_ejecutivo('Ana')] == [('ENERO', 90.0), ('FEBRERO', 97.0)]
+    assert repositorio.ultimo_anio_con_mes('FEBRERO') == 2026
+    assert repositorio.ultimo_anio_con_mes('MARZO') is None
+
+
+def test_cursor_keyset_recorre_todo_sin_repetir(repositorio):
+    repositorio.insertar_registros([registro(f"Ejecutivo {i:02d}") for i in range(7)], '2026-01-31')
+    repositorio.insertar_registros([registro(f"Ejecutivo {i:02d}") for i in range(7, 12)], '2026-02-28')
+
+    vistos = []
+    cursor = None
+    paginas = 0
+    while True:
+        pagina = repositorio.consultar_kpis(campos=['name', 'fecha_registro'], limite=5, cursor=cursor)
+        vistos.extend((r['fecha_registro'], r['name']) for r in pagina['data'])
+        paginas += 1
+        cursor = pagina['next_cursor']
+        if cursor is None:
+            break
+
+    assert paginas == 3
+    assert vistos == sorted(vistos)
+    assert len(vistos) == len(set(vistos)) == 12
+
+
+def test_cursor_sin_pagina_siguiente(repositorio):
+    repositorio.insertar_registros([registro('Ana'), registro('Bruno')], '2026-01-31')
+
+    pagina = repositorio.consultar_kpis(limite=2)
+    assert pagina['count'] == 2
+    assert pagina['next_cursor'] is None
+
+
+def test_cursor_codifica_y_rechaza_basura():
+    assert decodificar_cursor(codificar_cursor('2026-01-31', 'Ana Muñoz')) == ('2026-01-31', 'Ana Muñoz')
+    with pytest.raises(ValueError):
+        decodificar_cursor('no-es-un-cursor')
+
+
+def test_catalogo_quita_el_periodo_que_queda_sin_filas(repositorio):
+    repositorio.insertar_registros([registro('Ana')], '2026-01-31')
+    repositorio.insertar_registros([registro('Ana'), registro('Bruno')], '2026-02-28')
+    # Otro proceso (p.ej. n8n o una corrección manual) borra las filas de enero
+    with sqlite3.connect(repositorio.ruta) as conn:
+        conn.execute("DELETE FROM kpis WHERE mes = 'ENERO'")
+
+    repositorio.actualizar_periodo(2026, 'ENERO')
+
+    assert [m['mes'] for m in repositorio.meses_disponibles()] == ['FEBRERO']
+    assert {f['mes'] for f in repositorio.resumen_mensual()} == {'FEBRERO'}
+    assert repositorio.ultimo_anio_con_mes('ENERO') is None
+
+
+class CursorFalso:
+    """Cursor de MySQL que responde las consultas a information_schema con filas fijas."""
+
+    def __init__(self, columnas, indices):
+        self.respuestas = [columnas, indices]
+        self.consultas = []
+
+    def execute(self, sql, parametros=()):
+        self.consultas.append(sql)
+
+    def fetchall(self):
+        return self.respuestas.pop(0)
+
+
+def repositorio_mysql():
+    # Sin pool: solo se prueban las sentencias que arma
+    repositorio = RepositorioMySQL.__new__(RepositorioMySQL)
+    RepositorioKPI.__init__(repositorio, 'kpis')
+    return repositorio
+
+
+def columnas_mysql(*omitidas):
+    columnas = [('kpis', c) for c in COLUMNAS]
+    columnas += [('kpis_meses', c) for c in ['anio', 'mes', 'mes_num', 'registros', 'ejecutivos', 'ultima_fecha', 'actualizado']]
+    columnas += [('kpis_resumen', c) for c in ['anio', 'mes', 'mes_num', 'kpi', 'n', 'suma', 'minimo', 'maximo', 'cumplen']]
+    return [fila for fila in columnas if f"{fila[0]}.{fila[1]}" not in omitidas]
+
+
+def test_mysql_verifica_el_esquema_sin_ddl():
+    cursor = CursorFalso(columnas_mysql(), [('PRIMARY', 'id'), ('uq_ejecutivo_fecha', 'ejecutivo,fecha_registro')])
+
+    repositorio_mysql().preparar_esquema(cursor)
+
+    assert not any(sql.lstrip().upper().startswith(('CREATE', 'ALTER', 'DROP')) for sql in cursor.consultas)
+
+
+@pytest.mark.parametrize('columnas, indices, mensaje', [
+    (columnas_mysql('kpis.satsnl', 'kpis_resumen.cumplen'), [('uq', 'ejecutivo,fecha_registro')],
+     'kpis.satsnl, kpis_resumen.cumplen'),
+    (columnas_mysql(), [('PRIMARY', 'id'), ('uq_ejecutivo', 'ejecutivo')], 'clave única'),
+])
+def test_mysql_esquema_incompleto_falla_con_el_detalle(columnas, indices, mensaje):
+    with pytest.raises(RuntimeError, match=mensaje):
+        repositorio_mysql().preparar_esquema(CursorFalso(columnas, indices))
+
+
+def test_mysql_upsert_usa_alias_de_fila():
+    sql = repositorio_mysql().sql_upsert(2)
+
+    assert 'VALUES(' not in sql
+    assert ') AS nuevo ON DUPLICATE KEY UPDATE anio = nuevo.anio, mes = nuevo.mes, tmo = nuevo.tmo' in sql
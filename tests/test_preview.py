@@ -0,0 +1,61 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from sesiones import AlmacenSesionesSQLite
+
+REGISTROS = [
+    {"ejecutivo": f"Ejecutivo {i:02d}", "tmo": None if i % 5 == 0 else float(i), "transfepa": None,
+     "tipificaciones": None, "satep": 90.0, "resep": None, "satsnl": None, "ressnl": None}
+    for i in range(1, 26)
+]
+
+
+@pytest.fixture
+def sesion(tmp_path, monkeypatch):
+    almacen = AlmacenSesionesSQLite(str(tmp_path / 'sesiones.sqlite3'), ttl=60, max_sesiones=10,
+                                    max_bytes=1024 * 1024)
+    monkeypatch.setattr(main, 'preview_data', almacen)
+    session_id = almacen.crear({"registros": REGISTROS, "fecha_registro": '2026-01-31', "kpis_omitidos": []})
+    return TestClient(main.app), session_id
+
+
+def test_registros_paginados(sesion):
+    cliente, session_id = sesion
+
+    datos = cliente.get(f'/preview/{session_id}/registros', params={'page': 2, 'page_size': 10}).json()
+
+    assert datos['total'] == 25
+    assert datos['fecha_registro'] == '2026-01-31'
+    assert [r['ejecutivo'] for r in datos['registros']] == [f"Ejecutivo {i:02d}" for i in range(11, 21)]
+
+
+def test_orden_por_servidor_deja_los_vacios_al_final(sesion):
+    cliente, session_id = sesion
+
+    def pagina(page):
+        datos = cliente.get(f'/preview/{session_id}/registros',
+                            params={'sort': 'tmo', 'order': 'desc', 'page': page, 'page_size': 10}).json()
+        return [r['tmo'] for r in datos['registros']]
+
+    # 20 con valor (24 ... 1 sin los múltiplos de 5), luego los 5 vacíos
+    assert pagina(2) == [12.0, 11.0, 9.0, 8.0, 7.0, 6.0, 4.0, 3.0, 2.0, 1.0]
+    assert pagina(3) == [None] * 5
+
+
+def test_orden_invalido_y_sesion_inexistente(sesion):
+    cliente, session_id = sesion
+
+    assert cliente.get(f'/preview/{session_id}/registros', params={'sort': 'clave'}).status_code == 400
+    assert cliente.get('/preview/no-existe/registros').status_code == 404
+
+
+def test_pagina_html_transmite_solo_la_pagina_pedida(sesion):
+    cliente, session_id = sesion
+
+    html = cliente.get(f'/preview/{session_id}', params={'page': 3, 'page_size': 10}).text
+
+    assert 'Ejecutivo 21' in html and 'Ejecutivo 25' in html
+    assert 'Ejecutivo 20' not in html
+    assert '<h1>Sesión expirada</h1>' not in cliente.get(f'/preview/{session_id}').text
+    assert cliente.get('/preview/no-existe').text == '<h1>Sesión expirada</h1>'
@@ -0,0 +1,213 @@
+import io
+import os
+import tempfile
+from typing import Dict
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from generar_kpi import generar_csv, generar_xlsx, nombres_ejecutivos
+from procesamiento_kpi import (KPIS, MUESTRA_CSV, _convertidor_csv, _filas_csv, detectar_formato, extraer_kpi,
+                               procesar_archivo_kpi, unificar_datos_kpi)
+
+
+def procesar_archivo_kpi_original(archivo_bytes: bytes, kpi_nombre: str) -> Dict[str, float]:
+    """El parser anterior (pd.read_excel + iterrows), como referencia del resultado esperado."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp:
+        tmp.write(archivo_bytes)
+        tmp_path = tmp.name
+    df = pd.read_excel(tmp_path)
+    os.unlink(tmp_path)
+
+    columna_ejecutivo = df.columns[0]
+    columna_valor = df.columns[-1] if kpi_nombre == 'Tipificaciones' else df.columns[1]
+    df = df.iloc[1:]
+
+    resultado = {}
+    for _, row in df.iterrows():
+        ejecutivo = row[columna_ejecutivo]
+        valor = row[columna_valor]
+        if pd.isna(ejecutivo) or ejecutivo == '':
+            continue
+        if isinstance(ejecutivo, str) and ('Filtros aplicados' in ejecutivo or ejecutivo == 'Total'):
+            continue
+        if pd.notna(valor) and isinstance(valor, (int, float)):
+            resultado[ejecutivo] = round(valor * 100, 2)
+        else:
+            resultado[ejecutivo] = None
+    return resultado
+
+
+def xlsx(filas) -> bytes:
+    wb = Workbook()
+    ws = wb.active
+    for fila in filas:
+        ws.append(fila)
+    salida = io.BytesIO()
+    wb.save(salida)
+    return salida.getvalue()
+
+
+@pytest.mark.parametrize('kpi', KPIS)
+def test_igual_al_parser_original(kpi):
+    archivo = generar_xlsx(kpi, nombres_ejecutivos(300, semilla=3), semilla=3, faltantes=0.1)
+
+    assert procesar_archivo_kpi(archivo, kpi) == procesar_archivo_kpi_original(archivo, kpi)
+
+
+def test_casos_borde_igual_al_parser_original():
+    archivo = xlsx([
+        ['Ejecutivo', 'SatEP'],
+        ['Ejecutivo', '%SatEP'],
+        ['José Muñoz', 0.9512],
+        [None, None],
+        ['Ana Pérez', 1],
+        ['Sin Valor', '-'],
+        ['Ana Pérez', 0.905],
+        ['Redondeo', 0.12345],
+        ['Total', 0.93],
+        ['Filtros aplicados: Periodo es el mes actual'],
+    ])
+
+    resultado = procesar_archivo_kpi(archivo, 'SatEP')
+
+    assert resultado == procesar_archivo_kpi_original(archivo, 'SatEP')
+    assert resultado == {'José Muñoz': 95.12, 'Ana Pérez': 90.5, 'Sin Valor': None, 'Redondeo': 12.35}
+
+
+def test_segunda_fila_vacia_no_se_lleva_al_primer_ejecutivo():
+    archivo = xlsx([
+        ['Ejecutivo', 'TMO'],
+        [None, None],
+        ['Primero', 0.05],
+        ['Segundo', 0.06],
+    ])
+
+    assert procesar_archivo_kpi(archivo, 'TMO') == procesar_archivo_kpi_original(archivo, 'TMO')
+    assert list(extraer_kpi(archivo, 'TMO').index) == ['Primero', 'Segundo']
+
+
+def test_tipificaciones_usa_la_ultima_columna():
+    archivo = xlsx([
+        ['Ejecutivo', 'Atenciones', 'Tipificadas', 'Total'],
+        ['Ejecutivo', '%Tipificaciones', '%Tipificaciones', '%Tipificaciones'],
+        ['Ana', 500, 480, 0.96],
+        ['Bruno', 300, 270, 0.9],
+        ['Total', None, None, 0.93],
+    ])
+
+    assert procesar_archivo_kpi(archivo, 'Tipificaciones') == {'Ana': 96.0, 'Bruno': 90.0}
+    assert procesar_archivo_kpi(archivo, 'Tipificaciones') == procesar_archivo_kpi_original(archivo, 'Tipificaciones')
+
+
+def test_archivo_ilegible_devuelve_vacio_y_extraer_kpi_propaga():
+    assert procesar_archivo_kpi(b'PK\x03\x04 no es un zip', 'TMO') == {}
+    with pytest.raises(Exception):
+        extraer_kpi(b'PK\x03\x04 no es un zip', 'TMO')
+
+
+def unificar_datos_kpi_original(archivos_data, kpis_omitidos):
+    """La unificación anterior (dict por ejecutivo), como referencia."""
+    kpis_procesados = {}
+    for kpi_nombre, archivo_bytes in archivos_data.items():
+        if kpi_nombre not in kpis_omitidos:
+            kpis_procesados[kpi_nombre] = procesar_archivo_kpi_original(archivo_bytes, kpi_nombre)
+
+    todos_ejecutivos = set()
+    for datos in kpis_procesados.values():
+        todos_ejecutivos.update(datos.keys())
+
+    registros = []
+    for ejecutivo in sorted(todos_ejecutivos):
+        registro = {'ejecutivo': ejecutivo}
+        for kpi in KPIS:
+            if kpi in kpis_procesados:
+                registro[kpi.lower()] = kpis_procesados[kpi].get(ejecutivo)
+            else:
+                registro[kpi.lower()] = None
+        registros.append(registro)
+    return registros
+
+
+@pytest.mark.parametrize('omitidos', [[], ['SatSNL', 'ResSNL']])
+def test_unificacion_igual_a_la_original(omitidos):
+    nombres = nombres_ejecutivos(200, semilla=5)
+    # cada KPI trae un subconjunto distinto de ejecutivos: el outer join debe cubrir la unión
+    archivos = {
+        kpi: generar_xlsx(kpi, nombres[i * 10:], semilla=i, faltantes=0.1)
+        for i, kpi in enumerate(KPIS)
+    }
+    del archivos['TransfEPA']
+
+    registros = unificar_datos_kpi(archivos, omitidos)
+
+    assert registros == unificar_datos_kpi_original(archivos, omitidos)
+    assert all(r['transfepa'] is None for r in registros)
+
+
+def test_unificacion_sin_archivos_validos():
+    assert unificar_datos_kpi({'TMO': b'no es un archivo'}, []) == []
+    assert unificar_datos_kpi({}, []) == []
+
+
+@pytest.mark.parametrize('delimitador, coma_decimal, encoding', [
+    (';', True, 'utf-8-sig'),
+    (',', False, 'utf-8'),
+    ('\t', True, 'utf-16'),
+    ('|', False, 'cp1252'),
+    (';', True, 'cp1252'),
+])
+@pytest.mark.parametrize('kpi', ['SatEP', 'Tipificaciones'])
+def test_csv_igual_al_xlsx(kpi, delimitador, coma_decimal, encoding):
+    ejecutivos = nombres_ejecutivos(80, semilla=5)
+    archivo = generar_csv(kpi, ejecutivos, semilla=5, faltantes=0.1,
+                          delimitador=delimitador, coma_decimal=coma_decimal, encoding=encoding)
+
+    assert detectar_formato(io.BytesIO(archivo)) == 'csv'
+    pd.testing.assert_series_equal(extraer_kpi(archivo, kpi), extraer_kpi(generar_xlsx(kpi, ejecutivos, 5, 0.1), kpi))
+
+
+def test_csv_respeta_la_linea_sep_de_excel():
+    ejecutivos = nombres_ejecutivos(20, semilla=6)
+    # Excel antepone 'sep=,' al guardar con separador explícito: no es el encabezado del reporte
+    archivo = b'sep=,\r\n' + generar_csv('TMO', ejecutivos, semilla=6, delimitador=',', coma_decimal=False)
+
+    filas, _ = _filas_csv(io.BytesIO(archivo))
+
+    assert next(filas)[0] != 'sep=,'
+    pd.testing.assert_series_equal(extraer_kpi(archivo, 'TMO'), extraer_kpi(generar_xlsx('TMO', ejecutivos, 6), 'TMO'))
+
+
+def test_csv_mas_grande_que_la_muestra():
+    # La muestra de detección corta una línea (y un carácter de varios bytes) a la mitad
+    ejecutivos = nombres_ejecutivos(4000, semilla=7)
+    archivo = generar_csv('ResEP', ejecutivos, semilla=7, encoding='utf-8')
+    assert len(archivo) > MUESTRA_CSV
+
+    pd.testing.assert_series_equal(extraer_kpi(archivo, 'ResEP'), extraer_kpi(generar_xlsx('ResEP', ejecutivos, 7), 'ResEP'))
+
+
+def test_detectar_formato():
+    # Detecta desde la posición actual y la deja donde estaba
+    xlsx = io.BytesIO(b'xyz' + generar_xlsx('TMO', ['Ana'], faltantes=0))
+    xlsx.seek(3)
+
+    assert detectar_formato(xlsx) == 'xlsx'
+    assert xlsx.tell() == 3
+    with pytest.raises(ValueError, match='.xls'):
+        detectar_formato(io.BytesIO(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1' + b'\x00' * 100))
+    with pytest.raises(ValueError, match='no reconocido'):
+        detectar_formato(io.BytesIO(b'\x89PNG\r\n\x1a\n\x00\x00'))
+
+
+def test_convertidor_csv():
+    coma = _convertidor_csv(coma_decimal=True)
+    punto = _convertidor_csv(coma_decimal=False)
+
+    assert coma('0,9312') == 0.9312
+    assert coma('93,12%') == pytest.approx(0.9312)
+    assert coma('1.234,5') == 1234.5
+    assert punto('1,234.5') == 1234.5
+    assert punto(' 0.9312 ') == 0.9312
+    assert coma('-') is None and coma(None) is None
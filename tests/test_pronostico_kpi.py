@@ -0,0 +1,76 @@
+"""
+Los valores esperados salen de proyectarSiguiente, tendencia y riesgoFuturo
+de script.js aplicados a las mismas series.
+"""
+import pytest
+
+from pronostico_kpi import pronosticar
+
+MESES = ['ENERO', 'FEBRERO', 'MARZO', 'ABRIL']
+
+
+def resumen_equipo(series):
+    """Filas de resumen_mensual con `series` ({columna: promedios por mes}) como promedio del equipo."""
+    filas = [
+        {"anio": 2026, "mes": MESES[t], "kpi": kpi, "n": 1, "promedio": valor}
+        for kpi, valores in series.items() for t, valor in enumerate(valores)
+    ]
+    return sorted(filas, key=lambda fila: MESES.index(fila["mes"]))
+
+
+def test_equipo_como_script_js():
+    resumen = resumen_equipo({
+        "resep": [92, 91, 89],
+        "satep": [96, 95.5, 95.2, 94.8],
+        "tmo": [4.5, 5.0],
+        "transfepa": [84, 86],
+    })
+
+    equipo = pronosticar([], resumen)["equipo"]
+
+    # [proyectarSiguiente, tendencia, riesgoFuturo] en script.js
+    assert equipo["resEP"]["valor"] == 88 and equipo["resEP"]["tendencia"] == -1.5
+    assert equipo["resEP"]["estado"] == 'riesgo'
+    assert equipo["satEP"]["valor"] == 94 and equipo["satEP"]["tendencia"] == pytest.approx(-0.4)
+    assert equipo["satEP"]["estado"] == 'riesgo'
+    # 5.0 + 0.5 = 5.5: Math.round sube los .5
+    assert equipo["tmo"]["valor"] == 6 and equipo["tmo"]["estado"] == 'riesgo'
+    assert equipo["transfEPA"]["valor"] == 88 and equipo["transfEPA"]["estado"] == 'ok'
+    assert equipo["satSNL"] == {"valor": None, "estado": 'sin_datos', "tendencia": 0.0, "meta": 95, "meses": 0}
+
+
+def test_ejecutivo_salta_los_meses_sin_dato():
+    historial = [
+        {"anio": 2026, "mes": 'ENERO', "ejecutivo": 'Ana', "satep": 90.0, "tmo": 5.5, "resep": None},
+        {"anio": 2026, "mes": 'FEBRERO', "ejecutivo": 'Ana', "satep": None, "tmo": 5.0, "resep": None},
+        {"anio": 2026, "mes": 'MARZO', "ejecutivo": 'Ana', "satep": 94.0, "tmo": 4.5, "resep": 91.0},
+    ]
+    for fila in historial:
+        for col in ('transfepa', 'tipificaciones', 'satsnl', 'ressnl'):
+            fila[col] = None
+
+    resultado = pronosticar(historial, [])
+    ana = resultado["ejecutivos"][0]
+
+    assert [m["mes"] for m in resultado["meses"]] == ['ENERO', 'FEBRERO', 'MARZO']
+    # Series compactas como en script.js: [90, 94] -> 98, [5.5, 5, 4.5] -> 4, [91] -> 91
+    assert (ana["kpis"]["satEP"]["valor"], ana["kpis"]["satEP"]["tendencia"], ana["kpis"]["satEP"]["meses"]) == (98, 4, 2)
+    assert ana["kpis"]["tmo"]["valor"] == 4 and ana["kpis"]["tmo"]["estado"] == 'ok'
+    assert ana["kpis"]["resEP"]["valor"] == 91 and ana["kpis"]["resEP"]["tendencia"] == 0
+    assert ana["riesgos"] == []
+    assert resultado["resumen"]["con_algun_riesgo"] == 0
+
+
+def test_riesgos_por_ejecutivo_y_resumen():
+    historial = []
+    for t, (ana, bruno) in enumerate([(96.0, 96.0), (95.0, 97.0)]):
+        for ejecutivo, satep in (('Ana', ana), ('Bruno', bruno)):
+            fila = {"anio": 2026, "mes": MESES[t], "ejecutivo": ejecutivo, "satep": satep}
+            fila.update({col: None for col in ('tmo', 'transfepa', 'tipificaciones', 'resep', 'satsnl', 'ressnl')})
+            historial.append(fila)
+
+    resultado = pronosticar(historial, [])
+
+    assert {e["name"]: e["riesgos"] for e in resultado["ejecutivos"]} == {'Ana': ['satEP'], 'Bruno': []}
+    assert resultado["resumen"]["en_riesgo"]["satEP"] == 1
+    assert resultado["resumen"]["con_algun_riesgo"] == 1
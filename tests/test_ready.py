@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def componentes_listos(tmp_path, monkeypatch):
+    """Módulos, pool de parseo y cliente HTTP ya calientes; la BD es SQLite local y sin crear."""
+    main.cargar_modulos_pesados()
+    monkeypatch.setattr(main, '_parse_executor', object())
+    monkeypatch.setattr(main, '_parse_pool_listo', True)
+    monkeypatch.setattr(main, '_cliente_n8n', object())
+    monkeypatch.setattr(main, '_repositorio', None)
+    monkeypatch.setattr(main, 'KPI_DB_BACKEND', 'sqlite')
+    monkeypatch.setattr(main, 'KPI_DB_SQLITE_PATH', str(tmp_path / 'kpis.sqlite3'))
+    monkeypatch.setattr(main, 'errores_precalentamiento', {})
+
+
+def ready():
+    respuesta = TestClient(main.app).get('/ready')
+    return respuesta.status_code, respuesta.json()
+
+
+def test_con_n8n_esta_listo_sin_la_bd(componentes_listos, monkeypatch):
+    monkeypatch.setattr(main, 'CARGAS_USAN_DB', False)
+
+    status, cuerpo = ready()
+
+    assert status == 200 and cuerpo['status'] == 'ready'
+    assert 'db' not in cuerpo['componentes']
+
+
+def test_mientras_calienta_el_pool_responde_503(componentes_listos, monkeypatch):
+    monkeypatch.setattr(main, 'CARGAS_USAN_DB', False)
+    monkeypatch.setattr(main, '_parse_pool_listo', False)
+
+    status, cuerpo = ready()
+
+    assert status == 503 and cuerpo['status'] == 'warming'
+    assert cuerpo['componentes']['parse_pool'] is False
+
+
+def test_con_persistencia_en_la_bd_espera_el_esquema(componentes_listos, monkeypatch):
+    monkeypatch.setattr(main, 'CARGAS_USAN_DB', True)
+
+    status, cuerpo = ready()
+    assert status == 503 and cuerpo['componentes']['db'] is False
+
+    asyncio.run(main.precalentar_db())
+
+    status, cuerpo = ready()
+    assert status == 200 and cuerpo['componentes']['db'] is True
+
+
+def falla_la_bd(monkeypatch):
+    intentos = []
+    esperas = []
+
+    def obtener_repositorio():
+        intentos.append(1)
+        raise ConnectionError('BD caída')
+
+    async def sleep(segundos):
+        esperas.append(segundos)
+
+    monkeypatch.setattr(main, 'obtener_repositorio', obtener_repositorio)
+    monkeypatch.setattr(main.asyncio, 'sleep', sleep)
+    return intentos, esperas
+
+
+def test_precalentamiento_de_la_bd_reintenta_con_espera_exponencial_y_se_rinde(componentes_listos, monkeypatch):
+    monkeypatch.setattr(main, 'CARGAS_USAN_DB', True)
+    monkeypatch.setattr(main, 'KPI_WARMUP_DB_MAX_ATTEMPTS', 4)
+    monkeypatch.setattr(main, 'KPI_WARMUP_DB_RETRY_SECONDS', 10)
+    monkeypatch.setattr(main, 'KPI_WARMUP_DB_RETRY_MAX_SECONDS', 30)
+    intentos, esperas = falla_la_bd(monkeypatch)
+
+    asyncio.run(main.precalentar_db())
+
+    assert len(intentos) == 4
+    assert esperas == [10, 20, 30]
+    assert main.errores_precalentamiento['db'] == 'BD caída'
+    status, cuerpo = ready()
+    assert status == 503 and cuerpo['errores'] == {'db': 'BD caída'}
+
+
+def test_con_n8n_la_bd_se_intenta_una_sola_vez(componentes_listos, monkeypatch):
+    monkeypatch.setattr(main, 'CARGAS_USAN_DB', False)
+    intentos, esperas = falla_la_bd(monkeypatch)
+
+    asyncio.run(main.precalentar_db())
+
+    assert len(intentos) == 1 and esperas == []
+    assert ready()[0] == 200
@@ -0,0 +1,106 @@
+import json
+import time
+
+import pytest
+
+from sesiones import AlmacenSesionesMemoria, AlmacenSesionesSQLite
+
+DATA = {"registros": [{"ejecutivo": "Ana", "tmo": 4.5}], "fecha_registro": '2026-01-31', "kpis_omitidos": []}
+
+
+@pytest.fixture(params=['memoria', 'sqlite'])
+def almacen(request, tmp_path):
+    if request.param == 'memoria':
+        return AlmacenSesionesMemoria(ttl=60, max_sesiones=10, max_bytes=1024 * 1024)
+    return AlmacenSesionesSQLite(str(tmp_path / 'sesiones.sqlite3'), ttl=60, max_sesiones=10, max_bytes=1024 * 1024)
+
+
+def test_reclamar_solo_una_vez(almacen):
+    session_id = almacen.crear(DATA)
+
+    assert almacen.reclamar(session_id) == DATA
+    assert almacen.reclamar(session_id) is None
+    # El reclamo no impide leer la vista previa
+    assert almacen.obtener(session_id) == DATA
+
+
+def test_liberar_permite_reintentar(almacen):
+    session_id = almacen.crear(DATA)
+    almacen.reclamar(session_id)
+
+    almacen.liberar(session_id)
+
+    assert almacen.reclamar(session_id) == DATA
+
+
+def test_reclamar_sesion_inexistente_o_eliminada(almacen):
+    assert almacen.reclamar('no-existe') is None
+    session_id = almacen.crear(DATA)
+    almacen.eliminar(session_id)
+    assert almacen.reclamar(session_id) is None
+
+
+def test_sqlite_reclamo_compartido_entre_instancias(tmp_path):
+    # Dos workers con el mismo archivo: solo uno gana el reclamo
+    ruta = str(tmp_path / 'sesiones.sqlite3')
+    worker_a = AlmacenSesionesSQLite(ruta, ttl=60, max_sesiones=10, max_bytes=1024 * 1024)
+    worker_b = AlmacenSesionesSQLite(ruta, ttl=60, max_sesiones=10, max_bytes=1024 * 1024)
+    session_id = worker_a.crear(DATA)
+
+    assert worker_b.reclamar(session_id) == DATA
+    assert worker_a.reclamar(session_id) is None
+
+
+def test_sqlite_reclamo_vencido_se_puede_retomar(tmp_path):
+    almacen = AlmacenSesionesSQLite(str(tmp_path / 'sesiones.sqlite3'), ttl=60, max_sesiones=10,
+                                    max_bytes=1024 * 1024, ttl_reclamo=0.05)
+    session_id = almacen.crear(DATA)
+    almacen.reclamar(session_id)
+
+    time.sleep(0.1)
+
+    assert almacen.reclamar(session_id) == DATA
+
+
+def test_sqlite_sesion_vencida_no_se_reclama(tmp_path):
+    almacen = AlmacenSesionesSQLite(str(tmp_path / 'sesiones.sqlite3'), ttl=0.05, max_sesiones=10,
+                                    max_bytes=1024 * 1024)
+    session_id = almacen.crear(DATA)
+
+    time.sleep(0.1)
+
+    assert almacen.reclamar(session_id) is None
+
+
+def test_resumen_sin_registros(almacen):
+    session_id = almacen.crear(DATA)
+
+    assert almacen.resumen(session_id) == {"fecha_registro": '2026-01-31', "kpis_omitidos": [], "total": 1}
+
+
+def test_sqlite_limite_en_bytes_utf8(tmp_path):
+    data = {"registros": [{"ejecutivo": "Muñoz" * 100}], "fecha_registro": '2026-01-31', "kpis_omitidos": []}
+    caracteres = len(json.dumps(data, ensure_ascii=False))
+    almacen = AlmacenSesionesSQLite(str(tmp_path / 'sesiones.sqlite3'), ttl=60, max_sesiones=10,
+                                    max_bytes=caracteres + 50)
+
+    # 100 ñ ocupan 200 bytes en UTF-8: no cabe aunque el texto tenga menos caracteres que el límite
+    with pytest.raises(ValueError):
+        almacen.crear(data)
+
+
+def test_sqlite_no_descarta_sesiones_en_confirmacion(tmp_path):
+    almacen = AlmacenSesionesSQLite(str(tmp_path / 'sesiones.sqlite3'), ttl=60, max_sesiones=2,
+                                    max_bytes=1024 * 1024)
+    confirmando = almacen.crear(DATA)
+    otra = almacen.crear(DATA)
+    almacen.reclamar(confirmando)
+    almacen.obtener(otra)
+
+    # La menos usada es la reclamada, pero se descarta la que no se está confirmando
+    nueva = almacen.crear(DATA)
+
+    assert almacen.resumen(confirmando) is not None
+    assert almacen.resumen(otra) is None
+    assert almacen.resumen(nueva) is not None
+    assert almacen.stats()["descartadas"] == 1
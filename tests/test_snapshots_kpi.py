@@ -0,0 +1,98 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import snapshots_kpi
+from snapshots_kpi import SnapshotsKPI
+
+
+def registro(ejecutivo, **kpis):
+    fila = {col: None for col in snapshots_kpi.COLUMNAS}
+    fila.update(kpis)
+    return {"ejecutivo": ejecutivo, **fila}
+
+
+@pytest.fixture
+def snapshots(tmp_path):
+    return SnapshotsKPI(str(tmp_path / 'snapshots'))
+
+
+def manifiesto(snapshots):
+    with open(os.path.join(snapshots.directorio, 'manifiesto.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_ida_y_vuelta_con_faltantes(snapshots):
+    registros = [registro('Ana', tmo=4.5, satep=96.0), registro('Bruno', tmo=5.5)]
+    snapshots.reconstruir_mes(2026, 'ENERO', 1, registros, sello='s1')
+
+    historia = snapshots.cargar()
+
+    assert historia.meses == [(2026, 'ENERO')]
+    assert historia.registros(2026, 'ENERO') == registros
+    assert historia.registros(2026, 'FEBRERO') == []
+    assert snapshots.versiones() == {'2026-01': 's1'}
+
+
+def test_codigos_de_ejecutivo_estables_y_cubo(snapshots):
+    snapshots.reconstruir_mes(2026, 'FEBRERO', 2, [registro('Bruno', tmo=5.0), registro('Ana', tmo=4.0)])
+    codigos = snapshots.cargar().nombres.tolist()
+    snapshots.reconstruir_mes(2026, 'ENERO', 1, [registro('Carla', tmo=6.0), registro('Ana', tmo=4.5)])
+
+    historia = snapshots.cargar()
+    # Solo se agregan nombres: los códigos ya asignados no cambian
+    assert historia.nombres.tolist()[:len(codigos)] == codigos
+    assert historia.meses == [(2026, 'ENERO'), (2026, 'FEBRERO')]
+
+    nombres, cubo = historia.cubo()
+    tmo = snapshots_kpi.COLUMNAS.index('tmo')
+    assert nombres == ['Ana', 'Bruno', 'Carla']
+    np.testing.assert_array_equal(cubo[:, :, tmo], [[4.5, 4.0], [np.nan, 5.0], [6.0, np.nan]])
+
+
+def test_reconstruir_publica_el_manifiesto_con_os_replace(snapshots, monkeypatch):
+    snapshots.reconstruir_mes(2026, 'ENERO', 1, [registro('Ana', tmo=4.5)])
+    anterior = manifiesto(snapshots)['meses']['2026-01']['directorio']
+    reemplazos = []
+    original = os.replace
+
+    def replace(origen, destino):
+        # Al publicar, los archivos del mes nuevo ya están completos en disco
+        nuevo = json.load(open(origen, encoding='utf-8'))['meses']['2026-01']['directorio']
+        assert os.path.exists(os.path.join(snapshots.directorio, nuevo, 'tmo.npy'))
+        reemplazos.append(destino)
+        original(origen, destino)
+
+    monkeypatch.setattr(snapshots_kpi.os, 'replace', replace)
+    snapshots.reconstruir_mes(2026, 'ENERO', 1, [registro('Ana', tmo=5.0)])
+
+    assert reemplazos == [os.path.join(snapshots.directorio, 'manifiesto.json')]
+    assert not os.path.exists(os.path.join(snapshots.directorio, anterior))
+    assert not [nombre for nombre in os.listdir(snapshots.directorio) if nombre.endswith('.tmp')]
+    assert snapshots.cargar().registros(2026, 'ENERO')[0]['tmo'] == 5.0
+
+
+def test_cargar_reutiliza_lo_abierto_hasta_que_cambia_el_manifiesto(snapshots):
+    snapshots.reconstruir_mes(2026, 'ENERO', 1, [registro('Ana', tmo=4.5)])
+    primera = snapshots.cargar()
+
+    assert snapshots.cargar() is primera
+
+    # Otro proceso publica un mes: este lo ve en la siguiente carga
+    SnapshotsKPI(snapshots.directorio).reconstruir_mes(2026, 'FEBRERO', 2, [registro('Ana', tmo=4.0)])
+    segunda = snapshots.cargar()
+
+    assert segunda is not primera
+    assert segunda.meses == [(2026, 'ENERO'), (2026, 'FEBRERO')]
+    # El mes ya mapeado sigue legible aunque no haya cambiado
+    assert primera.registros(2026, 'ENERO')[0]['tmo'] == 4.5
+
+
+def test_sin_snapshots(snapshots):
+    historia = snapshots.cargar()
+
+    assert historia.meses == []
+    assert historia.cubo()[0] == []
+    assert snapshots.versiones() == {}
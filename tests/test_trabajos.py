@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from cliente_n8n import ClienteN8N
+from trabajos import (EN_COLA, EN_EJECUCION, EXITOSO, FALLIDO, PENDIENTE_ENVIO, AlmacenTrabajosMemoria,
+                      AlmacenTrabajosSQLite, ColaTrabajos)
+
+
+@pytest.fixture(params=['memoria', 'sqlite'])
+def almacen(request, tmp_path):
+    if request.param == 'memoria':
+        return AlmacenTrabajosMemoria(ttl=60, max_trabajos=10)
+    return AlmacenTrabajosSQLite(str(tmp_path / 'sesiones.sqlite3'), ttl=60, max_trabajos=10)
+
+
+def correr_cola(almacen, escenario):
+    async def correr():
+        cola = ColaTrabajos(workers=1, almacen=almacen)
+        cola.iniciar()
+        try:
+            return await escenario(cola)
+        finally:
+            await cola.detener()
+    return asyncio.run(correr())
+
+
+def test_ciclo_de_vida_del_trabajo(almacen):
+    async def escenario(cola):
+        liberar = asyncio.Event()
+        estados = []
+
+        async def confirmar():
+            estados.append((await cola.obtener(trabajo["job_id"]))["status"])
+            await liberar.wait()
+            return {"success": True, "data": {"registros": 3}}
+
+        # encolar devuelve sin ceder el loop: el worker todavía no lo tomó
+        trabajo = dict(await cola.encolar('sesion-1', confirmar))
+        await asyncio.sleep(0.05)
+        liberar.set()
+        await cola._cola.join()
+        return trabajo, estados, await cola.obtener(trabajo["job_id"]), await cola.trabajo_de_sesion('sesion-1')
+
+    trabajo, estados, final, de_sesion = correr_cola(almacen, escenario)
+
+    assert trabajo["status"] == EN_COLA
+    assert estados == [EN_EJECUCION]
+    assert final["status"] == EXITOSO and final["resultado"] == {"registros": 3}
+    assert final["duracion_s"] is not None and final["espera_s"] is not None
+    assert de_sesion["job_id"] == trabajo["job_id"]
+
+
+@pytest.mark.parametrize('funcion, status, error', [
+    (lambda: {"success": False, "error": "n8n respondió 422"}, FALLIDO, "n8n respondió 422"),
+    (lambda: 1 / 0, FALLIDO, "division by zero"),
+    (lambda: {"success": True, "pendiente_envio": True, "data": {"outbox_id": 7}}, PENDIENTE_ENVIO, None),
+])
+def test_resultado_del_trabajo(almacen, funcion, status, error):
+    async def escenario(cola):
+        async def confirmar():
+            return funcion()
+        trabajo = await cola.encolar('sesion-1', confirmar)
+        await cola._cola.join()
+        return await cola.obtener(trabajo["job_id"])
+
+    final = correr_cola(almacen, escenario)
+
+    assert final["status"] == status
+    assert final["error"] == error
+
+
+def test_detener_marca_como_fallidos_los_trabajos_sin_terminar(almacen):
+    async def correr():
+        cola = ColaTrabajos(workers=1, almacen=almacen)
+        cola.iniciar()
+        en_curso = await cola.encolar('sesion-1', lambda: asyncio.sleep(60))
+        en_cola = await cola.encolar('sesion-2', lambda: asyncio.sleep(60))
+        await asyncio.sleep(0.05)
+        await cola.detener()
+        return await cola.obtener(en_curso["job_id"]), await cola.obtener(en_cola["job_id"])
+
+    en_curso, en_cola = asyncio.run(correr())
+
+    assert en_curso["status"] == FALLIDO and en_curso["iniciado"] is not None
+    assert en_cola["status"] == FALLIDO and en_cola["iniciado"] is None
+    assert "cancelado" in en_curso["error"]
+
+
+def test_confirm_responde_202_y_el_trabajo_se_consulta_en_jobs(webhook, monkeypatch):
+    monkeypatch.setattr(main, '_cliente_n8n', ClienteN8N(webhook.url, backoff_base=0))
+    registros = [{"ejecutivo": "Ana", "tmo": 4.5}]
+
+    with TestClient(main.app) as cliente:
+        session_id = main.preview_data.crear({"registros": registros, "fecha_registro": '2026-01-31', "kpis_omitidos": []})
+
+        respuesta = cliente.post(f'/confirm/{session_id}')
+        assert respuesta.status_code == 202
+        job = respuesta.json()
+        assert job["status_url"] == f"/jobs/{job['job_id']}"
+
+        for _ in range(100):
+            estado = cliente.get(job["status_url"]).json()
+            if estado["status"] not in (EN_COLA, EN_EJECUCION):
+                break
+            asyncio.run(asyncio.sleep(0.02))
+
+        assert estado["status"] == EXITOSO
+        assert estado["destino"] == main.KPI_PERSISTENCIA
+        # Confirmada: la sesión se eliminó y un segundo /confirm devuelve el mismo trabajo sin reenviar
+        repetido = cliente.post(f'/confirm/{session_id}')
+        assert repetido.status_code == 202 and repetido.json()["job_id"] == job["job_id"]
+        assert cliente.get('/jobs/no-existe').status_code == 404
+
+    assert len(webhook.recibidos) == 1